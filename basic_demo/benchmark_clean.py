@@ -0,0 +1,361 @@
+"""
+Time the cleaning functions on fake data of different sizes.
+
+Each public function in utils.clean and both example pipelines are
+run on data from utils.synthetic, both without logging (utils.clean)
+and with logging to file (utils.clean_log). The fastest of a few
+repeats is kept.
+
+Results are added to the end of a csv file, one row per function,
+size and logging choice, so that every run can be compared with the
+one before it. Anything that has slowed down by more than the
+threshold is flagged.
+"""
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import utils.clean as clean_plain
+import utils.clean_log as clean_logged
+from utils.encode import OneHotEncoder
+from utils.impute import Imputer
+from utils.log import start_log_file, stop_log_file
+from utils.synthetic import make_health_data, make_titanic_data, \
+    AGE_BANDS
+from utils.validate import RuleSet
+
+
+def clean_health_pipeline(df_raw: pd.DataFrame, clean):
+    """
+    Same steps as example_clean_health.py.
+
+    Inputs
+    ------
+    df_raw - pd.DataFrame. Data like input/example_data.csv.
+    clean  - module. utils.clean or utils.clean_log.
+    """
+    dict_map_age = dict(zip(AGE_BANDS, [37.5 + 5 * i for i in range(12)]))
+    series_age = clean.one_hot_to_values(df_raw, AGE_BANDS, dict_map_age)
+    series_sex = clean.rename_values(df_raw['S1Gender'], {'M': 1, 'F': 0})
+    dict_map_arrival = dict(zip(
+        ['0000to3000', '0300to0600', '0600to0900', '0900to1200',
+         '1200to1500', '1500to1800', '1800to2100', '2100to2400'],
+        [0, 3, 6, 9, 12, 15, 18, 21]
+        ))
+    series_arrival = clean.rename_values(
+        df_raw['FirstArrivalTime'], dict_map_arrival)
+
+    df_clean = clean.add_to_dataframe(
+        pd.DataFrame(),
+        df_raw[['patient_id', 'treated']],
+        series_age,
+        series_sex,
+        series_arrival
+        )
+    return df_clean
+
+
+def clean_titanic_pipeline(df_raw: pd.DataFrame, clean):
+    """
+    Same steps as example_clean_titanic.py.
+
+    Inputs
+    ------
+    df_raw - pd.DataFrame. Data like input/titanic.csv.
+    clean  - module. utils.clean or utils.clean_log.
+    """
+    clean.check_for_missing_data(df_raw)
+    df_clean = clean.add_to_dataframe(
+        pd.DataFrame(),
+        df_raw[['PassengerId', 'Survived', 'Pclass', 'SibSp', 'Parch', 'Fare']]
+        )
+
+    series = clean.rename_values(
+        df_raw['Sex'], {'male': True, 'female': False})
+    df_clean = clean.add_to_dataframe(df_clean, series)
+
+    series, imputed = clean.impute_missing_with_median(df_raw['Age'])
+    df_clean = clean.add_to_dataframe(df_clean, series, imputed)
+
+    series, imputed = clean.impute_missing_with_label(
+        df_raw['Embarked'], label='missing')
+    df = clean.apply_one_hot_encoding(series)
+    df_clean = clean.add_to_dataframe(df_clean, df, imputed)
+
+    df = clean.split_strings_to_columns_by_delimiter(
+        df_raw['Cabin'], delimiter=' ', max_columns=1)
+    df = clean.split_strings_to_columns_by_index(
+        df[df.columns[0]], split_index=1, use_codes=True)
+    df.columns = ['CabinLetter', 'CabinNumber']
+    series_cabinletter = df[df.columns[0]]
+    series_cabinnumber = df[df.columns[1]]
+
+    series, imputed = clean.impute_missing_with_label(
+        series_cabinletter, label='missing')
+    df = clean.apply_one_hot_encoding(series)
+    df_clean = clean.add_to_dataframe(df_clean, df, imputed)
+
+    series, imputed = clean.impute_missing_with_label(
+        series_cabinnumber, label=0)
+    df_clean = clean.add_to_dataframe(df_clean, series, imputed)
+    return df_clean
+
+
+def make_cases(clean, df_health, df_titanic, dir_tmp: str):
+    """
+    Calls to time for one module.
+
+    Inputs
+    ------
+    clean      - module. utils.clean or utils.clean_log.
+    df_health  - pd.DataFrame. Fake health data.
+    df_titanic - pd.DataFrame. Fake Titanic data.
+    dir_tmp    - str. Directory for files made by the benchmarks.
+
+    Returns
+    -------
+    cases - dict. Name of the case and a function that runs it.
+    """
+    path_titanic = os.path.join(dir_tmp, 'titanic.csv')
+    if not os.path.exists(path_titanic):
+        df_titanic.to_csv(path_titanic, index=False)
+    path_saved = os.path.join(dir_tmp, 'saved.csv')
+    encoder_embarked = OneHotEncoder().fit(df_titanic['Embarked'])
+    imputer_titanic = Imputer(
+        median_columns=['Age'],
+        labels={'Embarked': 'missing', 'Cabin': 'missing'}
+        ).fit(df_titanic)
+    rules_titanic = RuleSet()
+    rules_titanic.add_range('Age', low=0, high=100)
+    rules_titanic.add_range('Fare', low=0, action='clip')
+    rules_titanic.add_allowed('Embarked', ['C', 'Q', 'S'], action='drop')
+    rules_titanic.add_comparison('Parch', '<=', 'SibSp')
+    rules_titanic.add_rare('Cabin', min_count=5)
+    rules_titanic.fit(df_titanic)
+
+    cases = {
+        'load_data': lambda: clean.load_data(path_titanic),
+        'save_data': lambda: clean.save_data(df_titanic, path_saved),
+        'add_to_dataframe': lambda: clean.add_to_dataframe(
+            pd.DataFrame(), df_titanic[['PassengerId', 'Fare']],
+            df_titanic['Age'], df_titanic['Sex']),
+        'check_for_missing_data': lambda: clean.check_for_missing_data(
+            df_titanic),
+        'profile_data': lambda: clean.profile_data(df_titanic),
+        'apply_one_hot_encoding': lambda: clean.apply_one_hot_encoding(
+            df_titanic['Embarked']),
+        'apply_one_hot_encoding_encoder': lambda:
+            clean.apply_one_hot_encoding(
+                df_titanic['Embarked'], encoder=encoder_embarked),
+        'apply_one_hot_encoding_sparse': lambda:
+            clean.apply_one_hot_encoding(df_titanic['Cabin'], sparse=True),
+        'remove_one_hot_encoding': lambda: clean.remove_one_hot_encoding(
+            df_health, AGE_BANDS),
+        'decode_one_hot_encoding': lambda: clean.decode_one_hot_encoding(
+            df_health, AGE_BANDS),
+        'one_hot_to_values': lambda: clean.one_hot_to_values(
+            df_health, AGE_BANDS, [37.5 + 5 * i for i in range(12)]),
+        'rename_values': lambda: clean.rename_values(
+            df_health['S1Gender'], {'M': 1, 'F': 0}),
+        'rename_values_codes': lambda: clean.rename_values(
+            df_health['S1Gender'], {'M': 1, 'F': 0}, use_codes=True),
+        'split_strings_to_columns_by_delimiter': lambda:
+            clean.split_strings_to_columns_by_delimiter(
+                df_titanic['Cabin'], delimiter=' '),
+        'split_strings_to_columns_by_delimiter_pyarrow': lambda:
+            clean.split_strings_to_columns_by_delimiter(
+                df_titanic['Cabin'], delimiter=' ', max_columns=1,
+                engine='pyarrow'),
+        'split_strings_to_columns_by_index': lambda:
+            clean.split_strings_to_columns_by_index(
+                df_titanic['Cabin'], split_index=1),
+        'split_strings_to_columns_by_index_codes': lambda:
+            clean.split_strings_to_columns_by_index(
+                df_titanic['Cabin'], split_index=1, use_codes=True),
+        'impute_missing_with_median': lambda:
+            clean.impute_missing_with_median(df_titanic['Age']),
+        'impute_missing_with_median_sketch': lambda:
+            clean.impute_missing_with_median(
+                df_titanic['Age'], method='sketch'),
+        'impute_missing_with_label': lambda:
+            clean.impute_missing_with_label(
+                df_titanic['Embarked'], label='missing'),
+        'impute_missing': lambda: clean.impute_missing(
+            df_titanic, imputer_titanic),
+        'validate_data': lambda: clean.validate_data(
+            df_titanic, rules_titanic),
+        'set_attrs_name': lambda: clean.set_attrs_name(
+            df_titanic, 'df_titanic'),
+        'pipeline_health': lambda: clean_health_pipeline(df_health, clean),
+        'pipeline_titanic': lambda: clean_titanic_pipeline(
+            df_titanic, clean),
+    }
+    return cases
+
+
+def time_call(func, repeats: int = 3):
+    """Fastest time in seconds out of several runs of func()."""
+    times = []
+    for _ in range(repeats):
+        time_start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - time_start)
+    return min(times)
+
+
+def run_benchmarks(
+        sizes: list,
+        repeats: int = 3,
+        include_logged: bool = True,
+        seed: int = 0
+        ):
+    """
+    Time every case at every size.
+
+    Inputs
+    ------
+    sizes          - list. Numbers of rows of fake data.
+    repeats        - int. Number of times to run each case.
+    include_logged - bool. Whether to also time utils.clean_log with
+                     a log file.
+    seed           - int. Seed for the fake data.
+
+    Returns
+    -------
+    df_results - pd.DataFrame. One row per case, size and logging.
+    """
+    run_id = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    run_info = {
+        'run_id': run_id,
+        'git_commit': _find_git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+    }
+
+    modules = [(False, clean_plain)]
+    if include_logged:
+        modules.append((True, clean_logged))
+
+    results = []
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        for n_rows in sizes:
+            df_health = make_health_data(n_rows, seed=seed)
+            df_titanic = make_titanic_data(n_rows, seed=seed)
+            dir_size = os.path.join(dir_tmp, str(n_rows))
+            os.mkdir(dir_size)
+
+            for logged, clean in modules:
+                if logged:
+                    start_log_file(os.path.join(dir_size, 'benchmark.log'))
+                cases = make_cases(clean, df_health, df_titanic, dir_size)
+                for name, func in cases.items():
+                    seconds = time_call(func, repeats)
+                    results.append({
+                        **run_info,
+                        'function': name,
+                        'n_rows': n_rows,
+                        'logged': logged,
+                        'repeats': repeats,
+                        'seconds': seconds,
+                        'rows_per_s': n_rows / seconds,
+                    })
+                if logged:
+                    stop_log_file()
+
+    df_results = pd.DataFrame(results)
+    return df_results
+
+
+def save_results(df_results: pd.DataFrame, path_to_file: str):
+    """Add results to the end of the results file."""
+    new_file = not os.path.exists(path_to_file)
+    df_results.to_csv(
+        path_to_file, index=False, mode='w' if new_file else 'a',
+        header=new_file)
+
+
+def compare_runs(path_to_file: str, threshold: float = 0.2):
+    """
+    Compare the latest run in the results file with the one before.
+
+    Inputs
+    ------
+    path_to_file - str. Results file from save_results().
+    threshold    - float. Flag cases that take this fraction longer
+                   than before, e.g. 0.2 for 20% slower.
+
+    Returns
+    -------
+    df_compare - pd.DataFrame. Times from both runs, their ratio and
+                 whether this counts as slower. Empty if there is
+                 only one run.
+    """
+    df = pd.read_csv(path_to_file)
+    run_ids = df['run_id'].unique()
+    if len(run_ids) < 2:
+        return pd.DataFrame()
+    keys = ['function', 'n_rows', 'logged']
+    df_before = df[df['run_id'] == run_ids[-2]][keys + ['seconds']]
+    df_after = df[df['run_id'] == run_ids[-1]][keys + ['seconds']]
+    df_compare = df_before.merge(
+        df_after, on=keys, suffixes=('_before', '_after'))
+    df_compare['ratio'] = (
+        df_compare['seconds_after'] / df_compare['seconds_before'])
+    df_compare['slower'] = df_compare['ratio'] > 1 + threshold
+    return df_compare
+
+
+def _find_git_commit():
+    """Short hash of the current git commit, if there is one."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    return commit
+
+
+if __name__ == '__main__':
+    # #######################
+    # ##### USER INPUTS #####
+    # #######################
+
+    # Numbers of rows of fake data. Sizes up to 10**8 work if there
+    # is enough memory for the whole DataFrame several times over.
+    sizes = [10**4, 10**5, 10**6]
+
+    # Number of times to run each case (the fastest is kept):
+    repeats = 3
+
+    # Whether to also time the logged versions (True) or not (False):
+    include_logged = True
+
+    # Results file, added to on every run:
+    path_results = './output/benchmark_results.csv'
+
+    # Flag cases that are this fraction slower than the previous run:
+    threshold = 0.2
+
+    # #########################
+    # ##### START OF CODE #####
+    # #########################
+    df_results = run_benchmarks(sizes, repeats, include_logged)
+    save_results(df_results, path_results)
+    print(df_results[['function', 'n_rows', 'logged', 'seconds']]
+          .to_string(index=False))
+
+    df_compare = compare_runs(path_results, threshold)
+    if len(df_compare) > 0:
+        df_slower = df_compare[df_compare['slower']]
+        if len(df_slower) > 0:
+            print('\nSlower than the previous run:')
+            print(df_slower.to_string(index=False))
+        else:
+            print('\nNothing is slower than the previous run.')
@@ -4,11 +4,12 @@ Clean the example data.
 Keep a log of the methods used and save it to file.
 """
 import pandas as pd
-import logging
 
-from utils.log import log_heading, log_step, log_text, \
-    log_dataframe_columns, set_attrs_name
-from utils.clean import load_data, remove_one_hot_encoding, rename_values
+from utils.log import start_log_file, log_heading, log_step, log_text, \
+    log_dataframe_contents
+from utils.clean import load_data, save_data, one_hot_to_values, \
+    rename_values, set_attrs_name
+from utils.load_plan import LoadPlan
 
 if __name__ == '__main__':
     # #######################
@@ -18,6 +19,7 @@ if __name__ == '__main__':
     # Input file directory and name:
     dir_in = './input/'
     file_in = 'example_data.csv'
+    file_plan = 'example_data_load_plan.json'
 
     # Output file directory and name:
     dir_out = './output/'
@@ -30,15 +32,9 @@ if __name__ == '__main__':
     # ##### START OF CODE #####
     # #########################
     if create_log_file:
-        # Set up a log file. Name the logger so that later
-        # we can check whether it exists.
-        logging.getLogger('pipeline')
-        logging.basicConfig(
-            filename='example_clean_health.log',
-            encoding='utf-8',
-            level=logging.DEBUG,
-            filemode='w'  # Overwrite the existing file
-            )
+        # Set up a log file. It is written on a background thread
+        # so that the cleaning doesn't wait for it.
+        start_log_file('example_clean_health.log')
     else:
         # Don't set up logging.
         # Any function here named "log_"... won't do anything useful.
@@ -46,7 +42,10 @@ if __name__ == '__main__':
 
     log_heading('Example data cleaning')
     log_step('Import raw data.')
-    df_raw = load_data(f'{dir_in}{file_in}')
+    # Data types for each column, guessed once from the file with
+    # utils.load_plan.infer_load_plan() and then checked by eye:
+    load_plan = LoadPlan.from_json(f'{dir_in}{file_plan}')
+    df_raw = load_data(f'{dir_in}{file_in}', load_plan=load_plan)
     # Rename this DataFrame for the log:
     df_raw = set_attrs_name(df_raw, 'raw data')
 
@@ -58,10 +57,10 @@ if __name__ == '__main__':
     log_step('Update cleaned dataframe.')
     df_clean['patient_id'] = df_raw['patient_id']
     df_clean['treated'] = df_raw['treated']
-    log_dataframe_columns(df_clean)
+    log_dataframe_contents(df_clean)
 
     log_heading('Process the data')
-    log_step('Age: combine multiple columns.')
+    log_step('Age: combine band columns into average values.')
     columns_age = [
         'AgeUnder40',
         'Age40to44',
@@ -76,12 +75,6 @@ if __name__ == '__main__':
         'Age85to89',
         'AgeOver90'
         ]
-    clean_series_age = remove_one_hot_encoding(df_raw, columns_age)
-    # Rename this Series for the log:
-    clean_series_age = set_attrs_name(clean_series_age,
-                                      'age_combined_columns')
-
-    log_step('Age: change bands to average values.')
     dict_map_age = {
         'AgeUnder40': 37.5,
         'Age40to44': 42.5,
@@ -96,18 +89,25 @@ if __name__ == '__main__':
         'Age85to89': 87.5,
         'AgeOver90': 92.5
         }
-    clean_series_age = rename_values(clean_series_age, dict_map_age)
+    # Go straight from the one-hot columns to the numbers, without
+    # making a column of band names first:
+    clean_series_age = one_hot_to_values(df_raw, columns_age, dict_map_age)
+    # Rename this Series for the log:
+    clean_series_age = set_attrs_name(clean_series_age, 'age')
 
     log_step('Update cleaned dataframe.')
     df_clean['age'] = clean_series_age
-    log_dataframe_columns(df_clean)
+    log_dataframe_contents(df_clean)
 
     log_step('Sex: change M/F to 1/0.')
-    clean_series_sex = rename_values(df_raw['S1Gender'], {'M': 1, 'F': 0})
+    # Both columns are loaded as Categorical, so rename only the
+    # categories and reuse the codes for every row:
+    clean_series_sex = rename_values(
+        df_raw['S1Gender'], {'M': 1, 'F': 0}, use_codes=True)
 
     log_step('Update cleaned dataframe.')
     df_clean['sex'] = clean_series_sex
-    log_dataframe_columns(df_clean)
+    log_dataframe_contents(df_clean)
 
     log_step('Arrival times: change bands to start values.')
     dict_map_arrival = {
@@ -121,16 +121,16 @@ if __name__ == '__main__':
         '2100to2400': 21
         }
     clean_series_firstarrivaltime = rename_values(
-        df_raw['FirstArrivalTime'], dict_map_arrival)
+        df_raw['FirstArrivalTime'], dict_map_arrival, use_codes=True)
 
     log_step('Update cleaned dataframe.')
     df_clean['FirstArrivalTime'] = clean_series_firstarrivaltime
-    log_dataframe_columns(df_clean)
+    log_dataframe_contents(df_clean)
 
     log_heading('Result')
     log_step('Contents of cleaned dataframe.')
-    log_dataframe_columns(df_clean)
+    log_dataframe_contents(df_clean)
 
     log_step('Save cleaned dataframe to file.')
-    df_clean.to_csv(f'{dir_out}{file_out}', index=False)
+    save_data(df_clean, f'{dir_out}{file_out}')
     log_text(f'{dir_out}{file_out}')
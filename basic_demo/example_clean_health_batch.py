@@ -0,0 +1,118 @@
+"""
+Clean a batch of files like the example data, several at a time.
+
+The same steps as example_clean_health.py are run on every file that
+matches the input pattern, e.g. one extract per hospital. All of the
+steps go into one log file, with a heading for each input file.
+"""
+import pandas as pd
+
+import utils.clean_log as clean
+from utils.batch import run_batch
+from utils.load_plan import LoadPlan
+from utils.log import start_log_file, log_heading, log_text
+
+
+def clean_site(df_raw):
+    """
+    Clean the data from one site.
+
+    Defined at the top level of this file so that it can be sent to
+    the worker processes.
+    """
+    columns_age = [
+        'AgeUnder40',
+        'Age40to44',
+        'Age45to49',
+        'Age50to54',
+        'Age55to59',
+        'Age60to64',
+        'Age65to69',
+        'Age70to74',
+        'Age75to79',
+        'Age80to84',
+        'Age85to89',
+        'AgeOver90'
+        ]
+    dict_map_age = dict(zip(columns_age, [37.5 + 5 * i for i in range(12)]))
+    clean_series_age = clean.one_hot_to_values(
+        df_raw, columns_age, dict_map_age)
+    clean_series_age = clean.set_attrs_name(clean_series_age, 'age')
+
+    clean_series_sex = clean.rename_values(
+        df_raw['S1Gender'], {'M': 1, 'F': 0}, use_codes=True)
+    clean_series_sex = clean.set_attrs_name(clean_series_sex, 'sex')
+
+    dict_map_arrival = {
+        '0000to3000': 0,
+        '0300to0600': 3,
+        '0600to0900': 6,
+        '0900to1200': 9,
+        '1200to1500': 12,
+        '1500to1800': 15,
+        '1800to2100': 18,
+        '2100to2400': 21
+        }
+    clean_series_firstarrivaltime = clean.rename_values(
+        df_raw['FirstArrivalTime'], dict_map_arrival, use_codes=True)
+    clean_series_firstarrivaltime = clean.set_attrs_name(
+        clean_series_firstarrivaltime, 'FirstArrivalTime')
+
+    df_clean = pd.DataFrame()
+    df_clean = clean.set_attrs_name(df_clean, 'cleaned data')
+    df_clean = clean.add_to_dataframe(
+        df_clean,
+        df_raw[['patient_id', 'treated']],
+        clean_series_age,
+        clean_series_sex,
+        clean_series_firstarrivaltime
+        )
+    return df_clean
+
+
+if __name__ == '__main__':
+    # #######################
+    # ##### USER INPUTS #####
+    # #######################
+
+    # Input files, as a glob pattern, or a manifest file listing them
+    # (a .txt file with one path per line or a csv with a "path"
+    # column) with inputs set to None:
+    inputs = './input/example_data*.csv'
+    manifest = None
+    file_plan = './input/example_data_load_plan.json'
+
+    # Output directory for one cleaned file per input file, and
+    # location of one file with all of the cleaned data:
+    dir_out = './output/batch/'
+    file_combined = './output/data_cleaned_all.csv'
+
+    # Number of files to clean at once (None for one per CPU) and the
+    # most memory each one can use in MB (None for no limit):
+    max_workers = None
+    memory_limit_mb = None
+
+    # Whether to save a log file (True) or not (False):
+    create_log_file = True
+
+    # #########################
+    # ##### START OF CODE #####
+    # #########################
+    if create_log_file:
+        start_log_file('example_clean_health_batch.log')
+
+    load_plan = LoadPlan.from_json(file_plan)
+    df_summary = run_batch(
+        inputs,
+        clean_site,
+        dir_out=dir_out,
+        path_combined=file_combined,
+        max_workers=max_workers,
+        memory_limit_mb=memory_limit_mb,
+        load_plan=load_plan,
+        source_column='source_file',
+        manifest=manifest
+        )
+
+    log_heading('Summary')
+    log_text(df_summary.to_string())
@@ -4,10 +4,13 @@ Clean the Titanic data.
 Keep a log of the methods used and save it to file.
 """
 import pandas as pd
-import logging
 
-from utils.log import log_heading, log_step, log_text, \
+from utils.log import start_log_file, log_heading, log_step, log_text, \
     log_dataframe_contents, log_dataframe_stats
+from utils.load_plan import LoadPlan
+from utils.provenance import start_provenance_log
+from utils.profiling import start_profiling, stop_profiling
+from utils.cache import start_cache
 
 
 if __name__ == '__main__':
@@ -27,19 +30,35 @@ if __name__ == '__main__':
     create_log_file = True
     log_file_name = 'example_clean_titanic_test.log'
 
+    # Whether to also save a machine-readable record of each step
+    # (True) or not (False). Needs create_log_file to be True.
+    create_provenance_file = True
+    provenance_file_name = 'example_clean_titanic_provenance.jsonl'
+
+    # Whether to measure the time and memory used by each step (True)
+    # and add a table of them to the end of the log, or not (False).
+    profile_steps = False
+
+    # Whether to save the output of each step and load it on the next
+    # run instead of working it out again (True) or not (False).
+    # Only the steps from the first one that changed onwards are run
+    # again. Needs create_log_file to be True.
+    cache_steps = False
+    cache_dir = './cache/'
+
     # #########################
     # ##### START OF CODE #####
     # #########################
     if create_log_file:
-        # Set up a log file. Name the logger so that later
-        # we can check whether it exists.
-        logging.getLogger('pipeline')
-        logging.basicConfig(
-            filename=log_file_name,
-            encoding='utf-8',
-            level=logging.DEBUG,
-            filemode='w'  # Overwrite the existing file
-            )
+        # Set up a log file. It is written on a background thread
+        # so that the cleaning doesn't wait for it.
+        start_log_file(log_file_name)
+        if create_provenance_file:
+            start_provenance_log(provenance_file_name)
+        if profile_steps:
+            start_profiling()
+        if cache_steps:
+            start_cache(cache_dir)
         import utils.clean_log as clean
     else:
         # Don't set up logging.
@@ -47,25 +66,43 @@ if __name__ == '__main__':
         import utils.clean as clean
 
     log_heading(f'{file_in} data cleaning')
-    df_raw = clean.load_data(f'{dir_in}{file_in}')
-
-    series_missing_raw = clean.check_for_missing_data(df_raw)
+    # Only read in the columns that are used below, and set their
+    # data types now rather than letting pandas guess them:
+    load_plan = LoadPlan(
+        dtypes={
+            'PassengerId': 'Int64',
+            'Survived': 'Int64',
+            'Pclass': 'Int64',
+            'Sex': 'category',
+            'Age': 'Float64',
+            'SibSp': 'Int64',
+            'Parch': 'Int64',
+            'Fare': 'Float64',
+            'Cabin': 'object',
+            'Embarked': 'category'
+        },
+        usecols=[
+            'PassengerId',
+            'Survived',
+            'Pclass',
+            'Sex',
+            'Age',
+            'SibSp',
+            'Parch',
+            'Fare',
+            'Cabin',
+            'Embarked'
+        ]
+    )
+    df_raw = clean.load_data(f'{dir_in}{file_in}', load_plan=load_plan)
+
+    # Check which columns are missing data, their data types and
+    # ranges, and how many unique values they have in one go:
+    df_profile_raw = clean.profile_data(df_raw)
+    series_missing_raw = clean.check_for_missing_data(
+        df_raw, profile=df_profile_raw)
 
     """ TO DO """
-    # TO DO - steps to check which columns are missing data,
-    # which columns have which data types,
-
-    # log_step('Check current data types and ranges.')
-    # print(df_raw.info(verbose=True, show_counts=True, memory_usage=False))
-    # print(df_raw.dtypes)
-
-    # print(df_raw.describe())
-
-    # # Guess whether this column can be simplified by seeing
-    # # how many unique values it has.
-    # for column in df_raw.columns:
-    #     print(df_raw[column].unique())
-
     # if series_missing_raw.sum() > 0:
     # TO DO - imputation or deleting steps.
     # Best placed after the cleaning?
@@ -106,15 +143,19 @@ if __name__ == '__main__':
     df = clean.apply_one_hot_encoding(series)
     df_clean = clean.add_to_dataframe(df_clean, df, imputed)
 
+    # Only keep the first cabin code when there are several:
     df = clean.split_strings_to_columns_by_delimiter(
         df_raw['Cabin'],
-        delimiter=' '
+        delimiter=' ',
+        max_columns=1
         )
-    # Only keep the first column:
     series = df[df.columns[0]]
+    # Cabin codes repeat over many passengers, so split each
+    # different code only once:
     df = clean.split_strings_to_columns_by_index(
         series,
-        split_index=1
+        split_index=1,
+        use_codes=True
         )
     df.columns = ['CabinLetter', 'CabinNumber']
     # Store copies of these to prevent overwriting them:
@@ -143,11 +184,14 @@ if __name__ == '__main__':
         )
 
     log_heading('Result')
-    df_clean = df_clean.convert_dtypes()
     log_step('Contents of cleaned dataframe.')
     log_dataframe_contents(df_clean)
     log_dataframe_stats(df_clean)  # only runs for numerical columns
 
-    log_step('Save cleaned dataframe to file.')
-    df_clean.to_csv(f'{dir_out}{file_out}', index=False)
-    log_text(f'{dir_out}{file_out}')
+    # The file format is set by the extension of file_out,
+    # e.g. ".parquet" is much quicker to read back in than ".csv".
+    clean.save_data(df_clean, f'{dir_out}{file_out}')
+
+    if create_log_file and profile_steps:
+        log_heading('Cost of each step')
+        log_text(stop_profiling().to_string())
@@ -0,0 +1,169 @@
+"""
+Clean the Titanic data using a declared pipeline of steps.
+
+Gives the same result as example_clean_titanic.py, but the steps
+that work on different columns (Sex, Age, Embarked, Cabin) are run
+at the same time.
+"""
+import utils.clean as clean
+from utils.load_plan import LoadPlan
+from utils.pipeline import Pipeline
+from utils.cache import StepCache
+
+
+def first_column(df):
+    """Pick out the first column of a DataFrame."""
+    return df[df.columns[0]]
+
+
+def split_cabin_code(series):
+    """Split cabin codes such as "C85" into letter and number."""
+    df = clean.split_strings_to_columns_by_index(
+        series, split_index=1, use_codes=True)
+    series_cabinletter = df[df.columns[0]].rename('CabinLetter')
+    series_cabinnumber = df[df.columns[1]].rename('CabinNumber')
+    return series_cabinletter, series_cabinnumber
+
+
+if __name__ == '__main__':
+    # #######################
+    # ##### USER INPUTS #####
+    # #######################
+
+    # Input file directory and name:
+    dir_in = './input/'
+    file_in = 'titanic.csv'
+
+    # Output file directory and name:
+    dir_out = './output/'
+    file_out = 'titanic_cleaned.csv'
+
+    # Number of steps to run at once (None to let Python decide):
+    max_workers = None
+
+    # Whether to save the output of each step and load it on the next
+    # run instead of working it out again (True) or not (False):
+    cache_steps = False
+    cache_dir = './cache/'
+
+    # #########################
+    # ##### START OF CODE #####
+    # #########################
+    load_plan = LoadPlan(
+        dtypes={
+            'PassengerId': 'Int64',
+            'Survived': 'Int64',
+            'Pclass': 'Int64',
+            'Sex': 'category',
+            'Age': 'Float64',
+            'SibSp': 'Int64',
+            'Parch': 'Int64',
+            'Fare': 'Float64',
+            'Cabin': 'object',
+            'Embarked': 'category'
+        },
+        usecols=[
+            'PassengerId',
+            'Survived',
+            'Pclass',
+            'Sex',
+            'Age',
+            'SibSp',
+            'Parch',
+            'Fare',
+            'Cabin',
+            'Embarked'
+        ]
+    )
+    df_raw = clean.load_data(f'{dir_in}{file_in}', load_plan=load_plan)
+
+    columns_to_keep = [
+        'PassengerId',
+        'Survived',
+        'Pclass',
+        'SibSp',
+        'Parch',
+        'Fare'
+    ]
+
+    pipeline = Pipeline()
+    # Sex:
+    pipeline.add_step(
+        clean.rename_values,
+        inputs=['Sex'],
+        outputs=['sex'],
+        dict_map={'male': True, 'female': False}
+        )
+    # Age:
+    pipeline.add_step(
+        clean.impute_missing_with_median,
+        inputs=['Age'],
+        outputs=['age', 'age_imputed']
+        )
+    # Embarked:
+    pipeline.add_step(
+        clean.impute_missing_with_label,
+        inputs=['Embarked'],
+        outputs=['embarked', 'embarked_imputed'],
+        label='missing'
+        )
+    pipeline.add_step(
+        clean.apply_one_hot_encoding,
+        inputs=['embarked'],
+        outputs=['embarked_ohe']
+        )
+    # Cabin:
+    pipeline.add_step(
+        clean.split_strings_to_columns_by_delimiter,
+        inputs=['Cabin'],
+        outputs=['cabin_split'],
+        delimiter=' ',
+        max_columns=1
+        )
+    pipeline.add_step(
+        first_column,
+        inputs=['cabin_split'],
+        outputs=['cabin_first']
+        )
+    pipeline.add_step(
+        split_cabin_code,
+        inputs=['cabin_first'],
+        outputs=['cabin_letter', 'cabin_number']
+        )
+    pipeline.add_step(
+        clean.impute_missing_with_label,
+        inputs=['cabin_letter'],
+        outputs=['cabin_letter_filled', 'cabin_letter_imputed'],
+        label='missing'
+        )
+    pipeline.add_step(
+        clean.apply_one_hot_encoding,
+        inputs=['cabin_letter_filled'],
+        outputs=['cabin_letter_ohe']
+        )
+    pipeline.add_step(
+        clean.impute_missing_with_label,
+        inputs=['cabin_number'],
+        outputs=['cabin_number_filled', 'cabin_number_imputed'],
+        label=0
+        )
+
+    df_clean = pipeline.run(
+        df_raw,
+        keep=[
+            columns_to_keep,
+            'sex',
+            'age',
+            'age_imputed',
+            'embarked_ohe',
+            'embarked_imputed',
+            'cabin_letter_ohe',
+            'cabin_letter_imputed',
+            'cabin_number_filled',
+            'cabin_number_imputed'
+        ],
+        max_workers=max_workers,
+        cache=StepCache(cache_dir) if cache_steps else None
+        )
+
+    clean.save_data(df_clean, f'{dir_out}{file_out}')
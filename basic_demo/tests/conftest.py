@@ -0,0 +1,7 @@
+"""
+Let the tests import utils as the scripts in basic_demo/ do.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
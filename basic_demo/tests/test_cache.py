@@ -0,0 +1,36 @@
+"""
+Tests for utils.cache through the logged cleaning functions.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.clean_log as clean
+from utils.cache import start_cache, stop_cache
+from utils.impute import Imputer
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """A cache in a temporary folder, switched off afterwards."""
+    cache = start_cache(str(tmp_path / 'cache'))
+    yield cache
+    stop_cache()
+
+
+def test_chunked_load_is_not_cached(cache, tmp_path):
+    path = tmp_path / 'd.csv'
+    pd.DataFrame({'a': [1, 2, 3, 4, 5]}).to_csv(path, index=False)
+    for _ in range(2):
+        chunks = clean.load_data(str(path), chunksize=2)
+        assert [len(df) for df in chunks] == [2, 2, 1]
+    assert cache.hits == 0
+
+
+def test_inplace_call_is_always_run(cache):
+    for _ in range(2):
+        df = pd.DataFrame({'a': [1.0, 2.0, np.nan, 4.0]})
+        imputer = Imputer(median_columns=['a']).fit(df)
+        clean.impute_missing(df, imputer, inplace=True)
+        assert df['a'].tolist() == [1.0, 2.0, 2.0, 4.0]
+    assert cache.hits == 0
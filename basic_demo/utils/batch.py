@@ -0,0 +1,322 @@
+"""
+Clean many input files with the same steps, several at a time.
+
+Each input file, e.g. one extract per hospital, is cleaned by the
+same function in its own worker process:
+
+    def clean_site(df_raw):
+        series_sex = clean.rename_values(df_raw['S1Gender'], ...)
+        ...
+        return df_clean
+
+    df_summary = run_batch(
+        './input/sites/*.csv',
+        clean_site,
+        dir_out='./output/sites/',
+        path_combined='./output/all_sites_cleaned.csv',
+        max_workers=4,
+        memory_limit_mb=4000
+        )
+
+The inputs can be a glob pattern, a list of paths or one path. They
+can also be listed in a manifest passed as manifest=, either a .txt
+file with one path per line or a csv file with a "path" column.
+Paths in a manifest are relative to the manifest.
+
+The cleaned data from each file is saved next to the others in
+dir_out, or all of it is put together in input order and saved to
+path_combined, or both.
+
+If a log was started with utils.log.start_log_file(), each worker
+keeps its own log in memory and sends it back when it finishes. The
+logs are then written to the one log file under a heading for each
+input file, in input order, however the workers happened to finish.
+The function has to be defined at the top level of a module so that
+it can be sent to the worker processes.
+
+A file that fails doesn't stop the others. Its error is logged and
+put in the summary.
+"""
+import glob
+import io
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from utils.clean import load_data, save_data
+from utils.log import is_logging_enabled, log_heading, _send_to_log
+
+
+def find_inputs(inputs: any = None, manifest: str = None):
+    """
+    List the input files.
+
+    Inputs
+    ------
+    inputs   - str, list or None. One of:
+               + list of paths    - used as they are.
+               + path of a file   - that one file.
+               + anything else    - a glob pattern, e.g. "./in/*.csv".
+                                    Matches are sorted by name.
+    manifest - str or None. File listing the inputs instead, either a
+               .txt file with one path per line or a csv file with a
+               "path" column. Paths in it are relative to the
+               manifest.
+
+    Returns
+    -------
+    paths - list. Location of each input file, in order.
+    """
+    if (inputs is None) == (manifest is None):
+        raise ValueError('Give either inputs or manifest.')
+    if manifest is not None:
+        return _read_manifest(manifest)
+    if not isinstance(inputs, str):
+        return list(inputs)
+    if os.path.isfile(inputs):
+        return [inputs]
+    return sorted(glob.glob(inputs))
+
+
+def _read_manifest(manifest: str):
+    """List the paths in a manifest file."""
+    dir_manifest = os.path.dirname(manifest)
+    if manifest.endswith('.txt'):
+        with open(manifest, 'r') as f:
+            paths = [line.strip() for line in f]
+        paths = [p for p in paths if (len(p) > 0) and
+                 not p.startswith('#')]
+    else:
+        df_manifest = pd.read_csv(manifest)
+        if 'path' not in df_manifest.columns:
+            raise ValueError(f'{manifest} has no "path" column.')
+        paths = list(df_manifest['path'])
+    return [os.path.join(dir_manifest, p) for p in paths]
+
+
+def run_batch(
+        inputs: any,
+        func_clean,
+        dir_out: str = None,
+        path_combined: str = None,
+        suffix_out: str = '_cleaned.csv',
+        max_workers: int = None,
+        memory_limit_mb: int = None,
+        load_plan=None,
+        source_column: str = None,
+        manifest: str = None
+        ):
+    """
+    Clean every input file and save the results.
+
+    Inputs
+    ------
+    inputs          - str, list or None. Files to clean. See
+                      find_inputs().
+    func_clean      - function. Takes the raw DataFrame of one file
+                      and returns its cleaned DataFrame.
+    dir_out         - str or None. Folder to save each cleaned file
+                      in, named from the input file and suffix_out.
+    path_combined   - str or None. Location to save all of the cleaned
+                      data in one file, in input order.
+    suffix_out      - str. Ending for each cleaned file name. Its
+                      extension sets the file format.
+    max_workers     - int or None. Number of files to clean at once.
+                      If None, one per CPU.
+    memory_limit_mb - int or None. Most memory each worker can use.
+                      A worker that needs more gets a MemoryError for
+                      that file. Only on Linux and macOS.
+    load_plan       - utils.load_plan.LoadPlan or None. Columns and
+                      data types to read each file with.
+    source_column   - str or None. If given, add a column of this name
+                      to the combined data with the input file name.
+    manifest        - str or None. File listing the files to clean,
+                      if inputs is None. See find_inputs().
+
+    Returns
+    -------
+    df_summary - pd.DataFrame. One row per input file with its output
+                 location, number of rows, time taken and any error.
+    """
+    paths = find_inputs(inputs, manifest=manifest)
+    if dir_out is not None:
+        os.makedirs(dir_out, exist_ok=True)
+    log_enabled = is_logging_enabled()
+
+    results = [None] * len(paths)
+    i_next_log = 0
+    with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_start_worker,
+            initargs=(memory_limit_mb, )
+            ) as executor:
+        futures = {}
+        for i, path_in in enumerate(paths):
+            path_out = None
+            if dir_out is not None:
+                name = os.path.splitext(os.path.basename(path_in))[0]
+                path_out = os.path.join(dir_out, f'{name}{suffix_out}')
+            future = executor.submit(
+                _clean_one_file, path_in, path_out, func_clean, load_plan,
+                return_data=(path_combined is not None),
+                log_enabled=log_enabled
+                )
+            futures[future] = i
+
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # e.g. a worker process that was killed.
+                results[i] = _make_result(
+                    None, error=f'{type(e).__name__}: {e}')
+            # Write the logs of every file that is next in order:
+            while (i_next_log < len(paths)) and \
+                    (results[i_next_log] is not None):
+                _write_worker_log(paths[i_next_log], results[i_next_log])
+                i_next_log += 1
+
+    if path_combined is not None:
+        _save_combined(paths, results, path_combined, source_column)
+
+    df_summary = pd.DataFrame({
+        'input': paths,
+        'output': [r['output'] for r in results],
+        'rows': [r['rows'] for r in results],
+        'seconds': [r['seconds'] for r in results],
+        # Only the last line of each error. The whole traceback is
+        # in the log.
+        'error': [None if r['error'] is None else
+                  r['error'].rstrip('\n').split('\n')[-1]
+                  for r in results],
+    })
+    return df_summary
+
+
+def _start_worker(memory_limit_mb: int = None):
+    """
+    Set up a new worker process.
+
+    Any log handlers copied from the main process are removed, so
+    that the worker doesn't write to the main log file itself.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if memory_limit_mb is not None:
+        try:
+            import resource
+        except ImportError:
+            # Not available on Windows.
+            return
+        limit = int(memory_limit_mb) * 1024 ** 2
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _clean_one_file(
+        path_in: str,
+        path_out: str,
+        func_clean,
+        load_plan=None,
+        return_data: bool = False,
+        log_enabled: bool = False
+        ):
+    """
+    Load, clean and save one file in a worker process.
+
+    Returns
+    -------
+    result - dict. From _make_result().
+    """
+    buf = io.StringIO()
+    handler = None
+    if log_enabled:
+        # Keep this file's log in memory. Only the messages are kept.
+        # The main process adds the rest of each line when it writes
+        # them to its own log.
+        handler = logging.StreamHandler(buf)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+
+    time_start = time.perf_counter()
+    df_clean = None
+    error = None
+    try:
+        df_raw = load_data(path_in, load_plan=load_plan)
+        df_clean = func_clean(df_raw)
+        if path_out is not None:
+            save_data(df_clean, path_out)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        if handler is not None:
+            logging.getLogger().removeHandler(handler)
+
+    return _make_result(
+        path_out if error is None else None,
+        rows=None if df_clean is None else len(df_clean),
+        seconds=time.perf_counter() - time_start,
+        error=error,
+        log_text=buf.getvalue(),
+        df_clean=df_clean if (return_data and error is None) else None
+        )
+
+
+def _make_result(
+        path_out: str,
+        rows: int = None,
+        seconds: float = None,
+        error: str = None,
+        log_text: str = '',
+        df_clean: pd.DataFrame = None
+        ):
+    """Everything sent back from a worker about one file."""
+    return {
+        'output': path_out,
+        'rows': rows,
+        'seconds': seconds,
+        'error': error,
+        'log': log_text,
+        'data': df_clean,
+    }
+
+
+def _write_worker_log(path_in: str, result: dict):
+    """Add the log of one file to the main log under a heading."""
+    if not is_logging_enabled():
+        return
+    log_heading(path_in)
+    lines = result['log'].rstrip('\n').split('\n')
+    if result['error'] is not None:
+        lines += ['', 'Failed with this error:'] + \
+            result['error'].rstrip('\n').split('\n')
+    _send_to_log(lines, flush=True)
+
+
+def _save_combined(
+        paths: list,
+        results: list,
+        path_combined: str,
+        source_column: str = None
+        ):
+    """Put the cleaned data from every file together and save it."""
+    dfs = []
+    for path_in, result in zip(paths, results):
+        df = result['data']
+        if df is None:
+            continue
+        if source_column is not None:
+            df = df.assign(**{source_column: os.path.basename(path_in)})
+        dfs.append(df)
+    if len(dfs) == 0:
+        return
+    # Columns missing from some files are left as missing values:
+    df_combined = pd.concat(dfs, ignore_index=True)
+    save_data(df_combined, path_combined)
@@ -0,0 +1,414 @@
+"""
+Save the output of each cleaning step and reuse it on the next run.
+
+Every function in utils.clean_log goes through log_wrapper(). While
+the cache is switched on, log_wrapper() first works out a key for
+the call from:
++ the function  - its module, name and source code, so editing the
+                  function gives a new key.
++ the inputs    - a hash of the values in every DataFrame and Series,
+                  with their names and dtypes. Files passed by path
+                  are keyed on their size and time last changed
+                  rather than read.
++ the parameters - every other argument, e.g. dict_map or label.
+
+If a step with the same key has been run before, its output is loaded
+from disk instead of being worked out again. Otherwise the step is
+run and its output saved. Changing one step changes its output, so
+the steps after it get new keys too and are run again, while the
+steps before it are still loaded from the cache.
+
+Example:
+    start_log_file('example.log')
+    start_cache('./cache/', max_bytes=2 * 1024 ** 3)
+    import utils.clean_log as clean
+    ... run the cleaning steps as usual ...
+
+Outputs are stored with pickle, which keeps the dtypes and attrs of
+pandas objects exactly and is quick to load. Their names for the log
+are saved with them. When the files
+take up more than max_bytes, the ones used least recently are
+deleted first.
+
+Only the function's own source is in the key. After changing a helper
+that it calls, e.g. an underscore function in utils.clean, either
+call clear() or pass a new version to StepCache.
+
+Steps with side effects, e.g. save_data() writing a file, are always
+run and never saved, as loading their output wouldn't redo the side
+effect. save_data() and set_attrs_name() are marked like this here.
+Mark any others with never_cache(). Calls with inplace=True change
+their inputs, so are always run too.
+
+Outputs that can't be saved are returned as they are without being
+saved: None, iterators such as the chunks from
+load_data(chunksize=...), and anything pickle can't store.
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+from collections.abc import Iterator
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+# The cache being used by log_wrapper(), when caching:
+_cache = None
+
+# Module and name of functions that are always run rather than
+# loaded from the cache, because of their side effects:
+_never_cached = {
+    'utils.clean.save_data',
+    'utils.clean.set_attrs_name',
+}
+
+
+class StepCache:
+    """
+    Folder of saved step outputs, looked up by a key for each call.
+    """
+    def __init__(
+            self,
+            directory: str = './cache/',
+            max_bytes: int = 2 ** 30,
+            version: str = ''
+            ):
+        """
+        Inputs
+        ------
+        directory - str. Folder to save the outputs in. Made if it
+                    doesn't exist.
+        max_bytes - int. Most space the saved outputs can take up.
+        version   - str. Added to every key. Change it to stop using
+                    everything that was saved before.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        """Short description for the log."""
+        return (
+            f'StepCache({self.directory!r}, {self.hits} hits, ' +
+            f'{self.misses} misses)'
+            )
+
+    def make_key(self, f, args: tuple, kwargs: dict):
+        """
+        Key for calling f(*args, **kwargs).
+
+        Returns
+        -------
+        key - str. Hex digest that is the same whenever the function,
+              its inputs and its parameters are the same.
+        """
+        h = hashlib.sha256()
+        h.update(self.version.encode())
+        h.update(_describe_function(f).encode())
+        for arg in args:
+            h.update(_hash_value(arg))
+        # Sorted so that the order the kwargs were given in doesn't
+        # matter:
+        for key in sorted(kwargs):
+            h.update(key.encode())
+            h.update(_hash_value(kwargs[key]))
+        return h.hexdigest()
+
+    def run(self, f, args: tuple, kwargs: dict = {}):
+        """
+        Load the output of f(*args, **kwargs) or run it and save it.
+
+        Returns
+        -------
+        to_return  - whatever f returns.
+        from_cache - bool. Whether the output was loaded.
+        """
+        if is_never_cached(f) or _is_inplace(f, args, kwargs):
+            return f(*args, **kwargs), False
+        key = self.make_key(f, args, kwargs)
+        found, to_return = self.load(key)
+        if found:
+            self.hits += 1
+            return to_return, True
+        self.misses += 1
+        to_return = f(*args, **kwargs)
+        if _can_save(to_return):
+            self.save(key, to_return)
+        return to_return, False
+
+    def call(self, f, *args, **kwargs):
+        """
+        Same as f(*args, **kwargs) but using the cache.
+
+        For use with utils.pipeline, e.g. executor.submit(cache.call,
+        func, *args).
+        """
+        return self.run(f, args, kwargs)[0]
+
+    def load(self, key: str):
+        """
+        Load a saved output.
+
+        Returns
+        -------
+        found     - bool. Whether anything was saved for this key.
+        to_return - the saved output, or None if not found.
+        """
+        # Imported here because utils.log imports this module.
+        from utils.log import register_name
+
+        path = self._find_path(key)
+        try:
+            with open(path, 'rb') as f:
+                to_return, names = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError,
+                ValueError, TypeError):
+            # Missing, deleted part-way through being read, or saved
+            # in an older layout.
+            return False, None
+        # Give the loaded objects back their names for the log:
+        outputs = to_return if isinstance(to_return, tuple) else (to_return, )
+        for output, name in zip(outputs, names):
+            if name is not None:
+                register_name(output, name)
+        # Mark it as just used so it is the last to be deleted:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return True, to_return
+
+    def save(self, key: str, to_return: any):
+        """
+        Save an output under its key and make room if needed.
+
+        Returns
+        -------
+        saved - bool. False if pickle couldn't store the output.
+        """
+        # Imported here because utils.log imports this module.
+        from utils.log import find_registered_name
+
+        # Names from utils.log.register_name() aren't part of the
+        # objects, so save them alongside:
+        outputs = to_return if isinstance(to_return, tuple) else (to_return, )
+        names = [find_registered_name(output) for output in outputs]
+        path = self._find_path(key)
+        # Write to a file of its own first so that anything reading
+        # the cache at the same time never sees half a file:
+        path_temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(path_temp, 'wb') as f:
+                pickle.dump(
+                    (to_return, names), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # e.g. open files or lambdas inside the output.
+            os.remove(path_temp)
+            return False
+        os.replace(path_temp, path)
+        self.evict()
+        return True
+
+    def evict(self):
+        """Delete the least recently used outputs until under size."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already deleted by another process.
+                pass
+            total -= size
+
+    def clear(self):
+        """Delete every saved output."""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                os.remove(entry.path)
+
+    def _find_path(self, key: str):
+        """Location of the file for a key."""
+        return os.path.join(self.directory, f'{key}.pkl')
+
+
+def start_cache(
+        directory: str = './cache/',
+        max_bytes: int = 2 ** 30,
+        version: str = ''
+        ):
+    """
+    Start using the cache for every call through log_wrapper().
+
+    Inputs are as for StepCache.
+
+    Returns
+    -------
+    cache - StepCache. The cache in use, e.g. to check its hits.
+    """
+    global _cache
+    _cache = StepCache(directory, max_bytes=max_bytes, version=version)
+    return _cache
+
+
+def stop_cache():
+    """
+    Stop using the cache. The saved outputs are kept.
+
+    Returns
+    -------
+    cache - StepCache or None. The cache that was in use.
+    """
+    global _cache
+    cache = _cache
+    _cache = None
+    return cache
+
+
+def is_caching():
+    """Check whether calls are going through the cache."""
+    return _cache is not None
+
+
+def run_cached(f, args: tuple, kwargs: dict):
+    """
+    Run f(*args, **kwargs) through the cache in use.
+
+    Returns
+    -------
+    to_return  - whatever f returns.
+    from_cache - bool. Whether the output was loaded.
+    """
+    if _cache is None:
+        return f(*args, **kwargs), False
+    return _cache.run(f, args, kwargs)
+
+
+def never_cache(f):
+    """
+    Mark a function as always to be run, never loaded from the cache.
+
+    For steps with side effects, e.g. writing a file. Can be used as
+    a decorator.
+
+    Returns
+    -------
+    f - function. The same function.
+    """
+    _never_cached.add(_find_function_name(f))
+    return f
+
+
+def is_never_cached(f):
+    """Check whether a function is marked with never_cache()."""
+    return _find_function_name(f) in _never_cached
+
+
+def _is_inplace(f, args: tuple, kwargs: dict):
+    """Check whether a call changes its inputs with inplace=True."""
+    try:
+        bound = inspect.signature(f).bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        return kwargs.get('inplace', False) is True
+    bound.apply_defaults()
+    return bound.arguments.get('inplace', False) is True
+
+
+def _can_save(to_return: any):
+    """
+    Check whether an output is worth saving.
+
+    None and iterators, e.g. the chunks from load_data(chunksize=...),
+    are not. Iterators would be used up by saving them.
+    """
+    outputs = to_return if isinstance(to_return, tuple) else (to_return, )
+    if to_return is None:
+        return False
+    return not any(isinstance(output, Iterator) for output in outputs)
+
+
+def _find_function_name(f):
+    """Module and name of a function, e.g. "utils.clean.save_data"."""
+    name = getattr(f, '__qualname__', repr(f))
+    return f'{getattr(f, "__module__", None)}.{name}'
+
+
+@lru_cache(maxsize=None)
+def _describe_function(f):
+    """
+    Module, name and source code of a function.
+
+    These are the same on every call so only find them once.
+    """
+    try:
+        source = inspect.getsource(f)
+    except (OSError, TypeError):
+        # e.g. built-in functions, or functions made in the terminal.
+        code = getattr(f, '__code__', None)
+        source = repr(code.co_code) if code is not None else ''
+    name = getattr(f, '__qualname__', repr(f))
+    return f'{f.__module__}.{name}\n{source}'
+
+
+def _hash_value(value: any):
+    """
+    Digest of one argument for the key.
+
+    Returns
+    -------
+    digest - bytes. The same for equal values.
+    """
+    # Imported here because utils.log imports this module.
+    from utils.log import find_arg_name
+
+    h = hashlib.sha256()
+    h.update(type(value).__name__.encode())
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        # The name is part of the output, e.g. "Age_ImputedMedian":
+        h.update(repr(find_arg_name(value)).encode())
+        h.update(repr(value.attrs).encode())
+        if isinstance(value, pd.DataFrame):
+            h.update(repr(list(value.columns)).encode())
+            h.update(repr(list(value.dtypes)).encode())
+        else:
+            h.update(repr(value.dtype).encode())
+        try:
+            # One vectorised hash per row, covering every column:
+            hashes = pd.util.hash_pandas_object(value, index=True)
+            h.update(hashes.to_numpy().tobytes())
+        except TypeError:
+            # e.g. lists inside an object column can't be hashed.
+            h.update(pickle.dumps(value, protocol=4))
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, str) and os.path.isfile(value):
+        # A file to be read in. Key it on when it last changed rather
+        # than reading the whole thing.
+        stat = os.stat(value)
+        h.update(repr((value, stat.st_size, stat.st_mtime_ns)).encode())
+    elif hasattr(value, 'to_dict') and not isinstance(value, dict):
+        # e.g. fitted encoders and imputers.
+        h.update(json.dumps(
+            value.to_dict(), sort_keys=True, default=str).encode())
+    else:
+        try:
+            h.update(pickle.dumps(value, protocol=4))
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # e.g. lambdas. Fall back on how they are printed.
+            h.update(repr(value).encode())
+    return h.digest()
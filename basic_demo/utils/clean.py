@@ -3,103 +3,427 @@ Routines for cleaning input dataframe.
 
 Assumes that the data is stored as a Pandas DataFrame object.
 """
+import os
+
+import numpy as np
 import pandas as pd
-from utils.log import find_arg_name
+from utils.log import find_arg_name, register_name, find_registered_name, \
+    find_sparse_columns
+from utils.sketch import make_median_summary
+
+
+def load_data(
+        path_to_file: str,
+        chunksize: int = None,
+        columns: list = None,
+        dtype: dict = None,
+        memory_map: bool = False,
+        load_plan=None
+        ):
+    """
+    Import tabular data from csv, Parquet or Feather.
+
+    The file format is taken from the file extension:
+    + .parquet, .pq             - Parquet.
+    + .feather, .arrow, .ipc    - Feather / Arrow IPC.
+    + anything else             - csv.
+    Parquet and Feather need the optional pyarrow package.
 
+    Inputs
+    ------
+    path_to_file - str. Location of the file.
+    chunksize    - int or None. If given, don't read the whole file
+                   at once. Instead return an iterator of DataFrames
+                   that each contain at most this many rows.
+                   Only available for csv.
+    columns      - list or None. Only read in these columns, in this
+                   order. The other columns are never parsed.
+    dtype        - dict or None. Data type for each column, e.g.
+                   {'Age': 'float64'}. Applied when the file is
+                   parsed for csv and straight after for the others.
+    memory_map   - bool. Whether to map the file into memory rather
+                   than reading it in. This avoids an extra copy of
+                   the file for Feather and uncompressed Parquet.
+    load_plan    - utils.load_plan.LoadPlan or None. Columns and data
+                   types to use. Anything given in columns or dtype
+                   takes priority over the plan.
 
-def load_data(path_to_file: str):
-    """Import tabular data from csv."""
-    df = pd.read_csv(path_to_file)
+    Returns
+    -------
+    df - pd.DataFrame, or an iterator of pd.DataFrame if chunksize
+         was given. Chunks are named "df_{file}_chunk{i}".
+    """
     # Give a name to this DataFrame:
     file_name = path_to_file.split('/')[-1]  # = file.ext
     file_name = file_name.split('.')[0]      # = file
-    df.attrs['name'] = f'df_{file_name}'
+
+    if load_plan is not None:
+        if columns is None:
+            columns = load_plan.usecols
+        dtype = {**load_plan.dtypes, **(dtype if dtype is not None else {})}
+
+    file_format = _find_file_format(path_to_file)
+    if (chunksize is not None) & (file_format != 'csv'):
+        raise ValueError('Reading in chunks is only available for csv.')
+
+    if file_format == 'csv':
+        read_kwargs = dict(usecols=columns, dtype=dtype, memory_map=memory_map)
+        if chunksize is not None:
+            return _load_data_in_chunks(
+                path_to_file, chunksize, file_name, columns, read_kwargs)
+        df = pd.read_csv(path_to_file, **read_kwargs)
+        if columns is not None:
+            # usecols keeps the order of the file, so reorder:
+            df = df[columns]
+    elif file_format == 'parquet':
+        df = pd.read_parquet(
+            path_to_file, columns=columns, memory_map=memory_map)
+    else:
+        # pd.read_feather() can't memory-map the file,
+        # so use pyarrow directly.
+        import pyarrow.feather
+        table = pyarrow.feather.read_table(
+            path_to_file, columns=columns, memory_map=memory_map)
+        df = table.to_pandas()
+
+    if (dtype is not None) & (file_format != 'csv'):
+        # Skip any types given for columns that weren't read in:
+        df = df.astype({c: t for c, t in dtype.items() if c in df.columns})
+
+    register_name(df, f'df_{file_name}')
     return df
 
 
+def save_data(df: pd.DataFrame, path_to_file: str):
+    """
+    Save tabular data to csv, Parquet or Feather.
+
+    The file format is taken from the file extension in the same way
+    as for load_data(). The DataFrame index is not saved.
+
+    Sparse columns, e.g. from apply_one_hot_encoding(sparse=True),
+    can't be stored as sparse in any of these formats. They are
+    written as normal columns, one column or one chunk of rows at a
+    time so that the whole DataFrame is never dense in memory at once.
+
+    Inputs
+    ------
+    df           - pd.DataFrame. Data to save.
+    path_to_file - str. Location of the new file. Any existing file
+                   here is overwritten.
+
+    Returns
+    -------
+    path_to_file - str. Location of the new file.
+    """
+    file_format = _find_file_format(path_to_file)
+    if find_sparse_columns(df).any():
+        _save_data_with_sparse(df, path_to_file, file_format)
+    elif file_format == 'csv':
+        df.to_csv(path_to_file, index=False)
+    elif file_format == 'parquet':
+        df.to_parquet(path_to_file, index=False)
+    else:
+        # Feather can only store a default index:
+        df.reset_index(drop=True).to_feather(path_to_file)
+    return path_to_file
+
+
+def _save_data_with_sparse(
+        df: pd.DataFrame,
+        path_to_file: str,
+        file_format: str,
+        chunksize: int = 100000
+        ):
+    """
+    Save a DataFrame that has some sparse columns.
+
+    csv is written a chunk of rows at a time. Parquet and Feather
+    are built up as a pyarrow table one column at a time, so only
+    one sparse column is made dense at once.
+    """
+    if file_format == 'csv':
+        for i, start in enumerate(range(0, max(len(df), 1), chunksize)):
+            df_chunk = _make_sparse_columns_dense(
+                df.iloc[start:start + chunksize])
+            # Only write the column names at the top of the file:
+            df_chunk.to_csv(
+                path_to_file,
+                index=False,
+                mode='w' if i == 0 else 'a',
+                header=(i == 0)
+                )
+        return
+
+    import pyarrow as pa
+    is_sparse = find_sparse_columns(df)
+    # The dense columns keep their pandas metadata, e.g. for
+    # nullable integers:
+    table = pa.Table.from_pandas(
+        df.iloc[:, ~is_sparse], preserve_index=False)
+    for i in np.flatnonzero(is_sparse):
+        values = df.iloc[:, i].sparse.to_dense()
+        table = table.add_column(
+            int(i), str(df.columns[i]), pa.array(values))
+    if file_format == 'parquet':
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(table, path_to_file)
+    else:
+        import pyarrow.feather
+        pyarrow.feather.write_feather(table, path_to_file)
+
+
+def _make_sparse_columns_dense(df: pd.DataFrame):
+    """Copy of a DataFrame with any sparse columns made dense."""
+    dtypes_dense = {
+        column: dtype.subtype for column, dtype in df.dtypes.items()
+        if isinstance(dtype, pd.SparseDtype)
+        }
+    return df.astype(dtypes_dense)
+
+
+def _find_file_format(path_to_file: str):
+    """
+    Pick out the file format from the file extension.
+
+    Returns
+    -------
+    file_format - str. One of 'csv', 'parquet' or 'feather'.
+    """
+    extension = path_to_file.split('.')[-1].lower()
+    if extension in ['parquet', 'pq']:
+        file_format = 'parquet'
+    elif extension in ['feather', 'arrow', 'ipc']:
+        file_format = 'feather'
+    else:
+        file_format = 'csv'
+    return file_format
+
+
+def _load_data_in_chunks(
+        path_to_file: str,
+        chunksize: int,
+        file_name: str,
+        columns: list = None,
+        read_kwargs: dict = {}
+        ):
+    """
+    Yield named chunks of a csv file, at most chunksize rows each.
+
+    The row index carries on from one chunk to the next, so the
+    chunks can be stacked back together to give the full file.
+    """
+    with pd.read_csv(
+            path_to_file, chunksize=chunksize, **read_kwargs) as reader:
+        for i, df in enumerate(reader):
+            if columns is not None:
+                df = df[columns]
+            register_name(df, f'df_{file_name}_chunk{i}')
+            yield df
+
+
 def add_to_dataframe(df, *args):
     """
     Add the given data to the DataFrame.
 
     FIND A BETTER HOME FOR THIS - TO DO
+
+    All of the args are combined with df in a single step using
+    DataFrameCollector, so the DataFrame is only copied once
+    however many args there are.
+
+    Column names are kept unique by adding '0' to the end of any
+    new name that is already taken.
+
+    Inputs
+    ------
+    df    - pd.DataFrame. Existing data.
+    *args - pd.Series, pd.DataFrame, or anything that pd.Series()
+            can be made from. Data to add as new columns.
+
+    Returns
+    -------
+    df - pd.DataFrame. New DataFrame containing df and the args.
+    """
+    collector = DataFrameCollector(df)
+    collector.add(*args)
+    return collector.to_dataframe()
+
+
+class DataFrameCollector:
+    """
+    Gather Series and DataFrames to be combined into one DataFrame.
+
+    Nothing is copied until to_dataframe() is called, and then all
+    of the gathered data is joined in one pd.concat(). This is much
+    quicker than adding each piece to the DataFrame in turn, which
+    copies the whole DataFrame every time.
+
+    Example:
+        collector = DataFrameCollector(df_clean)
+        collector.add(series_sex)
+        collector.add(series_age, series_age_imputed)
+        df_clean = collector.to_dataframe()
+
+    Rows are matched up by index, the same as adding each piece in
+    turn. A Series only fills the rows already there, like
+    df[name] = series, so its other rows are dropped. A DataFrame is
+    joined like pd.concat(axis=1), so rows that are only in it are
+    added, with missing values in the columns before it. If df has no
+    rows or columns, the first piece sets the rows.
     """
-    def _add_series_to_dataframe(df, series):
+    def __init__(self, df: pd.DataFrame = None):
         """
-        WRITE ME
+        Inputs
+        ------
+        df - pd.DataFrame or None. Existing data to add to.
         """
-        series_name = find_arg_name(series)
-        # Check whether a column named this already exists.
-        success = False
-        while success is False:
-            try:
-                df[series_name]
-                # This column already exists, so update
-                # the name of the one we're about to make.
-                series_name += '0'
-            except KeyError:
-                # This column does not exist.
-                success = True
-        df[series_name] = series
-        return df
+        if df is None:
+            df = pd.DataFrame()
+        self.df = df
+        # Gathered pieces and the column names to give each one:
+        self._blocks = []
+        self._block_columns = []
+        # Every column name used so far:
+        self._names_taken = set(df.columns)
+
+    def add(self, *args):
+        """
+        Gather data to add to the DataFrame.
 
-    def _add_dataframe_to_dataframe(df, df_add):
-        # Check whether any columns already exist.
-        success = False
-        while success is False:
-            if len(set(df.columns) & set(df_add.columns)) == 0:
-                # No overlap between column names.
-                success = True
+        Inputs
+        ------
+        *args - pd.Series, pd.DataFrame, or anything that pd.Series()
+                can be made from.
+
+        Returns
+        -------
+        self - DataFrameCollector. So that calls can be chained.
+        """
+        for arg in args:
+            if isinstance(arg, pd.Series):
+                self._add_series(arg, find_arg_name(arg))
+            elif isinstance(arg, pd.DataFrame):
+                self._add_dataframe(arg)
             else:
-                # Pick out the repeats:
-                columns_dup = list(set(df.columns) & set(df_add.columns))
-                # Rename repeated columns:
-                df_add = df_add.rename(columns=dict(
-                    zip(columns_dup, [c + '0' for c in columns_dup]))
-                    )
-        # Combine dataframes:
-        df = pd.concat([df, df_add], axis=1)
+                # Turn it into a Series if possible.
+                try:
+                    series = pd.Series(arg)
+                    arg_name = find_arg_name(arg)
+                    if arg_name == arg:
+                        arg_name = '{unnamed}'
+                    self._add_series(series, arg_name)
+                except ():
+                    # ... TO DO - some sort of error catching here please.
+                    # Can't add this arg to the dataframe.
+                    # I can't actually get pandas to crash on purpose to
+                    # find out what error type it would be!
+                    pass
+        return self
+
+    def to_dataframe(self):
+        """
+        Combine the existing and gathered data in one go.
+
+        Returns
+        -------
+        df - pd.DataFrame. New DataFrame with the existing data
+             followed by the gathered data in the order it was added.
+        """
+        if len(self._blocks) == 0:
+            return self.df
+
+        columns = list(self.df.columns)
+        for block_columns in self._block_columns:
+            columns += block_columns
+
+        blocks, index = self._align_blocks()
+        df = pd.concat(blocks, axis=1)
+        if not df.index.equals(index):
+            # The outer join can put the rows in another order.
+            df = df.reindex(index)
+        df.columns = columns
+        # Keep the name of the existing data:
+        name = find_registered_name(self.df)
+        if name is not None:
+            register_name(df, name)
         return df
 
-    for arg in args:
-        if isinstance(arg, pd.Series):
-            df = _add_series_to_dataframe(df, arg)
-        elif isinstance(arg, pd.DataFrame):
-            df = _add_dataframe_to_dataframe(df, arg)
-        else:
-            # Turn it into a Series if possible.
-            try:
-                series = pd.Series(arg)
-                arg_name = find_arg_name(arg)
-                if arg_name == arg:
-                    arg_name = '{unnamed}'
-                series.name = arg_name
-                df = _add_series_to_dataframe(df, series)
-            except ():
-                # ... TO DO - some sort of error catching here please.
-                # Can't add this arg to the dataframe.
-                # I can't actually get pandas to crash on purpose to
-                # find out what error type it would be!
-                pass
-    return df
+    def _align_blocks(self):
+        """
+        Match the rows of each gathered piece as if added in turn.
+
+        Returns
+        -------
+        blocks - list. The existing data, if any, and the pieces with
+                 each Series cut down to the rows before it.
+        index  - pd.Index. Rows of the combined DataFrame.
+        """
+        started = (len(self.df.columns) > 0) | (len(self.df.index) > 0)
+        blocks = [self.df] if started else []
+        index = self.df.index
+        for block in self._blocks:
+            if not started:
+                index = block.index
+                started = True
+            elif isinstance(block, pd.Series):
+                if not block.index.equals(index):
+                    block = block.reindex(index)
+            elif not block.index.equals(index):
+                # Rows as pd.concat(axis=1) would give them, found
+                # without copying any data:
+                index = pd.concat([
+                    pd.DataFrame(index=index),
+                    pd.DataFrame(index=block.index)
+                    ], axis=1).index
+            blocks.append(block)
+        return blocks, index
+
+    def _add_series(self, series: pd.Series, series_name: str):
+        """Store a Series under a column name that isn't taken yet."""
+        # Check whether a column named this already exists.
+        while series_name in self._names_taken:
+            # This column already exists, so update
+            # the name of the one we're about to make.
+            series_name += '0'
+        self._names_taken.add(series_name)
+        self._blocks.append(series)
+        self._block_columns.append([series_name])
+
+    def _add_dataframe(self, df_add: pd.DataFrame):
+        """Store a DataFrame, renaming any columns that are taken."""
+        columns = list(df_add.columns)
+        # Check whether any columns already exist.
+        columns_dup = set(columns) & self._names_taken
+        while len(columns_dup) > 0:
+            # Rename repeated columns:
+            columns = [c + '0' if c in columns_dup else c for c in columns]
+            columns_dup = set(columns) & self._names_taken
+        self._names_taken.update(columns)
+        self._blocks.append(df_add)
+        self._block_columns.append(columns)
 
 
-def check_for_missing_data(df: pd.DataFrame):
+def check_for_missing_data(df: pd.DataFrame, profile: pd.DataFrame = None):
     """
     Find number of missing entries in each column of DataFrame.
 
     Inputs
     ------
-    df - pd.DataFrame. DataFrame to be checked for missing entries.
+    df      - pd.DataFrame. DataFrame to be checked for missing entries.
+    profile - pd.DataFrame or None. Output of profile_data() for df.
+              If given, the counts are taken from it rather than
+              counted again.
 
     Returns
     -------
     series_missing - pd.Series. Has an entry for each column of df
                         and its number of missing data points.
     """
-    # Make Series with index containing column names from df
-    # and first column containing number of missing entries
-    # in each column of df.
-    series_missing = df.isna().sum()
+    if profile is not None:
+        series_missing = profile['missing'].copy()
+    else:
+        series_missing = _count_missing(df)
 
     # Set the series name:
     input_df_name = find_arg_name(df)
@@ -107,7 +431,214 @@ def check_for_missing_data(df: pd.DataFrame):
     return series_missing
 
 
-def apply_one_hot_encoding(series: pd.Series, **kwargs):
+def _count_missing(df: pd.DataFrame):
+    """Number of missing entries in each column of df."""
+    is_sparse = find_sparse_columns(df)
+    if not is_sparse.any():
+        # Make Series with index containing column names from df
+        # and first column containing number of missing entries
+        # in each column of df.
+        series_missing = df.isna().sum()
+    else:
+        # df.isna() would make a sparse DataFrame of the same size.
+        # Count the sparse columns from their stored values instead.
+        counts = np.zeros(len(df.columns), dtype=np.int64)
+        counts[~is_sparse] = df.iloc[:, ~is_sparse].isna().sum().to_numpy()
+        for i in np.flatnonzero(is_sparse):
+            counts[i] = _count_missing_sparse(df.iloc[:, i].array)
+        series_missing = pd.Series(counts, index=df.columns)
+    return series_missing
+
+
+def profile_data(df: pd.DataFrame, deep_memory: bool = False):
+    """
+    Summarise every column of a DataFrame in one pass.
+
+    Replaces calling df.info(), df.isna().sum(), df.describe() and
+    series.unique() for each column separately. Columns with the same
+    numeric or bool dtype are done together as one block. Strings and
+    Categoricals are hashed once each, which gives both the missing
+    count and the number of unique values.
+
+    Inputs
+    ------
+    df          - pd.DataFrame. Data to profile.
+    deep_memory - bool. Whether to count the memory used by the
+                  strings themselves as well as the pointers to them.
+                  This takes another pass over string columns.
+
+    Returns
+    -------
+    df_profile - pd.DataFrame. One row per column of df:
+
+    +----------+----------+-------+---------+--------+-----+-----+--------+
+    |          | dtype    | count | missing | unique | min | max | memory |
+    +----------+----------+-------+---------+--------+-----+-----+--------+
+    | Age      | Float64  |   714 |     177 |     88 | 0.4 |  80 |   8019 |
+    | Embarked | category |   889 |       2 |      3 |     |     |   1003 |
+    +----------+----------+-------+---------+--------+-----+-----+--------+
+
+                 count is the number of non-missing values and memory
+                 is in bytes. min and max are left as None where the
+                 values can't be ordered, e.g. unordered Categoricals
+                 or mixed types.
+    """
+    memory = df.memory_usage(index=False, deep=deep_memory).to_numpy()
+    stats = {}
+
+    # Group the columns that can be summarised as a block:
+    block_columns = {}
+    for i, dtype in enumerate(df.dtypes):
+        if isinstance(dtype, pd.SparseDtype):
+            stats[i] = _profile_sparse(df.iloc[:, i].array)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            stats[i] = _profile_categorical(df.iloc[:, i])
+        elif (dtype == object) or pd.api.types.is_string_dtype(dtype):
+            stats[i] = _profile_strings(df.iloc[:, i])
+        else:
+            block_columns.setdefault(dtype, []).append(i)
+
+    for dtype, positions in block_columns.items():
+        block = df.iloc[:, positions]
+        if isinstance(dtype, np.dtype) and (dtype.kind in 'biuf'):
+            block_stats = _profile_numeric_block(block.to_numpy())
+        else:
+            # e.g. nullable integers or datetimes. Reductions over a
+            # block of one dtype are still done by pandas on the
+            # whole block at once rather than column by column:
+            block_stats = (
+                block.isna().sum().to_numpy(),
+                block.nunique().to_numpy(),
+                list(block.min()),
+                list(block.max())
+                )
+        for j, i in enumerate(positions):
+            stats[i] = tuple(values[j] for values in block_stats)
+
+    n_rows = len(df)
+    rows = []
+    for i, dtype in enumerate(df.dtypes):
+        n_missing, n_unique, value_min, value_max = stats[i]
+        rows.append((
+            str(dtype),
+            n_rows - int(n_missing),
+            int(n_missing),
+            int(n_unique),
+            None if pd.isna(value_min) else value_min,
+            None if pd.isna(value_max) else value_max,
+            int(memory[i]),
+            ))
+    df_profile = pd.DataFrame(
+        rows,
+        index=df.columns,
+        columns=['dtype', 'count', 'missing', 'unique', 'min', 'max',
+                 'memory']
+        )
+
+    # Set the DataFrame name:
+    input_df_name = find_arg_name(df)
+    register_name(df_profile, f'{input_df_name}_Profile')
+    return df_profile
+
+
+def _profile_numeric_block(values: np.array, max_bytes: int = 2 ** 26):
+    """
+    Missing counts, unique counts, mins and maxes of a 2D array.
+
+    Each column is sorted once. This is quicker than hashing every
+    value to count the unique ones, and the min and max come for free
+    as the first and last values. NaN is sorted to the end. Columns
+    are sorted a few at a time so that the sorted copy takes up at
+    most max_bytes.
+    """
+    n_rows, n_columns = values.shape
+    missing = np.zeros(n_columns, dtype=np.int64)
+    uniques = np.zeros(n_columns, dtype=np.int64)
+    mins = [None] * n_columns
+    maxs = [None] * n_columns
+    if n_rows == 0:
+        return missing, uniques, mins, maxs
+
+    step = max(1, max_bytes // (n_rows * values.itemsize))
+    for start in range(0, n_columns, step):
+        sorted_values = np.sort(values[:, start:start + step], axis=0)
+        if sorted_values.dtype.kind == 'f':
+            n_missing = np.isnan(sorted_values).sum(axis=0)
+        else:
+            n_missing = np.zeros(sorted_values.shape[1], dtype=np.int64)
+        n_valid = n_rows - n_missing
+        # Every change between neighbouring values starts a new
+        # unique value. NaN != NaN, so there are also n_missing
+        # changes from or between the NaNs at the end to take off.
+        n_changes = (sorted_values[1:] != sorted_values[:-1]).sum(axis=0)
+        uniques[start:start + step] = np.where(
+            n_valid > 0, n_changes - n_missing + 1, 0)
+        missing[start:start + step] = n_missing
+        for j in np.flatnonzero(n_valid > 0):
+            mins[start + j] = sorted_values[0, j]
+            maxs[start + j] = sorted_values[n_valid[j] - 1, j]
+    return missing, uniques, mins, maxs
+
+
+def _profile_sparse(values: pd.arrays.SparseArray):
+    """Missing count, unique count, min and max of a sparse column."""
+    n_missing = _count_missing_sparse(values)
+    stored = pd.Series(values.sp_values).dropna()
+    if len(stored) < len(values) and not pd.isna(values.fill_value):
+        # The fill value is one of the values too.
+        stored = pd.concat([stored, pd.Series([values.fill_value])])
+    if len(stored) == 0:
+        return n_missing, 0, None, None
+    return n_missing, stored.nunique(), stored.min(), stored.max()
+
+
+def _profile_categorical(series: pd.Series):
+    """Missing count, unique count, min and max of a Categorical."""
+    codes = series.cat.codes.to_numpy()
+    used = np.bincount(codes[codes >= 0],
+                       minlength=len(series.cat.categories)) > 0
+    n_missing = int((codes < 0).sum())
+    value_min = value_max = None
+    if series.cat.ordered and used.any():
+        # Categories are stored in their order, so the smallest and
+        # largest are the first and last that are used.
+        positions = np.flatnonzero(used)
+        value_min = series.cat.categories[positions[0]]
+        value_max = series.cat.categories[positions[-1]]
+    return n_missing, int(used.sum()), value_min, value_max
+
+
+def _profile_strings(series: pd.Series):
+    """Missing count, unique count, min and max of a string column."""
+    codes, uniques = pd.factorize(series)
+    n_missing = int((codes < 0).sum())
+    value_min = value_max = None
+    if len(uniques) > 0:
+        try:
+            # Only sort the unique values, not the whole column:
+            value_min = min(uniques)
+            value_max = max(uniques)
+        except TypeError:
+            # Mixed types, e.g. strings and numbers, can't be ordered.
+            pass
+    return n_missing, len(uniques), value_min, value_max
+
+
+def _count_missing_sparse(values: pd.arrays.SparseArray):
+    """Number of missing values in a sparse array."""
+    n_missing = int(pd.isna(values.sp_values).sum())
+    if pd.isna(values.fill_value):
+        # Every value that isn't stored is missing too.
+        n_missing += len(values) - len(values.sp_values)
+    return n_missing
+
+
+def apply_one_hot_encoding(
+        series: pd.Series,
+        categories: list = None,
+        encoder=None,
+        **kwargs
+        ):
     """
     Convert a single column to several one-hot encoded columns.
 
@@ -118,7 +649,8 @@ def apply_one_hot_encoding(series: pd.Series, **kwargs):
     + prefix_sep: str, default '_'
     + dummy_na: bool, default False
     + columns: list-like, default None
-    + sparse: bool, default False
+    + sparse: bool, default False. Only store the 1s, which uses
+              much less memory when there are many categories.
     + drop_first: bool, default False
     + dtype: dtype, default bool
 
@@ -134,8 +666,17 @@ def apply_one_hot_encoding(series: pd.Series, **kwargs):
 
     Inputs
     ------
-    series   - pd.Series. Column of data to be one-hot-encoded.
-    **kwargs - dict. Keyword arguments for pd.get_dummies().
+    series     - pd.Series. Column of data to be one-hot-encoded.
+    categories - list or None. If given, these are the only output
+                 columns, in this order, whatever values are actually
+                 in the series. Values not in the list are treated as
+                 missing. Use this when the same encoding has to be
+                 applied to separate chunks of one dataset.
+    encoder    - utils.encode.OneHotEncoder or None. If given, use
+                 this fitted encoder instead of pd.get_dummies(). The
+                 columns are then fixed by the encoder and categories
+                 and kwargs are not used.
+    **kwargs   - dict. Keyword arguments for pd.get_dummies().
 
     Returns
     -------
@@ -143,6 +684,22 @@ def apply_one_hot_encoding(series: pd.Series, **kwargs):
     """
     input_series_name = find_arg_name(series)
 
+    if encoder is not None:
+        # The encoder already knows the columns to make:
+        df_ohe = encoder.transform(series)
+        register_name(df_ohe, f'{input_series_name}_OHE')
+        return df_ohe
+
+    if categories is not None:
+        # Fix the set of output columns. pd.get_dummies() makes one
+        # column per category of a Categorical, even when that
+        # category doesn't appear in this series.
+        series = pd.Series(
+            pd.Categorical(series, categories=categories),
+            index=series.index,
+            name=series.name
+            )
+
     # If prefix wasn't given, take it now from the input series name:
     try:
         prefix = kwargs['prefix']
@@ -154,12 +711,13 @@ def apply_one_hot_encoding(series: pd.Series, **kwargs):
     df_ohe = pd.get_dummies(series, **kwargs)
 
     # Set the DataFrame name:
-    df_ohe.attrs['name'] = f'{input_series_name}_OHE'
+    register_name(df_ohe, f'{input_series_name}_OHE')
 
     return df_ohe
 
 
-def remove_one_hot_encoding(df: pd.DataFrame, columns: list):
+def remove_one_hot_encoding(
+        df: pd.DataFrame, columns: list, as_categorical: bool = False):
     """
     Convert one-hot-encoded DataFrame columns to one Series.
 
@@ -184,10 +742,16 @@ def remove_one_hot_encoding(df: pd.DataFrame, columns: list):
       > samuel_2_data_prep
         > 01_clean_raw_data.ipynb
 
+    To also check that each row has exactly one hot column, use
+    decode_one_hot_encoding() instead.
+
     Inputs
     ------
-    df      - pd.DataFrame. Contains one-hot-encoded columns.
-    columns - list. Names of the one-hot-encoded columns.
+    df             - pd.DataFrame. Contains one-hot-encoded columns.
+    columns        - list. Names of the one-hot-encoded columns.
+    as_categorical - bool. Whether to return a Categorical Series,
+                     which stores each row as a small integer code
+                     rather than a string. Uses much less memory.
 
     Returns
     -------
@@ -195,41 +759,168 @@ def remove_one_hot_encoding(df: pd.DataFrame, columns: list):
              that had the highest value for that row. For one-hot-
              encoded data, expect all but one values in a row to be 0.
     """
-    # Extract columns
-    col_extract: pd.DataFrame = df[columns]
     # Find which column contains the highest value for each patient.
     # Expect most rows to contain one 1 and the rest 0.
-    series: pd.Series = col_extract.idxmax(axis=1)
+    codes, n_hot = _decode_one_hot_block(df, columns)
     # The values in this Series are the column names from df.
-    # The values in col_extract and df remain unchanged.
-
-    # See if there's a common name between the given columns.
-    # Currently this assumes that the common name is at the start
-    # of all column names (as a prefix).
-    common_name = ''
-    i = 1
-    success = False
-    while success is False:
-        try:
-            common_list = [s[:i] for s in columns]
-        except IndexError:
-            # At least one of the column names is too short.
-            # Stop iterating now.
-            success = True
-        if len(set(common_list)) == 1:
-            # Update the common name.
-            common_name = common_list[0]
-        else:
-            # Strings are different. Stop iterating now.
-            success = True
+    # The values in df remain unchanged.
+    if as_categorical:
+        values = pd.Categorical.from_codes(codes, categories=columns)
+    else:
+        values = np.asarray(columns, dtype=object)[codes]
+    series = pd.Series(values, index=df.index)
 
     # Set the series name:
+    common_name = _find_common_prefix(columns)
     series.name = f'{common_name}_RemovedOHE'
 
     return series
 
 
-def rename_values(series: pd.Series, dict_map: dict):
+def decode_one_hot_encoding(df: pd.DataFrame, columns: list):
+    """
+    Convert one-hot-encoded columns to one Categorical Series and
+    flag rows that aren't properly one-hot-encoded.
+
+    Example:
+    +----+----+----+           +----+           +---------+
+    | c1 | c2 | c3 |           | c4 |           | invalid |
+    +----+----+----+           +----+           +---------+
+    |  0 |  1 |  0 |           | c2 |           |  False  |
+    |  1 |  0 |  0 |    -->    | c1 |    and    |  False  |
+    |  0 |  0 |  0 |           | NA |           |  True   |
+    |  1 |  0 |  1 |           | c1 |           |  True   |
+    +----+----+----+           +----+           +---------+
+
+    Rows with no hot column are set to missing. Rows with more than
+    one hot column take the first of them.
+
+    Inputs
+    ------
+    df      - pd.DataFrame. Contains one-hot-encoded columns.
+    columns - list. Names of the one-hot-encoded columns.
+
+    Returns
+    -------
+    series  - pd.Series. Categorical with the column names as the
+              categories.
+    invalid - pd.Series. True for each row that does not have
+              exactly one hot column.
+    """
+    codes, n_hot = _decode_one_hot_block(df, columns)
+    # Rows with nothing hot have no category:
+    codes[n_hot == 0] = -1
+    series = pd.Series(
+        pd.Categorical.from_codes(codes, categories=columns),
+        index=df.index
+        )
+    invalid = pd.Series(n_hot != 1, index=df.index)
+
+    # Set the series names:
+    common_name = _find_common_prefix(columns)
+    series.name = f'{common_name}_RemovedOHE'
+    invalid.name = f'{common_name}_InvalidOHE'
+
+    return series, invalid
+
+
+def one_hot_to_values(df: pd.DataFrame, columns: list, values: any):
+    """
+    Convert one-hot-encoded columns straight to one numeric Series.
+
+    Each one-hot column stands for one value, e.g. the middle of an
+    age band. This does the same job as remove_one_hot_encoding()
+    followed by rename_values() but without making a Series of
+    column names first.
+
+    Example:
+    +----+----+----+                                 +------+
+    | c1 | c2 | c3 |                                 |  c4  |
+    +----+----+----+                                 +------+
+    |  0 |  1 |  0 |    values                       | 42.5 |
+    |  1 |  0 |  0 |    {c1: 37.5, c2: 42.5,   -->   | 37.5 |
+    |  0 |  0 |  0 |     c3: 47.5}                   |  NaN |
+    |  0 |  0 |  1 |                                 | 47.5 |
+    +----+----+----+                                 +------+
+
+    Rows with no hot column are set to missing. Rows with more than
+    one hot column take the first of them.
+
+    Inputs
+    ------
+    df      - pd.DataFrame. Contains one-hot-encoded columns.
+    columns - list. Names of the one-hot-encoded columns.
+    values  - dict or list. The value for each column, either
+              as {column name: value} or in the same order as
+              columns.
+
+    Returns
+    -------
+    series - pd.Series. The value of the hot column in each row.
+    """
+    if isinstance(values, dict):
+        values = [values[c] for c in columns]
+    values = np.asarray(values, dtype=float)
+    if len(values) != len(columns):
+        raise ValueError(
+            f'Got {len(values)} values for {len(columns)} columns.')
+
+    codes, n_hot = _decode_one_hot_block(df, columns)
+    # Look up the value for each row's hot column:
+    series_values = values[codes]
+    # Rows with nothing hot have no value:
+    series_values[n_hot == 0] = np.nan
+    series = pd.Series(series_values, index=df.index)
+
+    # Set the series name:
+    common_name = _find_common_prefix(columns)
+    series.name = f'{common_name}_Values'
+
+    return series
+
+
+def _decode_one_hot_block(df: pd.DataFrame, columns: list):
+    """
+    Find the hot column in each row of a block of one-hot columns.
+
+    Works on the block as one NumPy array, which is fastest when the
+    columns are all bool or uint8.
+
+    Returns
+    -------
+    codes - np.array. Position in columns of the highest value in
+            each row. The first one wins if there's a tie.
+    n_hot - np.array. Number of non-zero values in each row.
+    """
+    values = df[columns].to_numpy()
+    if not (np.issubdtype(values.dtype, np.number) |
+            np.issubdtype(values.dtype, np.bool_)):
+        # e.g. nullable integers come out as objects.
+        values = df[columns].to_numpy(dtype=float, na_value=0.0)
+    elif np.issubdtype(values.dtype, np.floating):
+        # Missing values don't count as hot:
+        values = np.nan_to_num(values, nan=0.0)
+    codes = values.argmax(axis=1)
+    n_hot = np.count_nonzero(values, axis=1)
+    return codes, n_hot
+
+
+def _find_common_prefix(columns: list):
+    """
+    Find the start that all of the column names have in common.
+
+    e.g. ['Age40to44', 'Age45to49'] gives 'Age4'.
+    """
+    common_name = os.path.commonprefix([str(c) for c in columns])
+    return common_name
+
+
+def rename_values(
+        series: pd.Series,
+        dict_map: dict,
+        use_codes: bool = False,
+        report_unmapped: bool = False
+        ):
     """
     Make a copy of a pd.Series with the values renamed.
 
@@ -252,24 +943,98 @@ def rename_values(series: pd.Series, dict_map: dict):
 
     Example dictionary map to match gender M/F to 1/0:
       dict_map: dict = {'M': 1, 'F': 0}
+
+    Values that aren't in dict_map become missing.
+
+    Inputs
+    ------
+    series          - pd.Series. The values to rename.
+    dict_map        - dict. Old value to new value.
+    use_codes       - bool. Whether to rename each distinct value
+                      only once and then copy the new values to every
+                      row. Much faster when there are only a few
+                      distinct values in many rows. A Categorical
+                      series keeps its codes this way, but the renamed
+                      series is not Categorical.
+    report_unmapped - bool. Whether to also return which rows have a
+                      value that isn't in dict_map.
+
+    Returns
+    -------
+    renamed  - pd.Series. Copy of the series with the values renamed.
+    unmapped - pd.Series. Only if report_unmapped is True. True for
+               each row whose value was not missing and isn't in
+               dict_map, so it is now missing.
     """
-    # The "series" object is not changed. The "renamed" object
-    # is a copy of the "series" object with the values renamed.
-    renamed: pd.Series = series.map(dict_map)
+    if use_codes:
+        renamed, unmapped = _rename_values_by_codes(series, dict_map)
+    else:
+        # The "series" object is not changed. The "renamed" object
+        # is a copy of the "series" object with the values renamed.
+        renamed: pd.Series = series.map(dict_map)
+        if report_unmapped:
+            unmapped = series.notna() & ~series.isin(list(dict_map.keys()))
 
     # Set name of this series:
     input_series_name = find_arg_name(series)
     renamed.name = f'{input_series_name}_Renamed'
 
-    return renamed
+    if report_unmapped:
+        unmapped = pd.Series(np.asarray(unmapped, dtype=bool),
+                             index=series.index)
+        unmapped.name = f'{input_series_name}_Unmapped'
+        return renamed, unmapped
+    else:
+        return renamed
+
+
+def _rename_values_by_codes(series: pd.Series, dict_map: dict):
+    """
+    Rename each distinct value once and gather the results by code.
+
+    Returns
+    -------
+    renamed  - pd.Series. The renamed values.
+    unmapped - np.array. True where a value isn't in dict_map.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # The codes are already there.
+        codes = series.cat.codes.to_numpy()
+        uniques = pd.Series(series.cat.categories)
+    else:
+        # Missing values get the code -1.
+        codes, uniques = pd.factorize(series)
+        uniques = pd.Series(uniques)
+
+    # Only the distinct values go through the dict lookup:
+    renamed_uniques = uniques.map(dict_map)
+    unmapped_uniques = ~uniques.isin(list(dict_map.keys())).to_numpy()
+
+    # Copy the new values to every row. Code -1 becomes missing.
+    if isinstance(renamed_uniques.dtype, np.dtype):
+        renamed_uniques = renamed_uniques.to_numpy()
+    else:
+        # Keep extension types such as nullable integers.
+        renamed_uniques = renamed_uniques.array
+    renamed = pd.Series(
+        pd.api.extensions.take(renamed_uniques, codes, allow_fill=True),
+        index=series.index
+        )
+    unmapped = np.append(unmapped_uniques, False)[codes]
+    return renamed, unmapped
 
 
 def split_strings_to_columns_by_delimiter(
-        series: pd.Series, delimiter: str = ','):
+        series: pd.Series,
+        delimiter: str = ',',
+        max_columns: int = None,
+        engine: str = 'python'
+        ):
     """
     Split column strings by a delimiter, store in multiple columns.
 
-    Wrapper for pd.Series.str.split()
+    Wrapper for pd.Series.str.split(), or for pyarrow's split_pattern
+    with engine='pyarrow'.
 
     Example, for delimiter " ":
     +------------------+           +-------+--------------+
@@ -286,9 +1051,19 @@ def split_strings_to_columns_by_delimiter(
 
     Inputs
     ------
-    series    - pd.Series. The column to be split.
-    delimiter - str. Move to the next column whenever this delimiter
-                is met.
+    series      - pd.Series. The column to be split.
+    delimiter   - str. Move to the next column whenever this delimiter
+                  is met. Always taken as plain text, never as a
+                  regular expression, by both engines.
+    max_columns - int or None. Only keep this many pieces from the
+                  start of each string and throw away the rest.
+                  If None, keep every piece.
+    engine      - str. How to split the strings:
+                  + 'python'  - pd.Series.str.split(). The new columns
+                                hold Python strings.
+                  + 'pyarrow' - split in pyarrow. Much faster, and the
+                                new columns hold pyarrow strings
+                                (pd.ArrowDtype). Needs pyarrow.
 
     Returns
     -------
@@ -297,9 +1072,20 @@ def split_strings_to_columns_by_delimiter(
     """
     n = find_arg_name(series)
 
-    # Split each cell into multiple columns, one new column for
-    # each delimiter hit in the original string.
-    df_split = series.str.split(delimiter, expand=True)
+    if engine == 'pyarrow':
+        df_split = _split_strings_with_arrow(series, delimiter, max_columns)
+    elif engine == 'python':
+        # Split each cell into multiple columns, one new column for
+        # each delimiter hit in the original string.
+        # With max_columns, stop splitting after that many pieces
+        # and then drop the rest of the string.
+        df_split = series.str.split(
+            delimiter, n=max_columns, expand=True, regex=False)
+        if max_columns is not None:
+            df_split = df_split.iloc[:, :max_columns]
+    else:
+        raise ValueError(
+            f"engine must be 'python' or 'pyarrow', not {engine!r}.")
 
     # Label the new columns for the original series name.
     # Results in names "{series.name}_0", "{series.name}_1" etc.
@@ -310,8 +1096,54 @@ def split_strings_to_columns_by_delimiter(
     return df_split
 
 
+def _split_strings_with_arrow(
+        series: pd.Series, delimiter: str, max_columns: int = None):
+    """
+    Split strings into columns using pyarrow.
+
+    Each string becomes a list of pieces in one pyarrow list array.
+    The i-th column is then picked out of the list array's values by
+    position, so no Python objects are made for each row.
+
+    Returns
+    -------
+    df_split - pd.DataFrame. Columns numbered from 0, of pyarrow
+               strings.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    strings = pa.array(series, type=pa.string(), from_pandas=True)
+    if isinstance(strings, pa.ChunkedArray):
+        strings = strings.combine_chunks()
+    # Only split as many times as needed for the kept columns:
+    lists = pc.split_pattern(strings, pattern=delimiter,
+                             max_splits=max_columns)
+
+    pieces = lists.values
+    # Position in pieces of the first piece of each string:
+    starts = lists.offsets.to_numpy()[:-1]
+    lengths = pc.list_value_length(lists).fill_null(0).to_numpy()
+
+    n_columns = max(int(lengths.max()) if len(lengths) > 0 else 0, 1)
+    if max_columns is not None:
+        n_columns = min(n_columns, max_columns)
+
+    columns = {}
+    for i in range(n_columns):
+        # Strings with fewer than i+1 pieces get a missing value:
+        missing = lengths <= i
+        positions = pa.array(np.where(missing, 0, starts + i), mask=missing)
+        columns[i] = pd.arrays.ArrowExtensionArray(pieces.take(positions))
+    df_split = pd.DataFrame(columns, index=series.index)
+    return df_split
+
+
 def split_strings_to_columns_by_index(
-        series: pd.Series, split_index: 'int | list'):
+        series: pd.Series,
+        split_index: 'int | list',
+        use_codes: bool = False
+        ):
     """
     Split column strings at given indices, store in multiple columns.
 
@@ -327,6 +1159,7 @@ def split_strings_to_columns_by_index(
 
     Missing values are unaffected by this. All of the new columns
     for a missing data point will contain only missing values.
+    Pieces that would be empty strings are also missing.
 
     Inputs
     ------
@@ -334,6 +1167,11 @@ def split_strings_to_columns_by_index(
     split_index - int or list. Cutoff points for the string splits.
                   e.g. index 5 will split the string after the first
                   five characters.
+    use_codes   - bool. Whether to split each distinct string only
+                  once and then copy the pieces to every row. Much
+                  faster for codes like cabins or wards that repeat
+                  over many rows. A Categorical series always uses
+                  its codes.
 
     Returns
     -------
@@ -343,31 +1181,38 @@ def split_strings_to_columns_by_index(
     # Find the name of the starting series:
     n = find_arg_name(series)
 
-    # If the user gave a single split, put it in a list
-    # so that the below loop works:
+    # If the user gave a single split, put it in a list:
     if isinstance(split_index, (int, float)):
         split_index = [split_index]
+    # Start and end of each piece. The first piece starts from the
+    # start of the string and the last piece runs to the end.
+    # Make a new list so that the caller's list isn't changed.
+    bounds = [None] + list(split_index) + [None]
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        strings = pd.Series(series.cat.categories, dtype=object)
+    elif use_codes:
+        # Missing values get the code -1.
+        codes, uniques = pd.factorize(series)
+        strings = pd.Series(uniques, dtype=object)
+    else:
+        codes = None
+        strings = series
 
-    # Add an extra index so that the final piece of the string
-    # is added into the column.
-    split_index += [None]
-
-    df_split = pd.DataFrame()
-    for i, ind_end in enumerate(split_index):
-        if i == 0:
-            # Start from the start of the string.
-            ind_start = None
-        else:
-            # Start from the previous cut-off.
-            ind_start = split_index[i-1]
-
+    pieces = {}
+    for i in range(len(bounds) - 1):
         # The contents of this column:
-        series_split = series.str[ind_start:ind_end]
-        # Set empty strings to missing.
-        series_split = series_split.replace('', pd.NA)
+        piece = _set_empty_strings_missing(
+            strings.str[bounds[i]:bounds[i + 1]])
+        if codes is not None:
+            # Copy the pieces of the distinct strings to every row.
+            # Code -1 becomes missing.
+            piece = pd.api.extensions.take(piece, codes, allow_fill=True)
+        pieces[f'{n}_{i}'] = piece
 
-        # Place this column in the results DataFrame:
-        df_split[f'{n}_{i}'] = series_split
+    # Make the results DataFrame in one go:
+    df_split = pd.DataFrame(pieces, index=series.index)
 
     # Name the resulting DataFrame:
     df_split = set_attrs_name(df_split, f'{n}_SplitByIndex')
@@ -375,20 +1220,65 @@ def split_strings_to_columns_by_index(
     return df_split
 
 
-def impute_missing_with_median(_series: pd.Series):
+def _set_empty_strings_missing(series: pd.Series):
+    """
+    Values of a Series of strings with empty strings made missing.
+
+    Returns
+    -------
+    values - np.array or pandas ExtensionArray.
+    """
+    if series.dtype == object:
+        # One comparison over the whole array, which is much quicker
+        # than series.replace():
+        values = series.to_numpy()
+        values[values == ''] = np.nan
+    else:
+        # e.g. pandas string types, which have their own missing value.
+        values = series.mask(series == '').array
+    return values
+
+
+def impute_missing_with_median(
+        _series: pd.Series,
+        median: float = None,
+        method: str = 'exact'
+        ):
     """
     Replace missing values in a Pandas series with median.
 
     Returns a comppleted series, and a series shwoing which values are imputed
 
+    If median is given, use that value instead of the median of this
+    series. This is for when the series is only one chunk of a larger
+    dataset and the median has been found beforehand from all of it,
+    e.g. with utils.stream.fit_median().
+
+    method sets how the median is found when it isn't given:
+    + 'exact'     - series.median().
+    + 'histogram' - exact, from a count of each integer. Only for
+                    whole numbers. Quicker than sorting for big
+                    columns with a small range of values.
+    + 'sketch'    - approximate, from a quantile sketch.
+    See utils.sketch for summaries that can be merged across chunks.
+
     Original in Mike A's Titanic preprocessing notebook:
     https://michaelallen1966.github.io/titanic/01_preprocessing.html
     (Accessed 12th January 2024).
     """
     # Copy the series to avoid change to the original series.
     series = _series.copy()
-    median = series.median()
+    if median is None:
+        if method == 'exact':
+            median = series.median()
+        else:
+            median = make_median_summary(method).update(series).median()
     missing = series.isna()
+    if pd.api.types.is_integer_dtype(series.dtype) and missing.any() and \
+            not float(median).is_integer():
+        # A median halfway between two integers, e.g. 2.5, can't go in
+        # an Int64 column, so the column becomes Float64.
+        series = series.astype('Float64')
     series[missing] = median
 
     # Set the series names:
@@ -413,6 +1303,10 @@ def impute_missing_with_label(
     # Copy the series to avoid change to the original series.
     series = _series.copy()
     missing = series.isna()
+    if isinstance(series.dtype, pd.CategoricalDtype) & missing.any():
+        # The label has to be a category before it can be used.
+        if label not in series.cat.categories:
+            series = series.cat.add_categories([label])
     series[missing] = label
 
     # Set the series names:
@@ -423,12 +1317,81 @@ def impute_missing_with_label(
     return series, missing
 
 
+def impute_missing(df: pd.DataFrame, imputer, inplace: bool = False):
+    """
+    Replace missing values in many columns at once.
+
+    Fills in the median columns and label columns of a fitted
+    utils.impute.Imputer in one pass. Does the same job as calling
+    impute_missing_with_median() and impute_missing_with_label() on
+    each column.
+
+    Inputs
+    ------
+    df      - pd.DataFrame. Contains the imputer's columns.
+    imputer - utils.impute.Imputer. Fitted imputer.
+    inplace - bool. Whether to fill in df itself rather than a copy.
+
+    Returns
+    -------
+    df_imputed - pd.DataFrame. df with the missing values filled in.
+    indicators - pd.DataFrame, pd.Series or None. Which values were
+                 filled in, as set by the imputer.
+    """
+    input_df_name = find_arg_name(df)
+    df_imputed, indicators = imputer.transform(df, inplace=inplace)
+
+    # Set the names. If inplace, df itself is renamed:
+    df_imputed = set_attrs_name(df_imputed, f'{input_df_name}_Imputed')
+    if isinstance(indicators, pd.DataFrame):
+        indicators = set_attrs_name(
+            indicators, f'{input_df_name}_WasImputed')
+    return df_imputed, indicators
+
+
+def validate_data(df: pd.DataFrame, rule_set):
+    """
+    Find values that break a set of rules and deal with them.
+
+    Impossible values, e.g. a negative age, and rare values that could
+    identify someone are replaced, clipped, dropped or marked as set
+    by each rule. Every rule is checked in one pass over the columns.
+
+    Inputs
+    ------
+    df       - pd.DataFrame. Contains the columns of the rules.
+    rule_set - utils.validate.RuleSet. The rules, fitted first if
+               there are rare-value rules.
+
+    Returns
+    -------
+    df_valid   - pd.DataFrame. df with the rules' actions done.
+    df_marks   - pd.DataFrame. One bool column per rule with the
+                 'mark' action. True where the rule is broken.
+    df_summary - pd.DataFrame. Number and percentage of rows that
+                 break each rule.
+    """
+    input_df_name = find_arg_name(df)
+    df_valid, df_marks, df_summary = rule_set.apply(df)
+
+    # Set the names:
+    df_valid = set_attrs_name(df_valid, f'{input_df_name}_Valid')
+    df_marks = set_attrs_name(df_marks, f'{input_df_name}_Violations')
+    df_summary = set_attrs_name(
+        df_summary, f'{input_df_name}_ViolationSummary')
+    return df_valid, df_marks, df_summary
+
+
 def set_attrs_name(obj: any, obj_name: str):
     """
-    Store a name for this object in its attrs dict or as Series name.
+    Store a name for this object for the log or as Series name.
 
     TO DO - find a better home for this!
 
+    Names of anything other than a Series are kept by
+    utils.log.register_name(), which also writes them to obj.attrs
+    where there is one.
+
     Inputs
     ------
     obj      - any. e.g. a DataFrame or Series to rename.
@@ -439,9 +1402,7 @@ def set_attrs_name(obj: any, obj_name: str):
         # Update the column name:
         obj.name = obj_name
     else:
-        try:
-            obj.attrs['name'] = obj_name
-        except AttributeError:
+        if not register_name(obj, obj_name):
             # # Can't set the attributes for this object.
             # log_text(''.join([
             #     'set_attrs_name failed. ',
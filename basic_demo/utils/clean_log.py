@@ -16,6 +16,15 @@ def load_data(*args, **kwargs):
     return log.log_wrapper(f, args, kwargs)
 
 
+def save_data(*args, **kwargs):
+    """
+    Wrapper for clean.save_data().
+    """
+    log.log_step('Save data to file.')
+    f = clean.save_data
+    return log.log_wrapper(f, args, kwargs)
+
+
 def add_to_dataframe(*args, **kwargs):
     """
     Wrapper for clean.add_to_dataframe().
@@ -32,22 +41,46 @@ def check_for_missing_data(*args, **kwargs):
     Wrapper for clean.check_for_missing_data().
     """
     log.log_step('Record missing data.')
-    # Assume that the dataframe is the first arg.
-    log.log_dataframe_contents(args[0])
+    if log.is_logging_enabled() and (len(args) < 2) and \
+            (kwargs.get('profile') is None):
+        # Assume that the dataframe is the first arg.
+        # Profile it once for the log and reuse its missing counts
+        # rather than going over the data a second time.
+        df_profile = clean.profile_data(args[0])
+        log.log_dataframe_profile(df_profile)
+        kwargs = {**kwargs, 'profile': df_profile}
     f = clean.check_for_missing_data
     return log.log_wrapper(f, args, kwargs)
 
 
+def profile_data(*args, **kwargs):
+    """
+    Wrapper for clean.profile_data().
+    """
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the DataFrame is the first arg.
+        df = args[0]
+        df_name = log.find_arg_name(df)
+
+        log.log_step(f'{df_name}: profile columns.')
+    f = clean.profile_data
+    df_profile = log.log_wrapper(f, args, kwargs)
+    log.log_dataframe_profile(df_profile)
+    return df_profile
+
+
 def apply_one_hot_encoding(*args, **kwargs):
     """
     Wrapper for clean.apply_one_hot_encoding().
     """
-    # Set up string for log.log_step().
-    # Assume that the series is the first arg.
-    series = args[0]
-    series_name = log.find_arg_name(series)
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the series is the first arg.
+        series = args[0]
+        series_name = log.find_arg_name(series)
 
-    log.log_step(f'{series_name}: one-hot-encode.')
+        log.log_step(f'{series_name}: one-hot-encode.')
     f = clean.apply_one_hot_encoding
     return log.log_wrapper(f, args, kwargs)
 
@@ -56,26 +89,59 @@ def remove_one_hot_encoding(*args, **kwargs):
     """
     Wrapper for clean.remove_one_hot_encoding().
     """
-    # Take the first column name for the label.
-    # Assume that columns were given as the second arg.
-    cols = args[1]
-    col1_name = cols[0]
+    if log.is_logging_steps():
+        # Take the first column name for the label.
+        # Assume that columns were given as the second arg.
+        cols = args[1]
+        col1_name = cols[0]
 
-    log.log_step(f'{col1_name} etc.: remove one-hot-encoding.')
+        log.log_step(f'{col1_name} etc.: remove one-hot-encoding.')
     f = clean.remove_one_hot_encoding
     return log.log_wrapper(f, args, kwargs)
 
 
+def decode_one_hot_encoding(*args, **kwargs):
+    """
+    Wrapper for clean.decode_one_hot_encoding().
+    """
+    if log.is_logging_steps():
+        # Take the first column name for the label.
+        # Assume that columns were given as the second arg.
+        cols = args[1]
+        col1_name = cols[0]
+
+        log.log_step(f'{col1_name} etc.: decode one-hot-encoding.')
+    f = clean.decode_one_hot_encoding
+    return log.log_wrapper(f, args, kwargs)
+
+
+def one_hot_to_values(*args, **kwargs):
+    """
+    Wrapper for clean.one_hot_to_values().
+    """
+    if log.is_logging_steps():
+        # Take the first column name for the label.
+        # Assume that columns were given as the second arg.
+        cols = args[1]
+        col1_name = cols[0]
+
+        log.log_step(f'{col1_name} etc.: convert one-hot-encoding ' +
+                     'to values.')
+    f = clean.one_hot_to_values
+    return log.log_wrapper(f, args, kwargs)
+
+
 def rename_values(*args, **kwargs):
     """
     Wrapper for clean.rename_values().
     """
-    # Set up string for log.log_step().
-    # Assume that the series is the first arg.
-    series = args[0]
-    series_name = log.find_arg_name(series)
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the series is the first arg.
+        series = args[0]
+        series_name = log.find_arg_name(series)
 
-    log.log_step(f'{series_name}: rename values.')
+        log.log_step(f'{series_name}: rename values.')
     f = clean.rename_values
     return log.log_wrapper(f, args, kwargs)
 
@@ -84,12 +150,13 @@ def split_strings_to_columns_by_delimiter(*args, **kwargs):
     """
     Wrapper for clean.split_strings_to_columns_by_delimiter().
     """
-    # Set up string for log.log_step().
-    # Assume that the series is the first arg.
-    series = args[0]
-    series_name = log.find_arg_name(series)
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the series is the first arg.
+        series = args[0]
+        series_name = log.find_arg_name(series)
 
-    log.log_step(f'{series_name}: split into multiple columns.')
+        log.log_step(f'{series_name}: split into multiple columns.')
     f = clean.split_strings_to_columns_by_delimiter
     return log.log_wrapper(f, args, kwargs)
 
@@ -98,12 +165,13 @@ def split_strings_to_columns_by_index(*args, **kwargs):
     """
     Wrapper for clean.split_strings_to_columns_by_index().
     """
-    # Set up string for log.log_step().
-    # Assume that the series is the first arg.
-    series = args[0]
-    series_name = log.find_arg_name(series)
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the series is the first arg.
+        series = args[0]
+        series_name = log.find_arg_name(series)
 
-    log.log_step(f'{series_name}: split into multiple columns.')
+        log.log_step(f'{series_name}: split into multiple columns.')
     f = clean.split_strings_to_columns_by_index
     return log.log_wrapper(f, args, kwargs)
 
@@ -112,12 +180,13 @@ def impute_missing_with_median(*args, **kwargs):
     """
     Wrapper for clean.impute_missing_with_median().
     """
-    # Set up string for log.log_step().
-    # Assume that the series is the first arg.
-    series = args[0]
-    series_name = log.find_arg_name(series)
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the series is the first arg.
+        series = args[0]
+        series_name = log.find_arg_name(series)
 
-    log.log_step(f'{series_name}: impute missing values with median.')
+        log.log_step(f'{series_name}: impute missing values with median.')
     f = clean.impute_missing_with_median
     return log.log_wrapper(f, args, kwargs)
 
@@ -126,16 +195,49 @@ def impute_missing_with_label(*args, **kwargs):
     """
     Wrapper for clean.imput_missing_with_missing_label().
     """
-    # Set up string for log.log_step().
-    # Assume that the series is the first arg.
-    series = args[0]
-    series_name = log.find_arg_name(series)
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the series is the first arg.
+        series = args[0]
+        series_name = log.find_arg_name(series)
 
-    log.log_step(f'{series_name}: impute missing values with label.')
+        log.log_step(f'{series_name}: impute missing values with label.')
     f = clean.impute_missing_with_label
     return log.log_wrapper(f, args, kwargs)
 
 
+def impute_missing(*args, **kwargs):
+    """
+    Wrapper for clean.impute_missing().
+    """
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the DataFrame is the first arg.
+        df = args[0]
+        df_name = log.find_arg_name(df)
+
+        log.log_step(f'{df_name}: impute missing values.')
+    f = clean.impute_missing
+    return log.log_wrapper(f, args, kwargs)
+
+
+def validate_data(*args, **kwargs):
+    """
+    Wrapper for clean.validate_data().
+    """
+    if log.is_logging_steps():
+        # Set up string for log.log_step().
+        # Assume that the DataFrame is the first arg.
+        df = args[0]
+        df_name = log.find_arg_name(df)
+
+        log.log_step(f'{df_name}: check values against rules.')
+    f = clean.validate_data
+    to_return = log.log_wrapper(f, args, kwargs)
+    log.log_violation_summary(to_return[2])
+    return to_return
+
+
 def set_attrs_name(*args, **kwargs):
     """
     Wrapper for clean.set_attrs_name().
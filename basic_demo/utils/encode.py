@@ -0,0 +1,290 @@
+"""
+One-hot encoders that are fitted once and reused.
+
+pd.get_dummies() makes one column for each value that happens to be
+in the data it is given. Two chunks of the same file, or the data a
+model was trained on and new data to score, can then end up with
+different columns. An encoder stores the categories and the order of
+the columns when it is fitted, and every later transform gives
+exactly those columns, e.g.:
+
+    encoder = OneHotEncoder(handle_unknown='ignore')
+    encoder.fit(df_train['Embarked'])
+    encoder.to_json('encoder_embarked.json')
+    ...
+    encoder = OneHotEncoder.from_json('encoder_embarked.json')
+    df_ohe = clean.apply_one_hot_encoding(
+        df_new['Embarked'], encoder=encoder)
+
+The column names match pd.get_dummies(), e.g. "Embarked_S".
+
+For columns with many categories, e.g. hospital codes, most of the
+one-hot values are 0. With sparse=True only the 1s are stored, as
+pandas sparse columns. to_sparse_matrix() turns these into a
+scipy.sparse matrix for models that accept one.
+"""
+import json
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from utils.log import find_arg_name
+
+
+class OneHotEncoder:
+    """
+    Fixed set of categories to one-hot-encode a column with.
+    """
+    def __init__(
+            self,
+            categories: list = None,
+            prefix: str = None,
+            prefix_sep: str = '_',
+            dtype: str = 'bool',
+            handle_unknown: str = 'error',
+            sparse: bool = False
+            ):
+        """
+        Inputs
+        ------
+        categories     - list or None. The categories in output column
+                         order. If None, they are found by fit().
+        prefix         - str or None. Start of each column name. If
+                         None, fit() takes it from the series name.
+        prefix_sep     - str. Goes between prefix and category.
+        dtype          - str. 'bool' or 'uint8' for the output.
+        handle_unknown - str. What to do with values that aren't one
+                         of the categories:
+                         + 'error'  - raise a ValueError.
+                         + 'ignore' - leave every column 0 for that
+                                      row, as for missing values.
+        sparse         - bool. Whether transform() gives pandas sparse
+                         columns instead of dense ones. Needs scipy.
+        """
+        if handle_unknown not in ['error', 'ignore']:
+            raise ValueError(
+                "handle_unknown must be 'error' or 'ignore', " +
+                f'not {handle_unknown!r}.'
+                )
+        self.categories = categories
+        self.prefix = prefix
+        self.prefix_sep = prefix_sep
+        self.dtype = dtype
+        self.handle_unknown = handle_unknown
+        self.sparse = sparse
+
+    def __repr__(self):
+        """Short description for the log."""
+        if self.categories is None:
+            n_categories = 'not fitted'
+        else:
+            n_categories = f'{len(self.categories)} categories'
+        return f'OneHotEncoder({self.prefix!r}, {n_categories})'
+
+    @property
+    def columns(self):
+        """Names of the output columns in order."""
+        self._check_fitted()
+        return [f'{self.prefix}{self.prefix_sep}{c}'
+                for c in self.categories]
+
+    def fit(self, series: pd.Series):
+        """
+        Find the categories from a column of data.
+
+        The categories are sorted unique non-missing values, or the
+        categories of a Categorical series in their own order. This
+        gives the same columns as pd.get_dummies() on the series.
+
+        Returns
+        -------
+        self - OneHotEncoder. So that calls can be chained.
+        """
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = list(series.cat.categories)
+        else:
+            categories = sort_categories(series.dropna().unique())
+        # Plain Python values so that the encoder can be saved as json:
+        self.categories = [
+            c.item() if isinstance(c, np.generic) else c
+            for c in categories
+            ]
+        if self.prefix is None:
+            self.prefix = find_arg_name(series)
+        return self
+
+    def transform_array(self, series: pd.Series, sparse: bool = None):
+        """
+        One-hot-encode a column into a bare array.
+
+        The array is made once at its full size and then the one hot
+        value in each row is set, with no intermediate DataFrames.
+
+        Inputs
+        ------
+        series - pd.Series. Column of data to encode.
+        sparse - bool or None. Whether to return a scipy.sparse CSR
+                 matrix, which only stores the hot values. Needs
+                 scipy. If None, use the encoder's own setting.
+
+        Returns
+        -------
+        values - np.array or scipy.sparse.csr_matrix. One row per row
+                 of the series and one column per category.
+        """
+        if sparse is None:
+            sparse = self.sparse
+        codes = self._find_codes(series)
+        shape = (len(codes), len(self.categories))
+        rows = np.flatnonzero(codes >= 0)
+        if sparse:
+            import scipy.sparse
+            values = scipy.sparse.csr_matrix(
+                (np.ones(len(rows), dtype=self.dtype),
+                 (rows, codes[rows])),
+                shape=shape
+                )
+        else:
+            values = np.zeros(shape, dtype=self.dtype)
+            values[rows, codes[rows]] = 1
+        return values
+
+    def transform(self, series: pd.Series):
+        """
+        One-hot-encode a column into a DataFrame.
+
+        Returns
+        -------
+        df_ohe - pd.DataFrame. One column per category, with the same
+                 index as the series. Sparse columns if the encoder
+                 is sparse.
+        """
+        if self.sparse:
+            # pandas makes sparse columns from a CSC matrix without
+            # going through dense arrays. Its fill value is 0, so for
+            # bool columns change it to False afterwards.
+            values = self.transform_array(series, sparse=True)
+            df_ohe = pd.DataFrame.sparse.from_spmatrix(
+                values.astype(np.uint8).tocsc(),
+                index=series.index,
+                columns=self.columns
+                )
+            if np.dtype(self.dtype) == np.bool_:
+                df_ohe = df_ohe.astype(pd.SparseDtype(bool, False))
+        else:
+            df_ohe = pd.DataFrame(
+                self.transform_array(series, sparse=False),
+                index=series.index,
+                columns=self.columns
+                )
+        return df_ohe
+
+    def fit_transform(self, series: pd.Series):
+        """Fit to a column and then one-hot-encode it."""
+        return self.fit(series).transform(series)
+
+    def to_dict(self):
+        """All of the settings and categories as a dict."""
+        return {
+            'categories': self.categories,
+            'prefix': self.prefix,
+            'prefix_sep': self.prefix_sep,
+            'dtype': self.dtype,
+            'handle_unknown': self.handle_unknown,
+            'sparse': self.sparse,
+        }
+
+    @classmethod
+    def from_dict(cls, encoder_dict: dict):
+        """Make an encoder from the output of to_dict()."""
+        return cls(**encoder_dict)
+
+    def to_json(self, path_to_file: str):
+        """Save this encoder to a json file."""
+        with open(path_to_file, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    @classmethod
+    def from_json(cls, path_to_file: str):
+        """Load an encoder that was saved with to_json()."""
+        with open(path_to_file, 'r') as f:
+            encoder_dict = json.load(f)
+        return cls.from_dict(encoder_dict)
+
+    def _find_codes(self, series: pd.Series):
+        """
+        Position of each value in the categories.
+
+        Missing values get -1. So do unknown values, unless
+        handle_unknown is 'error'.
+        """
+        self._check_fitted()
+        codes = pd.Categorical(series, categories=self.categories).codes
+        codes = np.asarray(codes)
+        unknown = (codes < 0) & series.notna().to_numpy()
+        if (self.handle_unknown == 'error') and unknown.any():
+            values_unknown = sorted(map(str, series[unknown].unique()))
+            raise ValueError(
+                f'Values not in the fitted categories: {values_unknown}')
+        return codes
+
+    def _check_fitted(self):
+        """Raise an error if there are no categories yet."""
+        if self.categories is None:
+            raise ValueError('Call fit() on this encoder first.')
+
+
+def to_sparse_matrix(df: pd.DataFrame):
+    """
+    Convert a DataFrame to a scipy.sparse CSR matrix.
+
+    Sparse columns are used as they are. Dense columns are made
+    sparse first, which only saves memory if they are mostly 0.
+    Needs scipy.
+
+    Inputs
+    ------
+    df - pd.DataFrame. Numeric or bool columns only.
+
+    Returns
+    -------
+    matrix - scipy.sparse.csr_matrix. Same shape as df. The row and
+             column names are not kept.
+    """
+    dtypes_sparse = {}
+    for column, dtype in df.dtypes.items():
+        if not isinstance(dtype, pd.SparseDtype):
+            dtypes_sparse[column] = pd.SparseDtype(
+                dtype, False if dtype == np.bool_ else 0)
+    if len(dtypes_sparse) > 0:
+        df = df.astype(dtypes_sparse)
+    matrix = df.sparse.to_coo().tocsr()
+    return matrix
+
+
+def sort_categories(values: any):
+    """
+    Sort unique values in the order pd.get_dummies() gives columns.
+
+    Values of mixed types, e.g. numbers and a string label for missing
+    values, can't be compared with each other. Numbers then come
+    first, then strings, then anything else by type name.
+
+    Returns
+    -------
+    categories - list. The sorted values.
+    """
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=_find_category_sort_key)
+
+
+def _find_category_sort_key(value: any):
+    """Key to sort values of mixed types with."""
+    if isinstance(value, (numbers.Number, np.number)):
+        return (0, '', value)
+    if isinstance(value, str):
+        return (1, '', value)
+    return (2, type(value).__name__, str(value))
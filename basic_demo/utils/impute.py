@@ -0,0 +1,275 @@
+"""
+Fill in missing values in many columns at once.
+
+clean.impute_missing_with_median() and impute_missing_with_label()
+work on one column at a time. Each call copies its column, finds the
+missing values and returns a separate indicator column. An Imputer
+does the same for a whole set of columns in one go:
+
+    imputer = Imputer(
+        median_columns=['Age', 'Fare'],
+        labels={'Embarked': 'missing', 'Cabin': 'missing'}
+        )
+    imputer.fit(df_train)
+    imputer.to_json('imputer.json')
+    df_imputed, df_was_imputed = imputer.transform(df_train)
+
+The medians are found once by fit() and stored, so new batches of
+data are filled in with the same values:
+
+    imputer = Imputer.from_json('imputer.json')
+    df_imputed, df_was_imputed = imputer.transform(df_new)
+
+The columns keep their names. The indicators are named as for the
+single-column functions, e.g. "Age_WasImputedMedian", or are packed
+into one integer column with one bit per column (indicators='bitmask').
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class Imputer:
+    """
+    Fitted values to fill in the missing data in a set of columns.
+    """
+    def __init__(
+            self,
+            median_columns: list = None,
+            labels: dict = None,
+            indicators: str = 'bool',
+            medians: dict = None
+            ):
+        """
+        Inputs
+        ------
+        median_columns - list or None. Columns to fill in with their
+                         median.
+        labels         - dict or None. Columns to fill in with a fixed
+                         label, e.g. {'Embarked': 'missing'}.
+        indicators     - str or None. How to return which values were
+                         filled in:
+                         + 'bool'    - one bool column per column.
+                         + 'bitmask' - one integer column. Bit i is
+                                       set when column i of
+                                       self.columns was filled in.
+                         + None      - don't return them.
+        medians        - dict or None. Median of each column, if
+                         already known. Otherwise found by fit().
+        """
+        if indicators not in ['bool', 'bitmask', None]:
+            raise ValueError(
+                "indicators must be 'bool', 'bitmask' or None, " +
+                f'not {indicators!r}.'
+                )
+        self.median_columns = list(median_columns or [])
+        self.labels = dict(labels or {})
+        self.indicators = indicators
+        self.medians = medians
+
+        columns_both = set(self.median_columns) & set(self.labels)
+        if len(columns_both) > 0:
+            raise ValueError(
+                'Columns are set to both median and label: ' +
+                f'{sorted(columns_both)}'
+                )
+        if (indicators == 'bitmask') & (len(self.columns) > 64):
+            raise ValueError('A bitmask can cover at most 64 columns.')
+
+    def __repr__(self):
+        """Short description for the log."""
+        return (
+            f'Imputer({len(self.median_columns)} median, ' +
+            f'{len(self.labels)} label columns)'
+            )
+
+    @property
+    def columns(self):
+        """All of the columns to fill in, medians first."""
+        return self.median_columns + list(self.labels.keys())
+
+    @property
+    def indicator_names(self):
+        """Names of the bool indicator columns, in order."""
+        return (
+            [f'{c}_WasImputedMedian' for c in self.median_columns] +
+            [f'{c}_WasImputedLabel' for c in self.labels.keys()]
+            )
+
+    def fit(self, df: pd.DataFrame):
+        """
+        Find the median of every median column.
+
+        All of the medians are found in one call to df.median().
+
+        Returns
+        -------
+        self - Imputer. So that calls can be chained.
+        """
+        medians = df[self.median_columns].median()
+        # Plain Python values so that the imputer can be saved as json:
+        self.medians = {
+            c: (None if pd.isna(m) else float(m)) for c, m in medians.items()
+            }
+        return self
+
+    def transform(self, df: pd.DataFrame, inplace: bool = False):
+        """
+        Fill in the missing values.
+
+        Inputs
+        ------
+        df      - pd.DataFrame. Contains at least self.columns.
+        inplace - bool. Whether to fill in df itself rather than a
+                  copy of it. Saves copying the whole DataFrame.
+
+        Returns
+        -------
+        df_imputed - pd.DataFrame. df with the values filled in. This
+                     is df itself if inplace is True. A nullable
+                     integer column whose median isn't a whole number
+                     becomes Float64.
+        indicators - pd.DataFrame, pd.Series or None. Which values were
+                     filled in, as set by self.indicators.
+        """
+        self._check_fitted()
+        # Find every missing value in one go, before filling them in:
+        missing = df[self.columns].isna().to_numpy()
+
+        if not inplace:
+            # Only the filled-in columns are new. The others are
+            # shared with df rather than copied.
+            df = df.copy(deep=False)
+        values = {**self.medians, **self.labels}
+        for i, column in enumerate(self.columns):
+            value = values[column]
+            if (value is None) or (not missing[:, i].any()):
+                # Nothing to fill in, or no median to fill it with.
+                continue
+            df[column] = _fill_missing(
+                df[column], missing[:, i], value, copy=not inplace)
+
+        indicators = self._make_indicators(missing, df.index)
+        return df, indicators
+
+    def fit_transform(self, df: pd.DataFrame, inplace: bool = False):
+        """Fit to the data and then fill in its missing values."""
+        return self.fit(df).transform(df, inplace=inplace)
+
+    def decode_bitmask(self, bitmask: pd.Series):
+        """
+        Unpack a bitmask from transform() into bool columns.
+
+        Returns
+        -------
+        df_was_imputed - pd.DataFrame. One bool column per column,
+                         named as for indicators='bool'.
+        """
+        bits = np.uint64(1) << np.arange(len(self.columns), dtype=np.uint64)
+        values = bitmask.to_numpy().astype(np.uint64)
+        df_was_imputed = pd.DataFrame(
+            (values[:, None] & bits) > 0,
+            index=bitmask.index,
+            columns=self.indicator_names
+            )
+        return df_was_imputed
+
+    def to_dict(self):
+        """All of the settings and fitted values as a dict."""
+        return {
+            'median_columns': self.median_columns,
+            'labels': self.labels,
+            'indicators': self.indicators,
+            'medians': self.medians,
+        }
+
+    @classmethod
+    def from_dict(cls, imputer_dict: dict):
+        """Make an imputer from the output of to_dict()."""
+        return cls(**imputer_dict)
+
+    def to_json(self, path_to_file: str):
+        """Save this imputer to a json file."""
+        with open(path_to_file, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    @classmethod
+    def from_json(cls, path_to_file: str):
+        """Load an imputer that was saved with to_json()."""
+        with open(path_to_file, 'r') as f:
+            imputer_dict = json.load(f)
+        return cls.from_dict(imputer_dict)
+
+    def _make_indicators(self, missing: np.array, index: pd.Index):
+        """Turn the block of missing values into the indicators."""
+        if self.indicators == 'bool':
+            indicators = pd.DataFrame(
+                missing, index=index, columns=self.indicator_names)
+        elif self.indicators == 'bitmask':
+            # Smallest unsigned integer with one bit per column:
+            n_bits = max(8, 2 ** int(np.ceil(np.log2(
+                max(len(self.columns), 1)))))
+            dtype = np.dtype(f'uint{n_bits}')
+            bits = np.uint64(1) << np.arange(
+                len(self.columns), dtype=np.uint64)
+            indicators = pd.Series(
+                (missing @ bits).astype(dtype),
+                index=index,
+                name='WasImputedBitmask'
+                )
+        else:
+            indicators = None
+        return indicators
+
+    def _check_fitted(self):
+        """Raise an error if the medians haven't been found yet."""
+        if (self.medians is None) & (len(self.median_columns) > 0):
+            raise ValueError('Call fit() on this imputer first.')
+        if self.medians is None:
+            self.medians = {}
+
+
+def _fill_missing(
+        series: pd.Series, missing: np.array, value: any, copy: bool = True):
+    """
+    Put value into every missing place in a column.
+
+    Inputs
+    ------
+    series  - pd.Series. The column.
+    missing - np.array. True where the column is missing.
+    value   - any. Median or label to fill in.
+    copy    - bool. Whether to leave the values of series unchanged.
+
+    Returns
+    -------
+    values - np.array or pd.Series. The filled-in column.
+    """
+    if isinstance(series.dtype, np.dtype) and \
+            (series.dtype == object or
+             np.issubdtype(series.dtype, np.floating)):
+        # Write straight into the NumPy array, which is much quicker
+        # than fillna() for strings.
+        values = series.to_numpy(copy=copy)
+        if not values.flags.writeable:
+            # With copy-on-write, the array is shared and read-only.
+            # The caller assigns the result back to the column.
+            values = values.copy()
+        values[missing] = value
+    else:
+        # e.g. Categorical or nullable types, or integers that need
+        # to become floats to hold a median.
+        values = series.copy() if copy else series
+        if pd.api.types.is_integer_dtype(values.dtype) and \
+                isinstance(value, (float, np.floating)) and \
+                not float(value).is_integer():
+            # A median halfway between two integers, e.g. 2.5, can't
+            # go in an Int64 column, so the column becomes Float64.
+            values = values.astype('Float64')
+        if isinstance(values.dtype, pd.CategoricalDtype) and \
+                (value not in values.cat.categories):
+            # The label has to be a category before it can be used.
+            values = values.cat.add_categories([value])
+        values[missing] = value
+    return values
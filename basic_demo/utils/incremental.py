@@ -0,0 +1,425 @@
+"""
+Clean only the rows added to a file since it was last cleaned.
+
+Extracts that grow by having rows appended, e.g. a monthly registry
+extract, don't need cleaning from scratch every time. refresh()
+keeps a watermark of how far through the input file it has got, and
+on each run only reads and cleans the rows after it:
+
+    def fit(df_raw):
+        # Anything that needs the whole dataset, found once.
+        return {'median_age': df_raw['Age'].median(), ...}
+
+    def clean_rows(df_raw, fitted):
+        series, imputed = clean.impute_missing_with_median(
+            df_raw['Age'], median=fitted['median_age'])
+        ...
+        return df_clean
+
+    refresh('titanic.csv', 'titanic_cleaned.csv', clean_rows,
+            'titanic_state.json', func_fit=fit)
+
+On the first run, func_fit() is given every row there is and its
+result is saved next to the watermark with pickle. Every later run
+loads it again, so the new rows get the same medians, categories
+and one-hot columns as the old ones. To refit, delete the state
+files and the output, and run again from scratch.
+
+The watermark holds:
++ rows        - number of rows read so far.
++ byte_offset - for csv, where in the file the next row starts, so
+                the rows before it aren't read at all.
++ key_max     - largest value of key_column so far, e.g. patient_id.
+                If given, only rows with a larger key are new, which
+                stops any row being cleaned twice.
+The end of the csv rows read is found in the same way as the csv
+parser finds it, so newlines inside quoted fields don't end a row. A
+last row without a newline is read too. Rows appended later must
+then start on a new line, or an error is raised rather than gluing
+the new first row onto the old last row. Rows should be appended
+whole, as a row cut off part-way through being written is taken as
+finished unless a quoted field is still open.
+
+Parquet and Feather inputs are read in full. The rows before the
+watermark are then skipped by key_max if there is a key_column, so
+rows don't have to be strictly appended, or by the row count if not.
+
+A csv output has the new rows appended to it one chunk at a time.
+Parquet and Feather outputs can't be appended to, so they are read
+back in and saved again with all of the run's new rows on the end,
+once per run.
+"""
+import hashlib
+import io
+import json
+import os
+import pickle
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+
+from utils.clean import load_data, save_data, _find_file_format
+from utils.log import register_name
+
+
+# Number of bytes of the start of the input file used to check that
+# it is still the same file:
+_FINGERPRINT_BYTES = 65536
+
+
+@dataclass
+class Watermark:
+    """
+    How far through the input file the cleaning has got.
+
+    Attributes
+    ----------
+    rows         - int. Number of input rows read so far.
+    byte_offset  - int or None. For csv, position in the file just
+                   after the last row cleaned.
+    key_column   - str or None. Column that increases with each new
+                   row, e.g. 'patient_id'.
+    key_max      - any. Largest value of key_column cleaned so far.
+    fingerprint  - str or None. Hash of the start of the csv file, to
+                   check that it has only been appended to since.
+    output_bytes - int or None. Size of a csv output after the last
+                   run, so that rows half-written by a run that
+                   failed can be removed.
+    fitted_file  - str or None. Location of the pickled output of
+                   func_fit().
+    """
+    rows: int = 0
+    byte_offset: int = None
+    key_column: str = None
+    key_max: any = None
+    fingerprint: str = None
+    output_bytes: int = None
+    fitted_file: str = None
+
+    def to_json(self, path_to_file: str):
+        """Save this watermark to a json file."""
+        # Write to a separate file first so that a failed run never
+        # leaves half a watermark behind:
+        path_temp = f'{path_to_file}.tmp'
+        with open(path_temp, 'w') as f:
+            json.dump(asdict(self), f, indent=4)
+        os.replace(path_temp, path_to_file)
+
+    @classmethod
+    def from_json(cls, path_to_file: str):
+        """Load a watermark that was saved with to_json()."""
+        with open(path_to_file, 'r') as f:
+            watermark_dict = json.load(f)
+        return cls(**watermark_dict)
+
+
+def refresh(
+        path_in: str,
+        path_out: str,
+        func_clean,
+        path_state: str,
+        func_fit=None,
+        key_column: str = None,
+        chunksize: int = 100000,
+        load_plan=None
+        ):
+    """
+    Clean the rows added to path_in since the last run.
+
+    Inputs
+    ------
+    path_in    - str. Location of the raw input file.
+    path_out   - str. Location of the cleaned output. On the first
+                 run any existing file here is overwritten. After
+                 that the new rows are added to the end.
+    func_clean - function. Called as func_clean(df_raw, fitted) and
+                 returns the cleaned DataFrame. Called once per chunk
+                 of new rows.
+    path_state - str. Location of the watermark json file. The fitted
+                 values are saved next to it with ".fitted.pkl" on
+                 the end.
+    func_fit   - function or None. Called as func_fit(df_raw) on every
+                 row on the first run only. Its result is passed to
+                 func_clean as fitted. If None, fitted is None.
+    key_column - str or None. Column to keep the watermark on as well
+                 as the row count, e.g. 'patient_id'.
+    chunksize  - int. Most rows to clean at once.
+    load_plan  - utils.load_plan.LoadPlan or None. Columns and data
+                 types to read the input with.
+
+    Returns
+    -------
+    n_rows - int. Number of new rows cleaned.
+    """
+    first_run = not os.path.exists(path_state)
+    if first_run:
+        watermark = Watermark(
+            key_column=key_column, fitted_file=f'{path_state}.fitted.pkl')
+        fitted = None
+        if func_fit is not None:
+            fitted = func_fit(load_data(path_in, load_plan=load_plan))
+        with open(watermark.fitted_file, 'wb') as f:
+            pickle.dump(fitted, f, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        watermark = Watermark.from_json(path_state)
+        if watermark.key_column != key_column:
+            raise ValueError(
+                f'The watermark is kept on {watermark.key_column!r}, ' +
+                f'not {key_column!r}.'
+                )
+        with open(watermark.fitted_file, 'rb') as f:
+            fitted = pickle.load(f)
+        _remove_unfinished_output(path_out, watermark)
+
+    n_rows = 0
+    new_file = first_run
+    # Parquet and Feather outputs are rewritten to add rows, so keep
+    # this run's rows and write them all at once at the end:
+    append_each_chunk = _find_file_format(path_out) == 'csv'
+    dfs_clean = []
+    for df_raw in _load_new_rows(path_in, watermark, chunksize, load_plan):
+        df_clean = func_clean(df_raw, fitted)
+        if append_each_chunk:
+            _append_output(df_clean, path_out, new_file)
+            new_file = False
+        else:
+            dfs_clean.append(df_clean)
+        n_rows += len(df_clean)
+    if len(dfs_clean) > 0:
+        _append_output(
+            pd.concat(dfs_clean, ignore_index=True), path_out, new_file)
+
+    if os.path.exists(path_out) and (_find_file_format(path_out) == 'csv'):
+        watermark.output_bytes = os.path.getsize(path_out)
+    watermark.to_json(path_state)
+    return n_rows
+
+
+def _load_new_rows(
+        path_in: str,
+        watermark: Watermark,
+        chunksize: int,
+        load_plan=None
+        ):
+    """
+    Yield the rows after the watermark, at most chunksize at a time.
+
+    The watermark is moved on as each chunk is read. The index of the
+    rows carries on from the rows before, as if the whole file had
+    been read in.
+    """
+    file_name = path_in.split('/')[-1].split('.')[0]
+    if _find_file_format(path_in) == 'csv':
+        chunks = _load_csv_from_offset(
+            path_in, watermark, chunksize, load_plan)
+    else:
+        df = load_data(path_in, load_plan=load_plan)
+        if watermark.key_column is None:
+            df = df.iloc[watermark.rows:]
+            watermark.rows += len(df)
+        else:
+            # The rows before are skipped by key below instead.
+            watermark.rows = len(df)
+        chunks = (df.iloc[i:i + chunksize]
+                  for i in range(0, len(df), chunksize))
+
+    for i, df in enumerate(chunks):
+        if watermark.key_column is not None:
+            key = df[watermark.key_column]
+            if watermark.key_max is not None:
+                df = df[(key > watermark.key_max).to_numpy()]
+                key = df[watermark.key_column]
+            if key.notna().any():
+                key_max = key.max()
+                # Plain Python value so that it can be saved as json:
+                if isinstance(key_max, np.generic):
+                    key_max = key_max.item()
+                if (watermark.key_max is None) or \
+                        (key_max > watermark.key_max):
+                    watermark.key_max = key_max
+        register_name(df, f'df_{file_name}_new{i}')
+        if len(df) > 0:
+            yield df
+
+
+def _load_csv_from_offset(
+        path_in: str,
+        watermark: Watermark,
+        chunksize: int,
+        load_plan=None
+        ):
+    """
+    Yield chunks of the csv rows after watermark.byte_offset.
+
+    Only complete rows are read, as found by _find_rows_end().
+    """
+    with open(path_in, 'rb') as f:
+        header = f.readline()
+    if watermark.byte_offset is None:
+        watermark.byte_offset = len(header)
+    elif (os.path.getsize(path_in) < watermark.byte_offset) or \
+            (_find_fingerprint(path_in, watermark.byte_offset) !=
+             watermark.fingerprint):
+        raise ValueError(
+            f'{path_in} has changed other than by adding rows to the ' +
+            'end. Delete the state files and the output to clean it ' +
+            'from scratch.'
+            )
+
+    _check_last_row_not_extended(path_in, watermark.byte_offset)
+    offset_end = _find_rows_end(path_in, watermark.byte_offset)
+    if offset_end <= watermark.byte_offset:
+        return
+
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns
+    read_kwargs = {}
+    if load_plan is not None:
+        read_kwargs = dict(usecols=load_plan.usecols,
+                           dtype=load_plan.dtypes)
+    with open(path_in, 'rb') as f:
+        f.seek(watermark.byte_offset)
+        new_bytes = io.BufferedReader(
+            _ByteRange(f, offset_end - watermark.byte_offset))
+        with pd.read_csv(
+                new_bytes, header=None, names=columns,
+                chunksize=chunksize, **read_kwargs) as reader:
+            for df in reader:
+                if (load_plan is not None) and \
+                        (load_plan.usecols is not None):
+                    # usecols keeps the order of the file, so reorder:
+                    df = df[load_plan.usecols]
+                df.index = df.index + watermark.rows
+                watermark.rows += len(df)
+                yield df
+    watermark.byte_offset = offset_end
+    watermark.fingerprint = _find_fingerprint(path_in, offset_end)
+
+
+def _find_fingerprint(path_to_file: str, byte_offset: int):
+    """
+    Hash of the start of a file, up to byte_offset.
+
+    At most the first _FINGERPRINT_BYTES are used, so that this is
+    quick however big the file gets.
+    """
+    with open(path_to_file, 'rb') as f:
+        start = f.read(min(byte_offset, _FINGERPRINT_BYTES))
+    return hashlib.sha256(start).hexdigest()
+
+
+class _ByteRange(io.RawIOBase):
+    """
+    File-like view of the next n_bytes of an open binary file.
+    """
+    def __init__(self, f, n_bytes: int):
+        self._f = f
+        self._remaining = n_bytes
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._remaining)
+        if n == 0:
+            return 0
+        data = self._f.read(n)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _find_rows_end(
+        path_to_file: str,
+        start: int,
+        block_size: int = 2 ** 24
+        ):
+    """
+    Position just after the last complete csv row from start onwards.
+
+    Rows end where the csv parser ends them. A newline ends a row
+    unless it is inside a quoted field, which can hold newlines. The
+    end of the file also ends a last row without a newline, as the
+    parser reads that row too, unless a quoted field is still open.
+
+    The quotes and newlines in each block are found with NumPy. A
+    newline is inside a quoted field when an odd number of quotes
+    come before it, as an escaped quote ("") adds two.
+    """
+    in_quotes = False
+    offset_end = start
+    position = start
+    with open(path_to_file, 'rb') as f:
+        f.seek(start)
+        while True:
+            block = np.frombuffer(f.read(block_size), dtype=np.uint8)
+            if len(block) == 0:
+                break
+            n_quotes = np.cumsum(block == ord('"')) + in_quotes
+            row_ends = np.flatnonzero(
+                (block == ord('\n')) & (n_quotes % 2 == 0))
+            if len(row_ends) > 0:
+                offset_end = position + int(row_ends[-1]) + 1
+            in_quotes = bool(n_quotes[-1] % 2)
+            position += len(block)
+    if (position > offset_end) and not in_quotes:
+        offset_end = position
+    return offset_end
+
+
+def _check_last_row_not_extended(path_to_file: str, byte_offset: int):
+    """
+    Raise an error if rows were appended straight onto a last row that
+    had no newline.
+
+    The old last row would then have the first new row stuck to the
+    end of it, and neither could be read correctly.
+    """
+    with open(path_to_file, 'rb') as f:
+        f.seek(max(byte_offset - 1, 0))
+        around = f.read(2)
+    if (len(around) == 2) and (around[:1] not in (b'\n', b'\r')) and \
+            (around[1:] not in (b'\n', b'\r')):
+        raise ValueError(
+            f'Rows were added to {path_to_file} without a newline ' +
+            'after the last row of the previous run. Add the newline ' +
+            'to fix that row, then delete the state files and the ' +
+            'output to clean it from scratch.'
+            )
+
+
+def _append_output(df_clean: pd.DataFrame, path_out: str, new_file: bool):
+    """Add cleaned rows to the end of the output file."""
+    if new_file or not os.path.exists(path_out):
+        save_data(df_clean, path_out)
+        return
+    if _find_file_format(path_out) == 'csv':
+        columns = pd.read_csv(path_out, nrows=0).columns
+    else:
+        df_old = load_data(path_out)
+        columns = df_old.columns
+    if set(columns) != set(df_clean.columns):
+        raise ValueError(
+            'The cleaned rows have different columns to ' +
+            f'{path_out}: {sorted(set(columns) ^ set(df_clean.columns))}'
+            )
+    df_clean = df_clean[columns]
+    if _find_file_format(path_out) == 'csv':
+        df_clean.to_csv(path_out, index=False, mode='a', header=False)
+    else:
+        save_data(pd.concat([df_old, df_clean], ignore_index=True),
+                  path_out)
+
+
+def _remove_unfinished_output(path_out: str, watermark: Watermark):
+    """
+    Cut a csv output back to its size after the last finished run.
+
+    Rows that were appended by a run that then failed are removed, so
+    that they aren't written twice.
+    """
+    if (watermark.output_bytes is None) or not os.path.exists(path_out):
+        return
+    if os.path.getsize(path_out) > watermark.output_bytes:
+        with open(path_out, 'r+b') as f:
+            f.truncate(watermark.output_bytes)
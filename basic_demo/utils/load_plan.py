@@ -0,0 +1,108 @@
+"""
+Load plans: the columns and data types to use when reading a file.
+
+Without a plan, pandas guesses the type of every column each time a
+file is read in. Strings are kept as Python objects even when a
+column only has a handful of different values, and integer columns
+with any missing values become floats.
+
+A plan fixes all of this when the file is parsed, e.g.:
+
+    load_plan = LoadPlan(
+        dtypes={'Sex': 'category', 'Age': 'Float64'},
+        usecols=['Sex', 'Age']
+        )
+    df = clean.load_data('titanic.csv', load_plan=load_plan)
+
+A plan can also be guessed once from the start of a file with
+infer_load_plan() and then saved with LoadPlan.to_json() for reuse.
+"""
+import json
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+
+@dataclass
+class LoadPlan:
+    """
+    Columns to read in and the data type to give each of them.
+
+    Attributes
+    ----------
+    dtypes  - dict. Data type name for each column, e.g.
+              {'S1Gender': 'category', 'treated': 'Int64'}.
+              Columns not in here are left for pandas to guess.
+    usecols - list or None. Only read in these columns, in this order.
+              If None, read in all columns.
+    """
+    dtypes: dict = field(default_factory=dict)
+    usecols: list = None
+
+    def to_json(self, path_to_file: str):
+        """Save this plan to a json file."""
+        with open(path_to_file, 'w') as f:
+            json.dump(
+                {'dtypes': self.dtypes, 'usecols': self.usecols},
+                f,
+                indent=4
+                )
+
+    @classmethod
+    def from_json(cls, path_to_file: str):
+        """Load a plan that was saved with to_json()."""
+        with open(path_to_file, 'r') as f:
+            plan_dict = json.load(f)
+        return cls(**plan_dict)
+
+
+def infer_load_plan(
+        path_to_file: str,
+        nrows: int = 10000,
+        max_categories: int = 50,
+        usecols: list = None
+        ):
+    """
+    Guess a load plan from the first rows of a csv file.
+
+    + Strings with at most max_categories different values
+      become 'category'. Other strings stay as 'object'.
+    + Integers become the nullable 'Int64' so that missing values
+      further down the file don't turn the column into floats.
+    + True/False become the nullable 'boolean'.
+    + Floats stay as 'float64'.
+
+    Check the result by eye before saving it - a column that looks
+    like integers or a small set of strings in the first rows might
+    not be later on.
+
+    Inputs
+    ------
+    path_to_file   - str. Location of the csv file.
+    nrows          - int. Number of rows to base the guess on.
+    max_categories - int. Largest number of different strings in a
+                     column for it to become a category.
+    usecols        - list or None. Only plan for these columns.
+
+    Returns
+    -------
+    load_plan - LoadPlan. The guessed plan.
+    """
+    df_sample = pd.read_csv(path_to_file, nrows=nrows, usecols=usecols)
+
+    dtypes = {}
+    for column in df_sample.columns:
+        series = df_sample[column]
+        if pd.api.types.is_bool_dtype(series):
+            dtypes[column] = 'boolean'
+        elif pd.api.types.is_integer_dtype(series):
+            dtypes[column] = 'Int64'
+        elif pd.api.types.is_float_dtype(series):
+            dtypes[column] = 'float64'
+        elif series.nunique() <= max_categories:
+            dtypes[column] = 'category'
+        else:
+            dtypes[column] = 'object'
+
+    load_plan = LoadPlan(dtypes=dtypes, usecols=usecols)
+    return load_plan
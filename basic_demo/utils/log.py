@@ -1,15 +1,164 @@
 """
 Functions to log processes.
 """
+import numpy as np
 import pandas as pd
 import logging
+import logging.handlers  # For writing the log on another thread.
+import queue
+import atexit
 import io  # To write df.info() output to log.
 import inspect  # help find names for logging
+import time
+import weakref
+from functools import lru_cache
+
+import utils.cache as cache
+import utils.provenance as provenance
+import utils.profiling as profiling
+
+
+# ###################################
+# ##### Functions to set up log #####
+# ###################################
+# Background thread that writes the log file, when it is running:
+_log_listener = None
+# Names for the log given by register_name(). Keyed on id(obj), with
+# (name, finalizer) for each:
+_names = {}
+
+
+def start_log_file(
+        filename: str,
+        filemode: str = 'w',
+        encoding: str = 'utf-8',
+        level: int = logging.DEBUG,
+        batch_size: int = 1000
+        ):
+    """
+    Write the log to file on a background thread, in batches.
+
+    Use this instead of logging.basicConfig(filename=...). The file
+    looks exactly the same, but the pipeline doesn't wait for each
+    line to be written. Messages are kept in memory and written in
+    one go at the start of each step or heading, or whenever
+    batch_size messages have built up.
+
+    The file is finished off when Python exits, or sooner by calling
+    stop_log_file().
+
+    Inputs
+    ------
+    filename   - str. Location of the log file.
+    filemode   - str. 'w' to overwrite an existing file, 'a' to add
+                 to the end of it.
+    encoding   - str. Text encoding of the file.
+    level      - int. Lowest level of message to keep.
+    batch_size - int. Most messages to keep before writing them.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        stop_log_file()
+
+    file_handler = _BatchedFileHandler(
+        filename, mode=filemode, encoding=encoding, batch_size=batch_size)
+    file_handler.setFormatter(_MultilineFormatter(logging.BASIC_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _log_listener.start()
+    atexit.register(stop_log_file)
+
+
+def stop_log_file():
+    """
+    Write out anything left and close the log file.
+    """
+    global _log_listener
+    if _log_listener is None:
+        return
+    # Write everything left in the queue:
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.close()
+    # Stop sending messages to the queue:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root.removeHandler(handler)
+    _log_listener = None
+
+
+class _BatchedFileHandler(logging.FileHandler):
+    """
+    File handler that keeps messages and writes them in one go.
+    """
+    def __init__(self, *args, batch_size: int = 1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self._buffer = []
+
+    def emit(self, record):
+        try:
+            self._buffer.append(self.format(record) + self.terminator)
+            if ((len(self._buffer) >= self.batch_size) |
+                    getattr(record, 'flush_log', False)):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if (len(self._buffer) > 0) & (self.stream is not None):
+                self.stream.write(''.join(self._buffer))
+                self._buffer = []
+            super().flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class _MultilineFormatter(logging.Formatter):
+    """
+    Formatter that repeats the "INFO:pipeline:" start on every line.
+
+    This means a message of several lines can be sent as one record
+    and still look the same as one record per line. Assumes that
+    the message is at the end of the format string.
+    """
+    def format(self, record):
+        text = super().format(record)
+        if '\n' not in text:
+            return text
+        lines = text.split('\n')
+        first_message_line = record.getMessage().split('\n')[0]
+        prefix = lines[0][:len(lines[0]) - len(first_message_line)]
+        return '\n'.join([lines[0]] + [prefix + line for line in lines[1:]])
 
 
 # #####################################
 # ##### Functions to write to log #####
 # #####################################
+def is_logging_enabled():
+    """
+    Check whether anything sent to the pipeline log will be kept.
+
+    Use this to skip building messages that would be thrown away.
+    """
+    return (
+        logging.getLogger().hasHandlers() and
+        logging.getLogger('pipeline').isEnabledFor(logging.INFO)
+    )
+
+
 def log_heading(str: str):
     """
     Add a message to the log.
@@ -19,6 +168,10 @@ def log_heading(str: str):
     ##### {str} #####
     #################
     """
+    if not is_logging_enabled():
+        # Don't log the message.
+        return
+
     # Format the string
     str = (
         '\n' +
@@ -27,14 +180,8 @@ def log_heading(str: str):
         '#' * (len(str) + (5 + 1) * 2)
     )
 
-    if logging.getLogger().hasHandlers():
-        # If logging is set up, save to log:
-        logger = logging.getLogger('pipeline')
-        for line in str.split('\n'):
-            logger.info(line)
-    else:
-        # Don't log the message.
-        pass
+    # Save to log:
+    _send_to_log(str.split('\n'), flush=True)
 
 
 def log_step(str: str):
@@ -45,17 +192,36 @@ def log_step(str: str):
     * {str}
     -------
     """
+    # Keep the step in the provenance record too, if recording:
+    provenance.record_step(str)
+    if not is_logging_enabled():
+        # Don't log the message.
+        return
+
+    # Save to log:
+    _send_to_log(format_step(str), flush=True)
+
+
+def format_step(str: str):
+    """
+    Lines that log_step() writes for a step name.
+
+    Returns
+    -------
+    lines - list. Lines of text without the logger's prefix.
+    """
     # Format the string so it displays as:
     str = f'\n* {str}\n' + '-' * (len(str) + 2)
+    return str.split('\n')
 
-    if logging.getLogger().hasHandlers():
-        # If logging is set up, save to log:
-        logger = logging.getLogger('pipeline')
-        for line in str.split('\n'):
-            logger.info(line)
-    else:
-        # Don't log the message.
-        pass
+
+def is_logging_steps():
+    """
+    Check whether log_step() would keep the step anywhere.
+
+    Steps go to the text log and to the provenance record.
+    """
+    return is_logging_enabled() or provenance.is_recording()
 
 
 def log_text(str: str, indent: str = '', w=100):
@@ -65,24 +231,60 @@ def log_text(str: str, indent: str = '', w=100):
     If the message is above the set width then it will be split
     across multiple lines.
     """
+    if not is_logging_enabled():
+        # Don't log the message.
+        return
+
+    # Save to log:
+    _send_to_log(split_for_width(str, indent=indent, w=w))
+
+
+def split_for_width(str: str, indent: str = '', w=100):
+    """
+    Split a message into the lines that log_text() would write.
+
+    Lines above the set width, including the logger's own prefix,
+    are split across multiple lines.
+
+    Returns
+    -------
+    lines - list. Lines of text without the logger's prefix.
+    """
     if len(indent) > 0:
         str = indent + str.replace('\n', f'\n{indent}')
 
-    if logging.getLogger().hasHandlers():
-        # If logging is set up, save to log:
-        logger = logging.getLogger('pipeline')
-        for line in str.split('\n'):
-            width = w - len('INFO:pipeline:')
-            if len(line) < width:
-                logger.info(line)
-            else:
-                # Split the message across multiple lines.
-                while len(line) > 0:
-                    logger.info(line[:width])
-                    line = line[width:]
+    width = w - len('INFO:pipeline:')
+    lines = []
+    for line in str.split('\n'):
+        if len(line) < width:
+            lines.append(line)
+        else:
+            # Split the message across multiple lines.
+            while len(line) > 0:
+                lines.append(line[:width])
+                line = line[width:]
+    return lines
+
+
+def _send_to_log(lines: list, flush: bool = False):
+    """
+    Send lines of text to the pipeline logger.
+
+    When the log file is written on a background thread, send all of
+    the lines as one record. Otherwise send one record per line.
+
+    Inputs
+    ------
+    lines - list. Lines of text to log.
+    flush - bool. Whether the background thread should write the
+            log file now, after these lines.
+    """
+    logger = logging.getLogger('pipeline')
+    if _log_listener is None:
+        for line in lines:
+            logger.info(line)
     else:
-        # Don't log the message.
-        pass
+        logger.info('\n'.join(lines), extra={'flush_log': flush})
 
 
 # ###########################################
@@ -91,31 +293,74 @@ def log_text(str: str, indent: str = '', w=100):
 def log_wrapper(f, args, kwargs={}):
     """
     Write function, parameters, and results to the log file.
+
+    If utils.provenance is recording, also save a structured record
+    of the call there. If utils.profiling is switched on, also
+    measure the cost of the call. If utils.cache is switched on, load
+    the output from there if this call has been made before.
+
+    If nothing would be logged, just run the function.
     """
+    text_log = is_logging_enabled()
+    record = provenance.is_recording()
+    profiled = profiling.is_profiling()
+    cached = cache.is_caching()
+    if not (text_log or record or profiled or cached):
+        return f(*args, **kwargs)
+
     # * Log the function info and inputs:
     # -----------------------------------
-    log_function_info(
-        f.__module__,
-        f.__name__,
-        f.__doc__,
-        inspect.signature(f)
-        )
-    log_function_params(
-        args,
-        kwargs
-        )
+    if text_log:
+        log_text(_function_info_text(f))
+        log_function_params(
+            args,
+            kwargs
+            )
+
+    if record:
+        # Names before the call, as in the text log. The call itself
+        # can rename its inputs, e.g. set_attrs_name().
+        arg_names = [find_arg_name(arg) for arg in args]
+        kwarg_names = {
+            key: find_arg_name(kwarg) for key, kwarg in kwargs.items()}
 
     # * The actual calculations:
     # --------------------------
-    to_return = f(*args, **kwargs)
+    time_start = time.time()
+    if cached:
+        (to_return, from_cache), cost = profiling.run_measured(
+            cache.run_cached, (f, args, kwargs), {})
+    else:
+        to_return, cost = profiling.run_measured(f, args, kwargs)
+        from_cache = False
 
     # * Log the function outputs:
     # ---------------------------
     if not isinstance(to_return, tuple):
         to_return = (to_return, )
-    log_function_output([t for t in to_return])
-    # Deliberate gap in the log file:
-    log_text('')
+    if text_log:
+        log_function_output([t for t in to_return])
+        if from_cache:
+            log_text('(Loaded from cache.)')
+        # Deliberate gap in the log file:
+        log_text('')
+    if record or profiled:
+        input_shapes = [provenance.find_shape(arg) for arg in args]
+        output_shapes = [provenance.find_shape(t) for t in to_return]
+    if record:
+        provenance.record_call(
+            f,
+            arg_names=arg_names,
+            kwarg_names=kwarg_names,
+            output_names=[find_arg_name(t) for t in to_return],
+            input_shapes=input_shapes,
+            output_shapes=output_shapes,
+            time_start=time_start,
+            duration_s=cost['wall_s'],
+            from_cache=from_cache
+            )
+    if profiled:
+        profiling.record_call(f, cost, input_shapes, output_shapes)
     if len(to_return) == 1:
         to_return = to_return[0]
     return to_return
@@ -127,11 +372,24 @@ def log_dataframe_contents(df):
 
     Wrapper for df.info().
     """
+    if not is_logging_enabled():
+        # Don't build the info at all.
+        return
+    is_sparse = find_sparse_columns(df)
+    if is_sparse.any():
+        # Counting the non-missing values of thousands of sparse
+        # columns is slow and the list would fill the log, so
+        # only summarise them.
+        df_dense = df.iloc[:, ~is_sparse]
+    else:
+        df_dense = df
     # Send the output of df.info() to this buffer:
     buf = io.StringIO()
     # Get the useful information:
-    df.info(
+    df_dense.info(
         buf=buf, verbose=True, show_counts=True, memory_usage=False)
+    if is_sparse.any():
+        buf.write('\n' + _summarise_sparse_columns(df.iloc[:, is_sparse]))
     # Convert the contents of the buffer to string so that
     # we can write it to log:
     log_text(buf.getvalue())
@@ -143,11 +401,69 @@ def log_dataframe_stats(df):
 
     Wrapper for df.describe().
     """
-    # Get the useful information:
-    stats = df.describe()
-    # Convert the contents of the buffer to string so that
-    # we can write it to log:
-    log_text(stats.T.to_string())
+    if not is_logging_enabled():
+        # Don't calculate the stats at all.
+        return
+    is_sparse = find_sparse_columns(df)
+    text = ''
+    if not is_sparse.all():
+        # Get the useful information:
+        stats = df.iloc[:, ~is_sparse].describe()
+        # Convert the contents of the buffer to string so that
+        # we can write it to log:
+        text = stats.T.to_string()
+    if is_sparse.any():
+        # Sparse one-hot columns only hold 0s and 1s, so just say
+        # how full they are.
+        if len(text) > 0:
+            text += '\n'
+        text += _summarise_sparse_columns(df.iloc[:, is_sparse])
+    log_text(text)
+
+
+def log_dataframe_profile(df_profile):
+    """
+    Write a profile from clean.profile_data() as a table.
+
+    Gives the same information as df.info() plus the number of
+    unique values, min and max, without going over the data again.
+    """
+    if not is_logging_enabled():
+        return
+    n_rows = 0
+    if len(df_profile) > 0:
+        n_rows = int(df_profile['count'].iloc[0] +
+                     df_profile['missing'].iloc[0])
+    memory_mb = df_profile['memory'].sum() / 1e6
+    df_text = df_profile.drop(columns='memory')
+    # Leave blank the ranges that couldn't be found:
+    for column in ['min', 'max']:
+        df_text[column] = df_text[column].astype(object).fillna('')
+    text = '\n'.join([
+        f'{n_rows} rows, {len(df_profile)} columns, {memory_mb:.1f} MB',
+        df_text.to_string(),
+        ''
+        ])
+    log_text(text)
+
+
+def log_violation_summary(df_summary):
+    """
+    Write a summary from clean.validate_data() as a table.
+
+    Lists how many rows broke each rule and what was done about it.
+    """
+    if not is_logging_enabled():
+        return
+    n_broken = int((df_summary['violations'] > 0).sum())
+    df_text = df_summary.copy()
+    df_text['percent'] = df_text['percent'].map('{:.2f}'.format)
+    text = '\n'.join([
+        f'{n_broken} of {len(df_summary)} rules broken',
+        df_text.to_string(),
+        ''
+        ])
+    log_text(text)
 
 
 def log_function_info(func_module, func_name, func_doc, argspec_sig):
@@ -170,6 +486,32 @@ def log_function_info(func_module, func_name, func_doc, argspec_sig):
         param2: type hint of param2
       )
     """
+    if not is_logging_enabled():
+        return
+    log_text(_format_function_info(
+        func_module, func_name, func_doc, argspec_sig))
+
+
+@lru_cache(maxsize=None)
+def _function_info_text(f):
+    """
+    Text from log_function_info() for this function.
+
+    This is the same every time the function is called,
+    so only work it out once per function.
+    """
+    return _format_function_info(
+        f.__module__,
+        f.__name__,
+        f.__doc__,
+        inspect.signature(f)
+        )
+
+
+def _format_function_info(func_module, func_name, func_doc, argspec_sig):
+    """
+    Build the text for log_function_info().
+    """
     # Get the docstring as a list, line by line:
     try:
         func_doc_lines = func_doc.split('\n')
@@ -214,12 +556,11 @@ def log_function_info(func_module, func_name, func_doc, argspec_sig):
         f'{indent})'
         )
 
-    # If logging is set up, save to log:
-    log_text('\n'.join([
+    return '\n'.join([
         func_doc,
         'Run this function:',
         function_str
-    ]))
+    ])
 
 
 def log_function_params(args, kwargs={}):
@@ -232,6 +573,8 @@ def log_function_params(args, kwargs={}):
       param1={value or name of param1}
       param2={value or name of param2}
     """
+    if not is_logging_enabled():
+        return
 
     # # Check the value of each arg.
     arg_names = []
@@ -244,6 +587,14 @@ def log_function_params(args, kwargs={}):
         kwarg_name = find_arg_name(kwarg)
         kwarg_names[key] = kwarg_name
 
+    # If logging is set up, save to log:
+    log_text(_format_function_params(arg_names, kwarg_names))
+
+
+def _format_function_params(arg_names: list, kwarg_names: dict):
+    """
+    Build the text for log_function_params() from the names.
+    """
     indent = ' ' * 2  # Number of spaces per indent
 
     # Get one line per arg or kwarg,
@@ -252,7 +603,7 @@ def log_function_params(args, kwargs={}):
     for a, arg in enumerate(arg_names):
         params_str += f'{indent}{arg},\n'
 
-    for a, kwarg in enumerate(list(kwargs.keys())):
+    for a, kwarg in enumerate(list(kwarg_names.keys())):
         try:
             val = kwarg_names[kwarg]
         except KeyError:
@@ -261,11 +612,10 @@ def log_function_params(args, kwargs={}):
 
     params_str = _newline_for_width(params_str, w=100)
 
-    # If logging is set up, save to log:
-    log_text('\n'.join([
+    return '\n'.join([
         'With these parameters:',
         params_str
-    ]))
+    ])
 
 
 def log_function_output(return_tuple):
@@ -278,23 +628,32 @@ def log_function_output(return_tuple):
       {value or name of result1}
       {value or name of result2}
     """
-    indent = ' ' * 2  # Number of spaces per indent
+    if not is_logging_enabled():
+        return
 
     # Check the value of each kwarg.
-    lines = []
-    for arg in return_tuple:
-        arg_name = find_arg_name(arg)
-        lines.append(f'{indent}{arg_name}')
+    output_names = [find_arg_name(arg) for arg in return_tuple]
+
+    # If logging is set up, save to log:
+    log_text(_format_function_output(output_names))
+
+
+def _format_function_output(output_names: list):
+    """
+    Build the text for log_function_output() from the names.
+    """
+    indent = ' ' * 2  # Number of spaces per indent
+
+    lines = [f'{indent}{arg_name}' for arg_name in output_names]
 
     lines_w = _newline_for_width(lines, w=100)
 
     outputs_str = ',\n'.join(lines_w)
 
-    # If logging is set up, save to log:
-    log_text('\n'.join([
+    return '\n'.join([
         'Giving the following as output:',
         outputs_str
-    ]))
+    ])
 
 
 # ############################
@@ -337,9 +696,92 @@ def _newline_for_width(line: str, w: int = 100, indent: str = '  '):
     return line_w
 
 
+def find_sparse_columns(df: pd.DataFrame):
+    """One bool per column, True for sparse columns."""
+    is_sparse = np.array(
+        [isinstance(dtype, pd.SparseDtype) for dtype in df.dtypes],
+        dtype=bool
+        )
+    return is_sparse
+
+
+def _summarise_sparse_columns(df: pd.DataFrame):
+    """
+    One line about a DataFrame of only sparse columns.
+
+    e.g. "Sparse columns: 1205 (Sparse[bool, False]), 0.08% stored,
+    2.1 MB"
+    """
+    n_stored = sum(len(df.iloc[:, i].array.sp_values)
+                   for i in range(df.shape[1]))
+    n_values = df.shape[0] * df.shape[1]
+    density = n_stored / n_values if n_values > 0 else 0.0
+    dtypes = ', '.join(sorted(set(str(dtype) for dtype in df.dtypes)))
+    memory_mb = df.memory_usage(index=False).sum() / 1e6
+    return (
+        f'Sparse columns: {df.shape[1]} ({dtypes}), ' +
+        f'{density:.2%} stored, {memory_mb:.1f} MB\n'
+        )
+
+
+def register_name(obj: any, name: str):
+    """
+    Store a name for an object for the log.
+
+    The name is kept in a table looked up by the object's identity,
+    so that objects without attrs, e.g. NumPy arrays, can be named
+    too. The name is removed from the table when the object is
+    deleted.
+
+    The name is also written to obj.attrs where there is one, e.g.
+    for DataFrames. pandas copies attrs to objects derived from this
+    one, e.g. df[columns] or df.copy(), and pickle keeps them, so
+    those keep the name in the log too rather than becoming unnamed.
+
+    Inputs
+    ------
+    obj  - any. Object to name.
+    name - str. Name for the log.
+
+    Returns
+    -------
+    registered - bool. Whether the name could be stored.
+    """
+    attrs = getattr(obj, 'attrs', None)
+    in_attrs = isinstance(attrs, dict)
+    if in_attrs:
+        attrs['name'] = name
+    key = id(obj)
+    entry = _names.get(key)
+    if entry is not None:
+        # Renaming an object that already has a name.
+        _names[key] = (name, entry[1])
+        return True
+    try:
+        finalizer = weakref.finalize(obj, _names.pop, key, None)
+    except TypeError:
+        # e.g. strings and numbers can't be weakly referenced.
+        return in_attrs
+    # Don't keep the names from being cleared up at exit:
+    finalizer.atexit = False
+    _names[key] = (name, finalizer)
+    return True
+
+
+def find_registered_name(obj: any):
+    """The name stored by register_name(), or None."""
+    entry = _names.get(id(obj))
+    if entry is None:
+        return None
+    return entry[0]
+
+
 def find_arg_name(arg: any):
     """
-    Find the name stored in attrs or as Series name.
+    Find the name stored by register_name() or as Series name.
+
+    Objects derived from a named one, e.g. df[columns], are found by
+    the name that pandas copied into their attrs.
 
     Inputs
     ------
@@ -358,19 +800,21 @@ def find_arg_name(arg: any):
         if arg_name is None:
             # No name, so use the value instead.
             arg_name = '{unnamed pd.Series}'
-    elif isinstance(arg, pd.DataFrame):
-        try:
-            # Did we explicitly give this a name?
-            arg_name = arg.attrs['name']
-        except (KeyError, AttributeError):
-            # No name, so use the value instead.
-            arg_name = '{unnamed pd.DataFrame}'
+        return arg_name
+
+    # Did we explicitly give this a name?
+    arg_name = find_registered_name(arg)
+    if arg_name is not None:
+        return arg_name
+    if isinstance(arg, pd.DataFrame):
+        # Fall back on a name copied into attrs from the object this
+        # one was made from:
+        arg_name = arg.attrs.get('name', '{unnamed pd.DataFrame}')
     else:
         # Last ditch effort to find a name:
         try:
-            # Did we explicitly give this a name?
             arg_name = arg.attrs['name']
-        except (KeyError, AttributeError):
+        except (KeyError, AttributeError, TypeError):
             # No name, so use the value instead.
             arg_name = arg
     return arg_name
@@ -400,7 +844,7 @@ def _increase_indent_between_brackets(line, indent='  '):
     while all(i < 0 for i in i_brackets) is False:
         # Until all values in i_brackets are -1.
         # Find the bracket that comes next in the string:
-        i_brackets_p = [i if i > 0 else max(i_brackets) + 1
+        i_brackets_p = [i if i >= 0 else max(i_brackets) + 1
                         for i in i_brackets]
         ind_next_bracket = i_brackets_p.index(min(i_brackets_p))
 
@@ -408,7 +852,11 @@ def _increase_indent_between_brackets(line, indent='  '):
         cc_next_bracket = bracket_close_list[ind_next_bracket]
 
         i_next_open = line.index(c_next_bracket)
-        i_next_close = line.index(cc_next_bracket)
+        # Look for the close bracket after the open bracket.
+        # If there isn't one, treat the rest of the line as inside.
+        i_next_close = line.find(cc_next_bracket, i_next_open)
+        if i_next_close < 0:
+            i_next_close = len(line)
 
         # Everything before and including the first open bracket...
         line_before = line[:i_next_open + 1]
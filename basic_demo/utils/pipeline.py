@@ -0,0 +1,244 @@
+"""
+Declare the cleaning steps once and let the pipeline run them.
+
+Each step says which data it takes in and which data it gives out.
+Names for the data are either columns of the raw DataFrame or the
+outputs of earlier steps. From these names the pipeline works out
+which steps depend on which others. Steps that don't depend on each
+other, e.g. cleaning "Sex" and cleaning "Age", are run at the same
+time on a pool of threads or processes.
+
+Example:
+    pipeline = Pipeline()
+    pipeline.add_step(
+        clean.impute_missing_with_median,
+        inputs=['Age'],
+        outputs=['age', 'age_imputed']
+        )
+    pipeline.add_step(
+        clean.rename_values,
+        inputs=['Sex'],
+        outputs=['sex'],
+        dict_map={'male': True, 'female': False}
+        )
+    df_clean = pipeline.run(
+        df_raw, keep=[['PassengerId'], 'sex', 'age', 'age_imputed'])
+
+The cleaned DataFrame is put together only once at the end.
+
+The log from utils.clean_log is written in whatever order the steps
+happen to finish in. For a log that reads in order, use
+max_workers=1.
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+import utils.clean as clean
+
+
+@dataclass
+class Step:
+    """
+    One function in the pipeline and the data it uses and makes.
+
+    Attributes
+    ----------
+    func    - function. Called as func(*inputs, **kwargs).
+    inputs  - list. Names of the data passed to func in order.
+              Each name is either a column of the raw DataFrame,
+              the output of another step, or a list of columns of
+              the raw DataFrame to be passed as one DataFrame.
+    outputs - list. Names for each of the things returned by func.
+    kwargs  - dict. Keyword arguments for func.
+    """
+    func: callable
+    inputs: list
+    outputs: list
+    kwargs: dict = field(default_factory=dict)
+
+    @property
+    def name(self):
+        """Name of this step for error messages."""
+        return f'{self.func.__name__} -> {", ".join(self.outputs)}'
+
+
+class Pipeline:
+    """
+    A set of cleaning steps and the dependencies between them.
+    """
+    def __init__(self, name: str = 'cleaned data'):
+        """
+        Inputs
+        ------
+        name - str. Name given to the cleaned DataFrame.
+        """
+        self.name = name
+        self.steps = []
+
+    def add_step(self, func, inputs: list, outputs: list, **kwargs):
+        """
+        Add a step to the pipeline.
+
+        Inputs
+        ------
+        func     - function. The cleaning function to run.
+        inputs   - list. Names of the data to pass to func.
+        outputs  - list. Names for the data that func returns.
+        **kwargs - dict. Keyword arguments for func.
+
+        Returns
+        -------
+        self - Pipeline. So that calls can be chained.
+        """
+        self.steps.append(Step(func, inputs, outputs, kwargs))
+        return self
+
+    def find_dependencies(self, columns_raw: list):
+        """
+        Find which steps each step has to wait for.
+
+        Inputs
+        ------
+        columns_raw - list. Columns of the raw DataFrame.
+
+        Returns
+        -------
+        dependencies - dict. For each step index, the set of indices
+                       of the steps that make its inputs.
+        """
+        # Which step makes each output:
+        made_by = {}
+        for i, step in enumerate(self.steps):
+            for output in step.outputs:
+                if output in made_by:
+                    raise ValueError(
+                        f'"{output}" is made by more than one step.')
+                made_by[output] = i
+
+        dependencies = {}
+        for i, step in enumerate(self.steps):
+            dependencies[i] = set()
+            for name in step.inputs:
+                if isinstance(name, list):
+                    # A selection of raw columns.
+                    missing = set(name) - set(columns_raw)
+                elif name in made_by:
+                    dependencies[i].add(made_by[name])
+                    missing = set()
+                else:
+                    missing = set([name]) - set(columns_raw)
+                if len(missing) > 0:
+                    raise ValueError(
+                        f'Step "{step.name}" needs {sorted(missing)} ' +
+                        'but nothing makes them.'
+                        )
+        self._check_for_cycles(dependencies)
+        return dependencies
+
+    def run(
+            self,
+            df_raw: pd.DataFrame,
+            keep: list,
+            max_workers: int = None,
+            use_processes: bool = False,
+            cache=None
+            ):
+        """
+        Run all of the steps and put the results in one DataFrame.
+
+        Inputs
+        ------
+        df_raw        - pd.DataFrame. The raw data.
+        keep          - list. Names of the data to put in the cleaned
+                        DataFrame, in order. As for step inputs, these
+                        can be raw columns, step outputs or lists of
+                        raw columns.
+        max_workers   - int or None. Number of steps to run at once.
+                        If None, let the pool decide.
+        use_processes - bool. Whether to use a pool of processes
+                        instead of threads. Every function and its
+                        inputs then have to be picklable.
+        cache         - utils.cache.StepCache or None. If given, load
+                        the outputs of steps that were run before with
+                        the same inputs and parameters, and only run
+                        the rest.
+
+        Returns
+        -------
+        df_clean - pd.DataFrame. The kept data.
+        """
+        dependencies = self.find_dependencies(list(df_raw.columns))
+        results = {}
+
+        def _fetch(name):
+            if isinstance(name, list):
+                return df_raw[name]
+            elif name in results:
+                return results[name]
+            else:
+                return df_raw[name]
+
+        pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool(max_workers=max_workers) as executor:
+            not_started = set(dependencies.keys())
+            running = {}
+            while (len(not_started) > 0) | (len(running) > 0):
+                # Start every step whose inputs are all ready:
+                done_steps = set(dependencies.keys()) - not_started - \
+                    set(running.values())
+                for i in sorted(not_started):
+                    if dependencies[i] <= done_steps:
+                        step = self.steps[i]
+                        args = [_fetch(name) for name in step.inputs]
+                        if cache is None:
+                            future = executor.submit(
+                                step.func, *args, **step.kwargs)
+                        else:
+                            future = executor.submit(
+                                cache.call, step.func, *args,
+                                **step.kwargs)
+                        running[future] = i
+                        not_started.remove(i)
+
+                # Wait for at least one step to finish:
+                finished, _ = wait(
+                    running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = running.pop(future)
+                    self._store_outputs(
+                        self.steps[i], future.result(), results)
+
+        # Put together the cleaned data in one go:
+        df_clean = pd.DataFrame()
+        df_clean = clean.set_attrs_name(df_clean, self.name)
+        df_clean = clean.add_to_dataframe(
+            df_clean, *[_fetch(name) for name in keep])
+        return df_clean
+
+    def _store_outputs(self, step: Step, to_return, results: dict):
+        """Match up the things a step returned with its output names."""
+        if not isinstance(to_return, tuple):
+            to_return = (to_return, )
+        if len(to_return) != len(step.outputs):
+            raise ValueError(
+                f'Step "{step.name}" returned {len(to_return)} ' +
+                f'things but has {len(step.outputs)} output names.'
+                )
+        for name, value in zip(step.outputs, to_return):
+            results[name] = value
+
+    def _check_for_cycles(self, dependencies: dict):
+        """Raise an error if any steps depend on each other in a loop."""
+        done = set()
+        remaining = set(dependencies.keys())
+        while len(remaining) > 0:
+            ready = set(i for i in remaining if dependencies[i] <= done)
+            if len(ready) == 0:
+                names = [self.steps[i].name for i in sorted(remaining)]
+                raise ValueError(
+                    f'These steps depend on each other in a loop: {names}')
+            done |= ready
+            remaining -= ready
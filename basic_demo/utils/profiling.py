@@ -0,0 +1,203 @@
+"""
+Measure what each cleaning step costs.
+
+Every function in utils.clean_log goes through log_wrapper(). While
+profiling is switched on, log_wrapper() also measures each call:
++ wall time   - time on the clock.
++ CPU time    - time spent working by this process. With steps
+                running at the same time on threads (utils.pipeline)
+                this includes the other threads' work.
++ peak memory - most extra memory allocated by Python during the
+                call, from tracemalloc. Also counts other threads.
+                tracemalloc has one peak for the whole process, so
+                a call that another call started during, e.g. on
+                another thread or nested inside it, has no peak
+                memory. These calls are marked as overlapped.
++ the shapes of the inputs and outputs.
+
+Example:
+    report = start_profiling()
+    ... run the pipeline using utils.clean_log ...
+    stop_profiling()
+    print(report.to_string())
+"""
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+# The report being filled in, when profiling:
+_report = None
+# Whether start_profiling() switched on tracemalloc:
+_started_tracemalloc = False
+# Costs of the calls being measured right now, to mark them as
+# overlapped when another call resets the peak memory:
+_active_costs = []
+_active_lock = threading.Lock()
+
+
+class RunReport:
+    """
+    Measurements for each call made during one run.
+    """
+    def __init__(self, trace_memory: bool = True):
+        """
+        Inputs
+        ------
+        trace_memory - bool. Whether to measure peak memory. This
+                       slows down everything that allocates memory.
+        """
+        self.trace_memory = trace_memory
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        """Store the measurements for one call."""
+        with self._lock:
+            self.records.append(record)
+
+    def to_dataframe(self):
+        """
+        All of the measurements with one row per call, in order.
+        """
+        columns = [
+            'function', 'wall_s', 'cpu_s', 'peak_memory_mb',
+            'overlapped', 'input_shapes', 'output_shapes'
+        ]
+        df = pd.DataFrame(self.records, columns=columns)
+        return df
+
+    def summary(self):
+        """
+        Totals for each function, most expensive first.
+        """
+        df = self.to_dataframe()
+        df_summary = df.groupby('function').agg(
+            calls=('wall_s', 'size'),
+            wall_s=('wall_s', 'sum'),
+            cpu_s=('cpu_s', 'sum'),
+            peak_memory_mb=('peak_memory_mb', 'max'),
+            overlapped=('overlapped', 'sum'),
+            )
+        df_summary = df_summary.sort_values('wall_s', ascending=False)
+        return df_summary
+
+    def to_string(self):
+        """
+        The summary as a table of text.
+
+        Only the function names are shown, not their modules, to
+        keep the table narrow enough for the log.
+        """
+        df_summary = self.summary()
+        df_summary.index = [f.split('.')[-1] for f in df_summary.index]
+        text = df_summary.to_string(float_format=lambda x: f'{x:.4f}')
+        if df_summary['overlapped'].sum() > 0:
+            text += '\n'.join([
+                '',
+                'overlapped: calls with another call started during them,',
+                'e.g. on another thread. Their peak memory is not known',
+                'and is left out of peak_memory_mb.'
+                ])
+        return text
+
+
+def start_profiling(trace_memory: bool = True):
+    """
+    Start measuring every call that goes through log_wrapper().
+
+    Inputs
+    ------
+    trace_memory - bool. Whether to measure peak memory.
+
+    Returns
+    -------
+    report - RunReport. Filled in as the calls happen.
+    """
+    global _report, _started_tracemalloc
+    _report = RunReport(trace_memory=trace_memory)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    return _report
+
+
+def stop_profiling():
+    """
+    Stop measuring calls.
+
+    Returns
+    -------
+    report - RunReport or None. The finished report.
+    """
+    global _report, _started_tracemalloc
+    report = _report
+    _report = None
+    if _started_tracemalloc:
+        # Leave tracemalloc alone if something else switched it on.
+        tracemalloc.stop()
+        _started_tracemalloc = False
+    return report
+
+
+def is_profiling():
+    """Check whether calls are being measured."""
+    return _report is not None
+
+
+def run_measured(f, args, kwargs):
+    """
+    Run f(*args, **kwargs) and measure how long it takes.
+
+    Peak memory is only measured while profiling with trace_memory.
+
+    Returns
+    -------
+    to_return - whatever f returns.
+    cost      - dict. Wall time, CPU time and peak memory, and
+                whether another call overlapped this one.
+    """
+    trace = (_report is not None) and _report.trace_memory and \
+        tracemalloc.is_tracing()
+    cost = {'peak_memory_mb': None, 'overlapped': False}
+    if trace:
+        with _active_lock:
+            # Resetting the peak spoils the peak of every other call
+            # still running:
+            for cost_active in _active_costs:
+                cost_active['overlapped'] = True
+            _active_costs.append(cost)
+            memory_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    try:
+        to_return = f(*args, **kwargs)
+    finally:
+        if trace:
+            with _active_lock:
+                memory_peak = tracemalloc.get_traced_memory()[1]
+                # By identity, as other costs can be equal to this one:
+                del _active_costs[next(
+                    i for i, c in enumerate(_active_costs) if c is cost)]
+
+    cost['wall_s'] = time.perf_counter() - wall_start
+    cost['cpu_s'] = time.process_time() - cpu_start
+    if trace and not cost['overlapped']:
+        cost['peak_memory_mb'] = (memory_peak - memory_start) / 1e6
+    return to_return, cost
+
+
+def record_call(f, cost: dict, input_shapes: list, output_shapes: list):
+    """Add the cost of one call to the current report."""
+    if _report is None:
+        return
+    _report.add({
+        'function': f'{f.__module__}.{f.__name__}',
+        **cost,
+        'input_shapes': input_shapes,
+        'output_shapes': output_shapes,
+    })
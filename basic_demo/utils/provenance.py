@@ -0,0 +1,219 @@
+"""
+Machine-readable record of every function run through log_wrapper().
+
+Each call is saved as one line of JSON (JSON Lines) with:
++ event     - 'call'.
++ function  - module and name of the function.
++ doc       - first line of its docstring.
++ signature - its parameter names and type hints.
++ args      - names of the positional arguments, from find_arg_name().
++ kwargs    - names of the keyword arguments.
++ outputs   - names of the returned objects.
++ input_shapes, output_shapes - [rows, columns] of each argument and
+              returned object, or None if it isn't tabular.
++ time_start - when the call started, in seconds since the epoch.
++ duration_s - how long the call took in seconds.
++ from_cache - whether the output was loaded from utils.cache.
+
+Each step named with utils.log.log_step() is saved as a line with
+event 'step', its text and the time.
+
+Nothing is laid out as text while the pipeline runs. The steps and
+function calls of the usual text log can be made from the record
+afterwards with render_text_log(). read_provenance_log() gives a
+DataFrame of the calls to query, e.g.:
+
+    df_prov = read_provenance_log('provenance.jsonl')
+    df_prov[df_prov['outputs'].apply(lambda o: 'CabinLetter' in o)]
+"""
+import atexit
+import json
+import threading
+import inspect
+import time
+from functools import lru_cache
+
+import pandas as pd
+
+
+# Open file that records are written to, when recording:
+_provenance_file = None
+# Stop records from different threads being mixed together:
+_provenance_lock = threading.Lock()
+
+
+def start_provenance_log(path_to_file: str, filemode: str = 'w'):
+    """
+    Start writing a record of each log_wrapper() call to file.
+
+    Inputs
+    ------
+    path_to_file - str. Location of the JSON Lines file.
+    filemode     - str. 'w' to overwrite an existing file, 'a' to add
+                   to the end of it.
+    """
+    global _provenance_file
+    stop_provenance_log()
+    _provenance_file = open(path_to_file, filemode, encoding='utf-8')
+    atexit.register(stop_provenance_log)
+
+
+def stop_provenance_log():
+    """Stop recording and close the file."""
+    global _provenance_file
+    if _provenance_file is not None:
+        _provenance_file.close()
+        _provenance_file = None
+
+
+def is_recording():
+    """Check whether calls are being recorded."""
+    return _provenance_file is not None
+
+
+def record_call(
+        f,
+        arg_names: list,
+        kwarg_names: dict,
+        output_names: list,
+        input_shapes: list,
+        output_shapes: list,
+        time_start: float,
+        duration_s: float,
+        from_cache: bool = False
+        ):
+    """
+    Write one record for a call to function f.
+
+    Names are stored as strings, exactly as they appear in the text
+    log.
+    """
+    if _provenance_file is None:
+        return
+    record = {
+        'event': 'call',
+        **_describe_function(f),
+        'args': [str(name) for name in arg_names],
+        'kwargs': {key: str(name) for key, name in kwarg_names.items()},
+        'outputs': [str(name) for name in output_names],
+        'input_shapes': input_shapes,
+        'output_shapes': output_shapes,
+        'time_start': time_start,
+        'duration_s': duration_s,
+        'from_cache': from_cache,
+    }
+    _write_record(record)
+
+
+def record_step(text: str):
+    """Write one record for a step from utils.log.log_step()."""
+    if _provenance_file is None:
+        return
+    _write_record({'event': 'step', 'text': text, 'time': time.time()})
+
+
+def _write_record(record: dict):
+    """Write one record as a line of the file."""
+    line = json.dumps(record) + '\n'
+    with _provenance_lock:
+        _provenance_file.write(line)
+
+
+def find_shape(obj: any):
+    """
+    Number of rows and columns in a Series or DataFrame.
+
+    Returns
+    -------
+    shape - list or None. [rows, columns], or None if obj is not a
+            Series or DataFrame.
+    """
+    if isinstance(obj, pd.DataFrame):
+        shape = list(obj.shape)
+    elif isinstance(obj, pd.Series):
+        shape = [len(obj), 1]
+    else:
+        shape = None
+    return shape
+
+
+def read_provenance_log(path_to_file: str, steps: bool = False):
+    """
+    Read a provenance file into a DataFrame with one row per call.
+
+    Inputs
+    ------
+    path_to_file - str. Location of the JSON Lines file.
+    steps        - bool. Whether to keep the rows for the steps too,
+                   in order among the calls.
+    """
+    df = pd.read_json(path_to_file, lines=True, dtype=False)
+    if 'event' in df.columns:
+        if not steps:
+            # Files from before steps were recorded have no event.
+            df = df[df['event'] != 'step'].reset_index(drop=True)
+            df = df.drop(columns=['text', 'time'], errors='ignore')
+    return df
+
+
+def render_text_log(path_to_file: str):
+    """
+    Make the text log for the steps and calls in a provenance file.
+
+    The text matches what log_step() and log_wrapper() write, without
+    the "INFO:pipeline:" at the start of each line. This includes the
+    note for outputs loaded from the cache. Long lines are split in
+    the same way as by utils.log.log_text().
+
+    Anything else written to the text log is not recorded and so is
+    left out, e.g. headings from log_heading(), text from log_text()
+    and the tables of DataFrame contents and profiles.
+
+    Returns
+    -------
+    text - str. One block of text per step and per function call.
+    """
+    # Imported here because utils.log imports this module.
+    from utils.log import split_for_width, format_step, \
+        _format_function_info, _format_function_params, \
+        _format_function_output
+
+    lines = []
+    with open(path_to_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('event') == 'step':
+                lines += format_step(record['text'])
+                continue
+            module, name = record['function'].rsplit('.', 1)
+            # One entry per log_text() call in log_wrapper(), each
+            # split across lines as log_text() would:
+            text_calls = [
+                _format_function_info(
+                    module, name, record['doc'], record['signature']),
+                _format_function_params(record['args'], record['kwargs']),
+                _format_function_output(record['outputs']),
+                ]
+            if record.get('from_cache', False):
+                text_calls.append('(Loaded from cache.)')
+            for text_call in text_calls + ['']:
+                lines += split_for_width(text_call)
+    text = '\n'.join(lines)
+    return text
+
+
+@lru_cache(maxsize=None)
+def _describe_function(f):
+    """
+    Name, docstring and signature of a function.
+
+    These are the same on every call so only find them once.
+    """
+    doc_lines = [line.strip() for line in (f.__doc__ or '').split('\n')]
+    doc_lines = [line for line in doc_lines if len(line) > 0]
+    description = {
+        'function': f'{f.__module__}.{f.__name__}',
+        'doc': doc_lines[0] if len(doc_lines) > 0 else None,
+        'signature': str(inspect.signature(f)),
+    }
+    return description
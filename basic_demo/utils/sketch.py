@@ -0,0 +1,317 @@
+"""
+Medians that can be built up a piece at a time and merged.
+
+series.median() needs the whole column in memory at once. The
+summaries here instead take in the data a chunk at a time, and the
+summaries of separate chunks, files or worker processes can be merged
+into one before the median is read off:
+
++ IntegerHistogram - exact. Counts how often each integer appears.
+                     Only for whole numbers in a limited range,
+                     e.g. ages or lengths of stay.
++ QuantileSketch   - approximate. Keeps a small weighted sample of
+                     the values (a KLL sketch), so it uses about the
+                     same memory however much data goes in. The rank
+                     of the median it gives is usually within about
+                     1% of the true median for the default k.
+
+Example with chunks cleaned on separate workers:
+
+    sketches = [QuantileSketch().update(df['Age']) for df in chunks]
+    sketch = sketches[0]
+    for other in sketches[1:]:
+        sketch.merge(other)
+    median_age = sketch.median()
+
+Both can be saved with to_dict() and remade with from_dict(), e.g.
+to send them back from worker processes as json.
+"""
+import numpy as np
+import pandas as pd
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles from a KLL sketch.
+
+    The values are kept in levels. A value in level h stands for 2**h
+    of the original values. When a level gets too full it is sorted
+    and every other value moves up a level, which halves the number
+    stored. Lower levels hold fewer values than higher ones so that
+    most of the memory goes on the values with the most weight.
+    """
+    def __init__(self, k: int = 200, seed: int = 0):
+        """
+        Inputs
+        ------
+        k    - int. Most values kept in the top level. Larger k is
+               more accurate and uses more memory.
+        seed - int. Seed for picking which values move up a level.
+        """
+        self.k = k
+        self.seed = seed
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: any):
+        """
+        Add values to the sketch. Missing values are skipped.
+
+        Returns
+        -------
+        self - QuantileSketch. So that calls can be chained.
+        """
+        values = _find_non_missing(values)
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: 'QuantileSketch'):
+        """
+        Add the values summarised by another sketch to this one.
+
+        Returns
+        -------
+        self - QuantileSketch. So that calls can be chained.
+        """
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q: float):
+        """
+        Approximate value with a fraction q of the data below it.
+
+        Returns
+        -------
+        value - float. NaN if the sketch is empty.
+        """
+        values = np.concatenate(self.levels)
+        if len(values) == 0:
+            return np.nan
+        weights = np.concatenate([
+            np.full(len(level), 2 ** h, dtype=np.int64)
+            for h, level in enumerate(self.levels)
+            ])
+        order = np.argsort(values, kind='stable')
+        ranks = np.cumsum(weights[order])
+        i = np.searchsorted(ranks, q * ranks[-1])
+        value = float(values[order][min(i, len(values) - 1)])
+        return value
+
+    def median(self):
+        """Approximate median of every value added so far."""
+        return self.quantile(0.5)
+
+    def to_dict(self):
+        """All of the settings and stored values as a dict."""
+        return {
+            'k': self.k,
+            'seed': self.seed,
+            'count': self.count,
+            'levels': [level.tolist() for level in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, sketch_dict: dict):
+        """Make a sketch from the output of to_dict()."""
+        sketch = cls(k=sketch_dict['k'], seed=sketch_dict['seed'])
+        sketch.count = sketch_dict['count']
+        sketch.levels = [
+            np.asarray(level, dtype=float) for level in sketch_dict['levels']
+            ]
+        return sketch
+
+    def _capacity(self, h: int):
+        """Most values that level h can hold before it is compacted."""
+        depth = len(self.levels) - 1 - h
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        """Compact every level that is over capacity, lowest first."""
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # With an odd number of values, one stays behind:
+                n_leftover = len(level) % 2
+                # Start from the first or second value at random so
+                # that the values moving up aren't always the smaller:
+                start = n_leftover + self._rng.integers(0, 2)
+                self.levels[h] = level[:n_leftover]
+                self.levels[h + 1] = np.concatenate(
+                    [self.levels[h + 1], level[start::2]])
+            h += 1
+
+
+class IntegerHistogram:
+    """
+    Exact count of each whole number, for exact quantiles.
+    """
+    def __init__(self, max_bins: int = 10 ** 7):
+        """
+        Inputs
+        ------
+        max_bins - int. Most different integers to count between the
+                   smallest and largest value, to limit memory.
+        """
+        self.max_bins = max_bins
+        self.low = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def count(self):
+        """Number of values added so far."""
+        return int(self.counts.sum())
+
+    def update(self, values: any):
+        """
+        Add values to the histogram. Missing values are skipped.
+
+        Returns
+        -------
+        self - IntegerHistogram. So that calls can be chained.
+        """
+        values = _find_non_missing(values)
+        if len(values) == 0:
+            return self
+        if not np.all(values == np.round(values)):
+            raise ValueError(
+                'IntegerHistogram only takes whole numbers. ' +
+                'Use QuantileSketch instead.'
+                )
+        values = values.astype(np.int64)
+        low = int(values.min())
+        # Check the range before bincount() makes an array that big:
+        self._find_range(low, int(values.max()) - low + 1)
+        self._add(low, np.bincount(values - low))
+        return self
+
+    def merge(self, other: 'IntegerHistogram'):
+        """
+        Add the counts from another histogram to this one.
+
+        Returns
+        -------
+        self - IntegerHistogram. So that calls can be chained.
+        """
+        if len(other.counts) > 0:
+            self._add(other.low, other.counts)
+        return self
+
+    def quantile(self, q: float):
+        """
+        Value with a fraction q of the data below it.
+
+        Matches pd.Series.quantile() with its default linear
+        interpolation between the two nearest values.
+
+        Returns
+        -------
+        value - float. NaN if the histogram is empty.
+        """
+        n = self.count
+        if n == 0:
+            return np.nan
+        position = q * (n - 1)
+        below = self._find_value_at_rank(int(np.floor(position)))
+        above = self._find_value_at_rank(int(np.ceil(position)))
+        value = below + (above - below) * (position - np.floor(position))
+        return float(value)
+
+    def median(self):
+        """Exact median of every value added so far."""
+        return self.quantile(0.5)
+
+    def to_dict(self):
+        """All of the settings and counts as a dict."""
+        return {
+            'max_bins': self.max_bins,
+            'low': self.low,
+            'counts': self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, histogram_dict: dict):
+        """Make a histogram from the output of to_dict()."""
+        histogram = cls(max_bins=histogram_dict['max_bins'])
+        histogram.low = histogram_dict['low']
+        histogram.counts = np.asarray(
+            histogram_dict['counts'], dtype=np.int64)
+        return histogram
+
+    def _find_range(self, low: int, n_bins: int):
+        """
+        Range of values after adding n_bins counts from the value low.
+
+        Raises an error if it would need more than max_bins counts.
+
+        Returns
+        -------
+        new_low  - int. Smallest value.
+        new_high - int. One more than the largest value.
+        """
+        if len(self.counts) == 0:
+            new_low = low
+            new_high = low + n_bins
+        else:
+            new_low = min(self.low, low)
+            new_high = max(self.low + len(self.counts), low + n_bins)
+        if new_high - new_low > self.max_bins:
+            raise ValueError(
+                f'The values span more than {self.max_bins} integers. ' +
+                'Use QuantileSketch instead.'
+                )
+        return new_low, new_high
+
+    def _add(self, low: int, counts: np.array):
+        """Add counts that start from the value low."""
+        new_low, new_high = self._find_range(low, len(counts))
+        combined = np.zeros(new_high - new_low, dtype=np.int64)
+        combined[self.low - new_low:
+                 self.low - new_low + len(self.counts)] += self.counts
+        combined[low - new_low:low - new_low + len(counts)] += counts
+        self.low = new_low
+        self.counts = combined
+
+    def _find_value_at_rank(self, rank: int):
+        """The value in place rank when all values are sorted."""
+        i = np.searchsorted(np.cumsum(self.counts), rank, side='right')
+        return self.low + int(i)
+
+
+def make_median_summary(method: str):
+    """
+    Empty summary to find a median with.
+
+    Inputs
+    ------
+    method - str. 'sketch' for a QuantileSketch or 'histogram' for
+             an IntegerHistogram.
+    """
+    if method == 'sketch':
+        return QuantileSketch()
+    elif method == 'histogram':
+        return IntegerHistogram()
+    else:
+        raise ValueError(
+            f"method must be 'sketch' or 'histogram', not {method!r}.")
+
+
+def _find_non_missing(values: any):
+    """The non-missing values as a float NumPy array."""
+    if isinstance(values, pd.Series):
+        values = values.dropna().to_numpy(dtype=float)
+    else:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+    return values
@@ -0,0 +1,264 @@
+"""
+Routines for cleaning data that is too big to fit in memory.
+
+The data is read from csv in chunks of a fixed number of rows.
+Each chunk goes through the same cleaning steps as a whole
+DataFrame would and the result is appended to the output file.
+
+Steps that need to know about the whole dataset, e.g. the median
+for imputation or the full list of categories for one-hot-encoding,
+are found first in a separate pass over only the column they need.
+The results are then passed to the cleaning steps, e.g.:
+
+    median_age = fit_median('titanic.csv', 'Age')
+    encoder_embarked = fit_encoder(
+        'titanic.csv', 'Embarked', label_missing='missing')
+
+    def clean_chunk(df_raw):
+        series, imputed = clean.impute_missing_with_median(
+            df_raw['Age'], median=median_age)
+        ...
+        df_ohe = clean.apply_one_hot_encoding(
+            series_embarked, encoder=encoder_embarked)
+        ...
+        return df_clean
+
+    load_plan = infer_load_plan('titanic.csv')
+    clean_in_chunks('titanic.csv', 'titanic_cleaned.csv', clean_chunk,
+                    load_plan=load_plan)
+
+Without a load plan, pandas guesses the data types of each chunk
+separately, so the output isn't always exactly the same as cleaning
+the whole file at once.
+"""
+import pandas as pd
+
+from utils.clean import load_data
+from utils.encode import OneHotEncoder, sort_categories
+from utils.sketch import make_median_summary
+
+
+def fit_median(
+        path_to_file: str,
+        column: str,
+        chunksize: int = 100000,
+        method: str = 'exact'
+        ):
+    """
+    Find the median of one column of a csv file.
+
+    Only this column is read in, one chunk at a time. With the default
+    method the result is exactly equal to the median of the whole
+    column, but every non-missing value is kept in memory until the
+    end. The other methods only keep a small summary of each chunk
+    and merge it into the summary so far (see utils.sketch).
+
+    Inputs
+    ------
+    path_to_file - str. Location of the csv file.
+    column       - str. Name of the column.
+    chunksize    - int. Number of rows to read in at once.
+    method       - str. How to find the median:
+                   + 'exact'     - keep every value.
+                   + 'histogram' - exact, for whole numbers only.
+                   + 'sketch'    - approximate, in fixed memory.
+
+    Returns
+    -------
+    median - float. The median of all non-missing values.
+    """
+    if method != 'exact':
+        summary = fit_median_summary(
+            path_to_file, column, chunksize=chunksize, method=method)
+        return summary.median()
+    values = []
+    with pd.read_csv(
+            path_to_file, usecols=[column], chunksize=chunksize
+            ) as reader:
+        for df in reader:
+            # Only keep the non-missing values to save memory:
+            values.append(df[column].dropna())
+    median = pd.concat(values).median()
+    return median
+
+
+def fit_median_summary(
+        path_to_file: str,
+        column: str,
+        chunksize: int = 100000,
+        method: str = 'sketch'
+        ):
+    """
+    Summarise one column of a csv file for finding its median.
+
+    Each chunk is summarised on its own and merged into the total.
+    The summaries of separate files, e.g. made by separate workers,
+    can be merged in the same way before the median is taken:
+
+        summary = fit_median_summary('part1.csv', 'Age')
+        summary.merge(fit_median_summary('part2.csv', 'Age'))
+        median_age = summary.median()
+
+    Inputs
+    ------
+    path_to_file - str. Location of the csv file.
+    column       - str. Name of the column.
+    chunksize    - int. Number of rows to read in at once.
+    method       - str. 'sketch' or 'histogram', as for fit_median().
+
+    Returns
+    -------
+    summary - QuantileSketch or IntegerHistogram. Summary of all of
+              the non-missing values.
+    """
+    summary = make_median_summary(method)
+    with pd.read_csv(
+            path_to_file, usecols=[column], chunksize=chunksize
+            ) as reader:
+        for df in reader:
+            summary.merge(make_median_summary(method).update(df[column]))
+    return summary
+
+
+def fit_categories(
+        path_to_file: str,
+        column: str,
+        label_missing: str = None,
+        chunksize: int = 100000
+        ):
+    """
+    Find the sorted list of unique values in one column of a csv.
+
+    This matches the columns that pd.get_dummies() would create from
+    the whole column, so it can be passed as "categories" to
+    clean.apply_one_hot_encoding() for each chunk.
+
+    Inputs
+    ------
+    path_to_file  - str. Location of the csv file.
+    column        - str. Name of the column.
+    label_missing - str or None. If the column will be imputed with
+                    clean.impute_missing_with_label() before encoding,
+                    give the label here. It is added to the
+                    categories when any values are missing.
+    chunksize     - int. Number of rows to read in at once.
+
+    Returns
+    -------
+    categories - list. Sorted unique values in the column.
+    """
+    categories = set()
+    any_missing = False
+    with pd.read_csv(
+            path_to_file, usecols=[column], chunksize=chunksize
+            ) as reader:
+        for df in reader:
+            series = df[column]
+            categories.update(series.dropna().unique())
+            any_missing = any_missing or series.isna().any()
+    if (label_missing is not None) & any_missing:
+        categories.add(label_missing)
+    categories = sort_categories(categories)
+    return categories
+
+
+def fit_encoder(
+        path_to_file: str,
+        column: str,
+        label_missing: str = None,
+        chunksize: int = 100000,
+        **kwargs
+        ):
+    """
+    Fit a one-hot encoder to one column of a csv file.
+
+    The categories come from fit_categories(), so the encoder gives
+    the same columns for every chunk as pd.get_dummies() would for
+    the whole column.
+
+    Inputs
+    ------
+    path_to_file  - str. Location of the csv file.
+    column        - str. Name of the column.
+    label_missing - str or None. As for fit_categories().
+    chunksize     - int. Number of rows to read in at once.
+    **kwargs      - dict. Other settings for OneHotEncoder, e.g.
+                    handle_unknown='ignore'. The prefix defaults to
+                    the name that clean.apply_one_hot_encoding() would
+                    use for the whole column: the column name, or
+                    "{column}_ImputedLabel" if label_missing is given
+                    as the column is then imputed first.
+
+    Returns
+    -------
+    encoder - OneHotEncoder. Ready to pass to
+              clean.apply_one_hot_encoding().
+    """
+    categories = fit_categories(
+        path_to_file, column, label_missing, chunksize)
+    if label_missing is None:
+        kwargs.setdefault('prefix', column)
+    else:
+        # Name given by clean.impute_missing_with_label():
+        kwargs.setdefault('prefix', f'{column}_ImputedLabel')
+    encoder = OneHotEncoder(categories=categories, **kwargs)
+    return encoder
+
+
+def clean_in_chunks(
+        path_in: str,
+        path_out: str,
+        func_clean,
+        chunksize: int = 100000,
+        load_plan=None
+        ):
+    """
+    Clean a csv file in chunks and append each result to path_out.
+
+    Each chunk is read with the same data types only if they are set
+    by load_plan. Otherwise pandas guesses them for each chunk, e.g.
+    int64 for a column in one chunk and float64 in a chunk where it
+    has missing values, and the output can differ from cleaning the
+    whole file at once. utils.load_plan.infer_load_plan() can make a
+    plan from the start of the file.
+
+    Inputs
+    ------
+    path_in    - str. Location of the raw csv file.
+    path_out   - str. Location of the cleaned csv file. Any existing
+                 file here is overwritten.
+    func_clean - function. Takes a raw DataFrame and returns the
+                 cleaned DataFrame. It is called once per chunk.
+    chunksize  - int. Number of rows to read in at once.
+    load_plan  - utils.load_plan.LoadPlan or None. Columns and data
+                 types to read every chunk with.
+
+    Returns
+    -------
+    n_rows - int. Total number of rows written to path_out.
+    """
+    n_rows = 0
+    i = -1
+    chunks = load_data(path_in, chunksize=chunksize, load_plan=load_plan)
+    for i, df_raw in enumerate(chunks):
+        df_clean = func_clean(df_raw)
+        # Only write the column names at the top of the file:
+        df_clean.to_csv(
+            path_out,
+            index=False,
+            mode='w' if i == 0 else 'a',
+            header=(i == 0)
+            )
+        n_rows += len(df_clean)
+    if i < 0:
+        # No rows at all. Still write the column names of the cleaned
+        # data, from cleaning no rows:
+        df_raw = pd.read_csv(path_in, nrows=0)
+        if load_plan is not None:
+            if load_plan.usecols is not None:
+                df_raw = df_raw[load_plan.usecols]
+            df_raw = df_raw.astype(
+                {c: t for c, t in load_plan.dtypes.items()
+                 if c in df_raw.columns})
+        func_clean(df_raw).to_csv(path_out, index=False)
+    return n_rows
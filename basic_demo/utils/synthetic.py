@@ -0,0 +1,159 @@
+"""
+Make fake datasets shaped like the example data, at any size.
+
++ make_health_data()  - like input/example_data.csv: one-hot age
+                        bands, M/F gender, arrival time bands.
++ make_titanic_data() - like input/titanic.csv: missing ages,
+                        cabin codes, embarkation ports.
+
+The values are random and mean nothing. They are for timing the
+cleaning functions on realistic column types and missing data.
+
+Datasets too big for memory can be written to csv in chunks with
+write_synthetic_csv().
+"""
+import numpy as np
+import pandas as pd
+
+
+# Column names and values copied from the example data:
+AGE_BANDS = [
+    'AgeUnder40', 'Age40to44', 'Age45to49', 'Age50to54', 'Age55to59',
+    'Age60to64', 'Age65to69', 'Age70to74', 'Age75to79', 'Age80to84',
+    'Age85to89', 'AgeOver90'
+]
+ARRIVAL_TIME_BANDS = [
+    '0000to3000', '0300to0600', '0600to0900', '0900to1200',
+    '1200to1500', '1500to1800', '1800to2100', '2100to2400'
+]
+CABIN_LETTERS = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'T']
+
+
+def make_health_data(n_rows: int, seed: int = 0, row_offset: int = 0):
+    """
+    Make fake stroke data in the format of input/example_data.csv.
+
+    Inputs
+    ------
+    n_rows     - int. Number of patients.
+    seed       - int. Seed for the random numbers.
+    row_offset - int. Number of rows made before this one, so that
+                 patient_id carries on from there. patient_id
+                 starts from 0.
+
+    Returns
+    -------
+    df - pd.DataFrame. The fake data.
+    """
+    rng = np.random.default_rng(seed)
+
+    # One age band per patient, stored as one-hot columns:
+    age_band = rng.integers(0, len(AGE_BANDS), n_rows)
+    age_one_hot = np.zeros((n_rows, len(AGE_BANDS)), dtype=np.uint8)
+    age_one_hot[np.arange(n_rows), age_band] = 1
+
+    df = pd.DataFrame(age_one_hot, columns=AGE_BANDS)
+    df.insert(0, 'patient_id', np.arange(row_offset, row_offset + n_rows))
+    df['S1Gender'] = np.array(['F', 'M'])[rng.integers(0, 2, n_rows)]
+    df['FirstArrivalTime'] = np.array(ARRIVAL_TIME_BANDS)[
+        rng.integers(0, len(ARRIVAL_TIME_BANDS), n_rows)]
+    df['treated'] = rng.integers(0, 2, n_rows)
+    return df
+
+
+def make_titanic_data(
+        n_rows: int,
+        seed: int = 0,
+        row_offset: int = 0,
+        fraction_missing_age: float = 0.2,
+        fraction_missing_cabin: float = 0.77,
+        fraction_missing_embarked: float = 0.002
+        ):
+    """
+    Make fake passenger data in the format of input/titanic.csv.
+
+    Inputs
+    ------
+    n_rows     - int. Number of passengers.
+    seed       - int. Seed for the random numbers.
+    row_offset - int. Number of rows made before this one, so that
+                 PassengerId carries on from there. PassengerId
+                 starts from 1.
+    fraction_missing_* - float. Fraction of rows with that column
+                         missing. Defaults are roughly as in the
+                         real Titanic data.
+
+    Returns
+    -------
+    df - pd.DataFrame. The fake data.
+    """
+    rng = np.random.default_rng(seed)
+
+    age = rng.integers(1, 80, n_rows).astype(float)
+    age[rng.random(n_rows) < fraction_missing_age] = np.nan
+
+    # Cabin codes like "C85", and a few like "C23 C25":
+    letters = np.array(CABIN_LETTERS)[
+        rng.integers(0, len(CABIN_LETTERS), n_rows)]
+    numbers = rng.integers(1, 150, n_rows).astype(str)
+    cabin = np.char.add(letters, numbers).astype(object)
+    two_cabins = rng.random(n_rows) < 0.05
+    cabin[two_cabins] = cabin[two_cabins] + ' ' + cabin[two_cabins]
+    cabin[rng.random(n_rows) < fraction_missing_cabin] = np.nan
+
+    embarked = np.array(['S', 'C', 'Q'], dtype=object)[
+        rng.choice(3, n_rows, p=[0.72, 0.19, 0.09])]
+    embarked[rng.random(n_rows) < fraction_missing_embarked] = np.nan
+
+    df = pd.DataFrame({
+        'PassengerId': np.arange(row_offset + 1, row_offset + n_rows + 1),
+        'Survived': rng.integers(0, 2, n_rows),
+        'Pclass': rng.integers(1, 4, n_rows),
+        'Sex': np.array(['male', 'female'])[rng.integers(0, 2, n_rows)],
+        'Age': age,
+        'SibSp': rng.integers(0, 5, n_rows),
+        'Parch': rng.integers(0, 4, n_rows),
+        'Fare': np.round(rng.exponential(30.0, n_rows), 4),
+        'Cabin': cabin,
+        'Embarked': embarked,
+    })
+    return df
+
+
+def write_synthetic_csv(
+        make_data,
+        n_rows: int,
+        path_to_file: str,
+        chunksize: int = 1000000,
+        seed: int = 0
+        ):
+    """
+    Write a fake dataset to csv a chunk at a time.
+
+    Inputs
+    ------
+    make_data    - function. make_health_data or make_titanic_data.
+    n_rows       - int. Total number of rows.
+    path_to_file - str. Location of the new csv file.
+    chunksize    - int. Most rows to hold in memory at once.
+    seed         - int. Seed for the first chunk. Each later chunk
+                   adds one to it.
+
+    Returns
+    -------
+    path_to_file - str. Location of the new csv file.
+    """
+    n_written = 0
+    i = 0
+    while n_written < n_rows:
+        n = min(chunksize, n_rows - n_written)
+        df = make_data(n, seed=seed + i, row_offset=n_written)
+        df.to_csv(
+            path_to_file,
+            index=False,
+            mode='w' if i == 0 else 'a',
+            header=(i == 0)
+            )
+        n_written += n
+        i += 1
+    return path_to_file
@@ -0,0 +1,517 @@
+"""
+Find and deal with impossible, out-of-range and rare values.
+
+The rules for a dataset are declared once in a RuleSet:
+
+    rules = RuleSet()
+    rules.add_range('Age', low=0, high=120)
+    rules.add_range('Fare', low=0, action='clip')
+    rules.add_allowed('Embarked', ['C', 'Q', 'S'])
+    rules.add_comparison('SibSp', '<=', 'Parch', action='mark')
+    rules.add_rare('Cabin', min_count=5)
+    rules.fit(df_raw)    # Only needed for rare-value rules.
+    rules.to_json('titanic_rules.json')
+
+    df_valid, df_marks, df_summary = rules.apply(df_raw)
+
+The kinds of rule are:
++ range      - values below low or above high, e.g. negative ages.
+               For numbers, dates and ordered categories.
++ allowed    - values that aren't in a given list of values.
++ comparison - rows where "column op other" doesn't hold, e.g. a
+               discharge time before the arrival time.
++ rare       - values seen fewer than min_count times in the data
+               the rules were fitted to. Rare values can make it
+               easier to identify a patient, so are censored.
+Missing values never break a rule.
+
+Each rule says what to do with the values that break it:
++ 'missing' - replace them with a missing value.
++ 'clip'    - move them to the nearest end of the range. Range rules
+              only.
++ 'drop'    - remove the whole row.
++ 'mark'    - leave them be, and return a bool column that is True
+              where the rule is broken.
+
+All of the rules are checked against the original values before any
+of them are acted on, so the order of the rules doesn't matter. The
+rules are grouped by column and each column is converted to a NumPy
+array once for all of its rules. Each rule is then one vectorised
+comparison.
+
+For data too big to fit in memory, fit_in_chunks() and
+apply_in_chunks() go through a csv file one chunk at a time, in the
+same way as utils.stream.
+"""
+import json
+import operator
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+
+from utils.clean import load_data
+
+
+_KINDS = ['range', 'allowed', 'comparison', 'rare']
+_ACTIONS = ['missing', 'clip', 'drop', 'mark']
+_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+
+@dataclass
+class Rule:
+    """
+    One rule for the values of one column.
+
+    Attributes
+    ----------
+    kind      - str. 'range', 'allowed', 'comparison' or 'rare'.
+    column    - str. Column that the rule checks and acts on.
+    action    - str. 'missing', 'clip', 'drop' or 'mark'.
+    name      - str. Name of the rule in the summary and marks.
+    low       - float or None. Smallest allowed value (range). For
+                ordered categories, the lowest allowed category.
+    high      - float or None. Largest allowed value (range).
+    values    - list or None. Allowed values (allowed), or the rare
+                values found by RuleSet.fit() (rare).
+    op        - str or None. One of <, <=, >, >=, ==, != (comparison).
+    other     - str or None. Column to compare with (comparison).
+    min_count - int or None. Fewest times a value must appear to not
+                be rare (rare).
+    """
+    kind: str
+    column: str
+    action: str = 'missing'
+    name: str = None
+    low: float = None
+    high: float = None
+    values: list = None
+    op: str = None
+    other: str = None
+    min_count: int = None
+
+
+class RuleSet:
+    """
+    Rules for a dataset, checked together in one pass over the data.
+    """
+    def __init__(self, rules: list = None):
+        """
+        Inputs
+        ------
+        rules - list or None. Rule objects to start with.
+        """
+        self.rules = []
+        # Number of times each value appears, for rare-value rules:
+        self._counts = {}
+        for rule in (rules or []):
+            self.add(rule)
+
+    def __repr__(self):
+        """Short description for the log."""
+        return f'RuleSet({len(self.rules)} rules)'
+
+    def add(self, rule: Rule):
+        """
+        Add a rule after checking that it makes sense.
+
+        Returns
+        -------
+        self - RuleSet. So that calls can be chained.
+        """
+        if rule.kind not in _KINDS:
+            raise ValueError(
+                f'kind must be one of {_KINDS}, not {rule.kind!r}.')
+        if rule.action not in _ACTIONS:
+            raise ValueError(
+                f'action must be one of {_ACTIONS}, not {rule.action!r}.')
+        if (rule.action == 'clip') and (rule.kind != 'range'):
+            raise ValueError('Only range rules can clip values.')
+        if (rule.kind == 'comparison') and (rule.op not in _OPERATORS):
+            raise ValueError(
+                f'op must be one of {list(_OPERATORS)}, not {rule.op!r}.')
+        if rule.name is None:
+            suffix = {
+                'range': 'OutOfRange',
+                'allowed': 'NotAllowed',
+                'comparison': f'Vs{rule.other}',
+                'rare': 'Rare',
+            }[rule.kind]
+            rule.name = f'{rule.column}_{suffix}'
+        if rule.name in [r.name for r in self.rules]:
+            raise ValueError(f'There is already a rule named {rule.name!r}.')
+        self.rules.append(rule)
+        return self
+
+    def add_range(
+            self,
+            column: str,
+            low: float = None,
+            high: float = None,
+            action: str = 'missing',
+            name: str = None
+            ):
+        """Add a rule that values must be between low and high."""
+        return self.add(Rule(
+            'range', column, action, name, low=low, high=high))
+
+    def add_allowed(
+            self,
+            column: str,
+            values: list,
+            action: str = 'missing',
+            name: str = None
+            ):
+        """Add a rule that values must be one of a list of values."""
+        return self.add(Rule(
+            'allowed', column, action, name, values=list(values)))
+
+    def add_comparison(
+            self,
+            column: str,
+            op: str,
+            other: str,
+            action: str = 'mark',
+            name: str = None
+            ):
+        """Add a rule that "column op other" must hold, e.g. "a <= b"."""
+        return self.add(Rule(
+            'comparison', column, action, name, op=op, other=other))
+
+    def add_rare(
+            self,
+            column: str,
+            min_count: int,
+            action: str = 'missing',
+            name: str = None
+            ):
+        """Add a rule that values must appear at least min_count times."""
+        return self.add(Rule(
+            'rare', column, action, name, min_count=min_count))
+
+    def fit(self, df: pd.DataFrame):
+        """
+        Find the rare values for every rare-value rule.
+
+        Returns
+        -------
+        self - RuleSet. So that calls can be chained.
+        """
+        self._counts = {}
+        return self.partial_fit(df)
+
+    def partial_fit(self, df: pd.DataFrame):
+        """
+        Add the values in one chunk of data to the counts so far, and
+        update the rare values.
+
+        Returns
+        -------
+        self - RuleSet. So that calls can be chained.
+        """
+        rules_rare = [r for r in self.rules if r.kind == 'rare']
+        for column in set(r.column for r in rules_rare):
+            counts = df[column].value_counts(dropna=True)
+            if column in self._counts:
+                counts = self._counts[column].add(counts, fill_value=0)
+            self._counts[column] = counts
+        for rule in rules_rare:
+            counts = self._counts[rule.column]
+            rare = counts.index[(counts < rule.min_count).to_numpy()]
+            # Plain Python values so that the rules can be saved as json:
+            rule.values = [
+                v.item() if isinstance(v, np.generic) else v for v in rare]
+        return self
+
+    def fit_in_chunks(
+            self,
+            path_to_file: str,
+            chunksize: int = 100000,
+            load_plan=None
+            ):
+        """
+        Find the rare values from a csv file, one chunk at a time.
+
+        Only the columns with rare-value rules are read in.
+
+        Returns
+        -------
+        self - RuleSet. So that calls can be chained.
+        """
+        columns = sorted(set(
+            r.column for r in self.rules if r.kind == 'rare'))
+        self._counts = {}
+        if len(columns) == 0:
+            return self
+        dtype = None
+        if load_plan is not None:
+            dtype = {c: t for c, t in load_plan.dtypes.items()
+                     if c in columns}
+        for df in load_data(path_to_file, chunksize=chunksize,
+                            columns=columns, dtype=dtype):
+            self.partial_fit(df)
+        return self
+
+    def find_violations(self, df: pd.DataFrame):
+        """
+        Check every rule against the data.
+
+        Returns
+        -------
+        violations - np.array. Bool, one row per row of df and one
+                     column per rule. True where the rule is broken.
+        """
+        violations = np.zeros((len(df), len(self.rules)), dtype=bool)
+        # Each column is converted once however many rules use it:
+        arrays = {}
+        for column in dict.fromkeys(r.column for r in self.rules):
+            for i, rule in enumerate(self.rules):
+                if rule.column == column:
+                    violations[:, i] = _find_rule_mask(rule, df, arrays)
+        return violations
+
+    def apply(self, df: pd.DataFrame, violations: np.array = None):
+        """
+        Check the rules and act on the values that break them.
+
+        Inputs
+        ------
+        df         - pd.DataFrame. Data to check.
+        violations - np.array or None. Output of find_violations()
+                     for df, if already found.
+
+        Returns
+        -------
+        df_valid   - pd.DataFrame. df with the actions done. Only the
+                     columns that were changed are copied.
+        df_marks   - pd.DataFrame. One bool column per 'mark' rule,
+                     named after the rule, for the rows of df_valid.
+        df_summary - pd.DataFrame. One row per rule with the number
+                     and percentage of rows that break it.
+        """
+        if violations is None:
+            violations = self.find_violations(df)
+        df_valid = df.copy(deep=False)
+        for i, rule in enumerate(self.rules):
+            mask = violations[:, i]
+            if (rule.action in ['drop', 'mark']) or (not mask.any()):
+                continue
+            series = df_valid[rule.column]
+            if rule.action == 'clip':
+                df_valid[rule.column] = series.clip(rule.low, rule.high)
+            else:
+                df_valid[rule.column] = series.mask(mask)
+
+        rules_mark = [i for i, r in enumerate(self.rules)
+                      if r.action == 'mark']
+        df_marks = pd.DataFrame(
+            violations[:, rules_mark],
+            index=df.index,
+            columns=[self.rules[i].name for i in rules_mark]
+            )
+
+        rules_drop = [i for i, r in enumerate(self.rules)
+                      if r.action == 'drop']
+        if len(rules_drop) > 0:
+            keep = ~violations[:, rules_drop].any(axis=1)
+            if not keep.all():
+                df_valid = df_valid[keep]
+                df_marks = df_marks[keep]
+
+        df_summary = self.summarise(violations.sum(axis=0), len(df))
+        return df_valid, df_marks, df_summary
+
+    def apply_in_chunks(
+            self,
+            path_in: str,
+            path_out: str,
+            path_marks: str = None,
+            chunksize: int = 100000,
+            load_plan=None
+            ):
+        """
+        Apply the rules to a csv file one chunk at a time.
+
+        Inputs
+        ------
+        path_in    - str. Location of the raw csv file.
+        path_out   - str. Location of the csv file for the valid data.
+                     Any existing file here is overwritten.
+        path_marks - str or None. Location of a csv file for the marks.
+        chunksize  - int. Number of rows to read in at once.
+        load_plan  - utils.load_plan.LoadPlan or None. Columns and
+                     data types to read the file with.
+
+        Returns
+        -------
+        df_summary - pd.DataFrame. As for apply(), over the whole file.
+        """
+        counts = np.zeros(len(self.rules), dtype=np.int64)
+        n_rows = 0
+        chunks = load_data(path_in, chunksize=chunksize, load_plan=load_plan)
+        for i, df_raw in enumerate(chunks):
+            violations = self.find_violations(df_raw)
+            df_valid, df_marks, _ = self.apply(df_raw, violations)
+            counts += violations.sum(axis=0)
+            n_rows += len(df_raw)
+            # Only write the column names at the top of the file:
+            mode = 'w' if i == 0 else 'a'
+            df_valid.to_csv(path_out, index=False, mode=mode, header=(i == 0))
+            if path_marks is not None:
+                df_marks.to_csv(
+                    path_marks, index=False, mode=mode, header=(i == 0))
+        return self.summarise(counts, n_rows)
+
+    def summarise(self, counts: np.array, n_rows: int):
+        """
+        Table of how often each rule was broken.
+
+        Inputs
+        ------
+        counts - np.array. Number of rows that broke each rule.
+        n_rows - int. Number of rows checked.
+
+        Returns
+        -------
+        df_summary - pd.DataFrame. One row per rule.
+        """
+        df_summary = pd.DataFrame({
+            'column': [r.column for r in self.rules],
+            'kind': [r.kind for r in self.rules],
+            'action': [r.action for r in self.rules],
+            'violations': np.asarray(counts, dtype=np.int64),
+            'percent': 100 * np.asarray(counts) / max(n_rows, 1),
+            }, index=pd.Index([r.name for r in self.rules], name='rule'))
+        return df_summary
+
+    def to_dict(self):
+        """All of the rules as a dict."""
+        return {'rules': [asdict(rule) for rule in self.rules]}
+
+    @classmethod
+    def from_dict(cls, rules_dict: dict):
+        """Make a rule set from the output of to_dict()."""
+        return cls([Rule(**rule) for rule in rules_dict['rules']])
+
+    def to_json(self, path_to_file: str):
+        """Save these rules to a json file."""
+        with open(path_to_file, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4, default=str)
+
+    @classmethod
+    def from_json(cls, path_to_file: str):
+        """Load rules that were saved with to_json()."""
+        with open(path_to_file, 'r') as f:
+            rules_dict = json.load(f)
+        return cls.from_dict(rules_dict)
+
+
+def _find_rule_mask(rule: Rule, df: pd.DataFrame, arrays: dict):
+    """
+    True for each row of df that breaks the rule.
+
+    arrays holds the NumPy values of each column already converted,
+    and is added to.
+    """
+    if rule.kind == 'range':
+        series = df[rule.column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return _find_range_mask_categorical(rule, series)
+        if not (pd.api.types.is_numeric_dtype(series.dtype) or
+                pd.api.types.is_datetime64_any_dtype(series.dtype)) or \
+                pd.api.types.is_bool_dtype(series.dtype):
+            raise ValueError(
+                f'The range rule {rule.name!r} needs numbers, dates or ' +
+                f'ordered categories, not {series.dtype}.')
+        values = _find_array(df, rule.column, arrays)
+        mask = np.zeros(len(values), dtype=bool)
+        # Comparisons with NaN are False, so missing values pass.
+        if rule.low is not None:
+            mask |= values < rule.low
+        if rule.high is not None:
+            mask |= values > rule.high
+    elif rule.kind == 'comparison':
+        values = _find_array(df, rule.column, arrays)
+        values_other = _find_array(df, rule.other, arrays)
+        # Only compare rows where both are there. Comparing strings
+        # with missing values would raise an error.
+        valid = ~pd.isna(values) & ~pd.isna(values_other)
+        mask = np.zeros(len(values), dtype=bool)
+        try:
+            holds = _OPERATORS[rule.op](values[valid], values_other[valid])
+        except TypeError as e:
+            raise ValueError(
+                f'The comparison rule {rule.name!r} can\'t compare ' +
+                f'{rule.column!r} with {rule.other!r}: {e}') from None
+        mask[valid] = ~np.asarray(holds, dtype=bool)
+    else:
+        if rule.values is None:
+            raise ValueError(
+                f'Call fit() before using the rare-value rule {rule.name!r}.')
+        in_values = _find_in_values(df[rule.column], rule.values)
+        if rule.kind == 'allowed':
+            mask = ~in_values & df[rule.column].notna().to_numpy()
+        else:
+            mask = in_values
+    return np.asarray(mask, dtype=bool)
+
+
+def _find_range_mask_categorical(rule: Rule, series: pd.Series):
+    """
+    Range rule for ordered categories, compared by their codes.
+
+    low and high must be categories of the column.
+    """
+    categories = series.cat.categories
+    if not series.cat.ordered:
+        raise ValueError(
+            f'The range rule {rule.name!r} needs ordered categories.')
+    if rule.action == 'clip':
+        raise ValueError(
+            f'The range rule {rule.name!r} can\'t clip categories.')
+    codes = series.cat.codes.to_numpy()
+    mask = np.zeros(len(codes), dtype=bool)
+    for bound, op in [(rule.low, operator.lt), (rule.high, operator.gt)]:
+        if bound is None:
+            continue
+        if bound not in categories:
+            raise ValueError(
+                f'{bound!r} in the range rule {rule.name!r} is not a ' +
+                f'category of {rule.column!r}.')
+        mask |= op(codes, categories.get_loc(bound))
+    # Missing values have code -1 and never break the rule:
+    return mask & (codes >= 0)
+
+
+def _find_array(df: pd.DataFrame, column: str, arrays: dict):
+    """
+    Values of a column as a NumPy array for comparing.
+
+    Numbers, including nullable ones, become floats with NaN for
+    missing values so that every comparison is one vectorised step.
+    """
+    if column not in arrays:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series.dtype) and \
+                not pd.api.types.is_bool_dtype(series.dtype):
+            arrays[column] = series.to_numpy(dtype=float, na_value=np.nan)
+        else:
+            arrays[column] = series.to_numpy()
+    return arrays[column]
+
+
+def _find_in_values(series: pd.Series, values: list):
+    """True where the series holds one of the values."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Check each category once and look up the codes:
+        in_categories = series.cat.categories.isin(values)
+        codes = series.cat.codes.to_numpy()
+        return (codes >= 0) & in_categories[codes]
+    return series.isin(values).to_numpy()